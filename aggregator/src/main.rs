@@ -1,19 +1,188 @@
 use std::env;
-use tokio::{sync::mpsc, time::{interval, Duration}};
+use tokio::{sync::{mpsc, oneshot}, time::{interval, Duration}};
 use tokio_tungstenite::{connect_async, tungstenite::protocol::Message};
 use futures_util::{StreamExt, SinkExt};
 use serde::Serialize;
 use serde_json::json;
 use redis::AsyncCommands;
-use chrono::Utc;
+use chrono::{DateTime, SecondsFormat, TimeZone, Utc};
 use clap::Parser;
 
+const NANOS_PER_SECOND: i64 = 1_000_000_000;
+
+/// Stream events forwarded from the WebSocket reader to the aggregation loop. `ns` is the
+/// exchange timestamp in unix nanoseconds; bars are bucketed on its whole seconds.
 #[derive(Debug)]
-struct TradeEvent {
-    price: f64,
-    size: f64,
+enum MarketEvent {
+    Trade { price: f64, size: f64, ns: i64 },
+    Quote { bid: f64, ask: f64, bid_size: f64, ask_size: f64, ns: i64 },
+}
+
+impl MarketEvent {
+    fn ns(&self) -> i64 {
+        match self {
+            MarketEvent::Trade { ns, .. } | MarketEvent::Quote { ns, .. } => *ns,
+        }
+    }
+}
+
+/// Latest top of book and trade direction state, carried across bars
+#[derive(Default)]
+struct Book {
+    bid: Option<f64>,
+    ask: Option<f64>,
+    bid_size: f64,
+    ask_size: f64,
+    last_trade: Option<f64>,
+    last_sign: f64,
+}
+
+impl Book {
+    fn update(&mut self, bid: f64, ask: f64, bid_size: f64, ask_size: f64) {
+        self.bid = Some(bid).filter(|b| *b > 0.0);
+        self.ask = Some(ask).filter(|a| *a > 0.0);
+        self.bid_size = bid_size;
+        self.ask_size = ask_size;
+    }
+
+    fn spread(&self) -> Option<f64> {
+        match (self.bid, self.ask) {
+            (Some(bid), Some(ask)) if ask >= bid => Some(ask - bid),
+            _ => None,
+        }
+    }
+
+    /// (bid size - ask size) / (bid size + ask size) of the latest quote, in [-1, 1]
+    fn imbalance(&self) -> Option<f64> {
+        let total = self.bid_size + self.ask_size;
+        if total > 0.0 { Some((self.bid_size - self.ask_size) / total) } else { None }
+    }
+
+    /// Classify a trade as buyer (+1) or seller (-1) initiated: quote rule against the mid, falling
+    /// back to the tick rule (and then the previous sign) for trades at the mid or without a quote
+    fn trade_sign(&mut self, price: f64) -> f64 {
+        let mut sign = match (self.bid, self.ask) {
+            (Some(bid), Some(ask)) if ask >= bid => {
+                let mid = (bid + ask) / 2.0;
+                if price > mid { 1.0 } else if price < mid { -1.0 } else { 0.0 }
+            }
+            _ => 0.0,
+        };
+        if sign == 0.0 {
+            sign = match self.last_trade {
+                Some(prev) if price > prev => 1.0,
+                Some(prev) if price < prev => -1.0,
+                _ => self.last_sign,
+            };
+        }
+        self.last_trade = Some(price);
+        self.last_sign = sign;
+        sign
+    }
+}
+
+/// Accumulator for the currently open one-second bucket: trade OHLCV plus microstructure sums
+struct OpenBar {
+    second: i64,
+    open: f64,
+    high: f64,
+    low: f64,
+    close: f64,
+    volume: f64,
+    notional: f64,
+    trade_count: u64,
+    signed_volume: f64,
+    // Time-weighted spread: integral of the quoted spread over the covered part of the bucket
+    spread_area: f64,
+    spread_covered_ns: i64,
+    mark_ns: i64,
+}
+
+impl OpenBar {
+    fn new(second: i64, price: f64, size: f64, sign: f64) -> Self {
+        OpenBar {
+            second,
+            open: price,
+            high: price,
+            low: price,
+            close: price,
+            volume: size,
+            notional: price * size,
+            trade_count: 1,
+            signed_volume: sign * size,
+            spread_area: 0.0,
+            spread_covered_ns: 0,
+            mark_ns: second * NANOS_PER_SECOND,
+        }
+    }
+
+    fn on_trade(&mut self, price: f64, size: f64, sign: f64) {
+        self.high = self.high.max(price);
+        self.low = self.low.min(price);
+        self.close = price;
+        self.volume += size;
+        self.notional += price * size;
+        self.trade_count += 1;
+        self.signed_volume += sign * size;
+    }
+
+    /// Credit the book's current spread for the time from the last mark up to `ns` (within the bucket)
+    fn accrue_spread(&mut self, ns: i64, book: &Book) {
+        let end = (self.second + 1) * NANOS_PER_SECOND;
+        let t = ns.clamp(self.mark_ns, end);
+        if let Some(spread) = book.spread() {
+            self.spread_area += spread * (t - self.mark_ns) as f64;
+            self.spread_covered_ns += t - self.mark_ns;
+        }
+        self.mark_ns = t;
+    }
+
+    /// Close the bucket against the book as of its end and build the published bar
+    fn finish(mut self, symbol: &str, book: &Book) -> Bar {
+        self.accrue_spread(i64::MAX, book);
+        // Bars are stamped with the start of their bucket, e.g. 14:30:05Z covers [14:30:05, 14:30:06)
+        let timestamp = Utc.timestamp_opt(self.second, 0).single()
+            .map(|d| d.to_rfc3339_opts(SecondsFormat::Secs, true))
+            .unwrap_or_default();
+        Bar {
+            symbol: symbol.to_string(),
+            timestamp,
+            open: self.open,
+            high: self.high,
+            low: self.low,
+            close: self.close,
+            volume: self.volume,
+            vwap: if self.volume > 0.0 { self.notional / self.volume } else { self.close },
+            trade_count: self.trade_count,
+            bid: book.bid,
+            ask: book.ask,
+            spread: if self.spread_covered_ns > 0 {
+                Some(self.spread_area / self.spread_covered_ns as f64)
+            } else {
+                None
+            },
+            imbalance: book.imbalance(),
+            signed_volume: self.signed_volume,
+        }
+    }
+}
+
+/// Parse the event's RFC3339 `t` field into unix nanoseconds, falling back to the local clock
+fn event_ns(event: &serde_json::Value) -> i64 {
+    event.get("t")
+        .and_then(|v| v.as_str())
+        .and_then(|s| DateTime::parse_from_rfc3339(s).ok())
+        .and_then(|d| d.timestamp_nanos_opt())
+        .unwrap_or_else(|| Utc::now().timestamp_nanos_opt().unwrap_or_default())
+}
+
+async fn publish_bar(conn: &mut redis::aio::Connection, bar: &Bar) -> anyhow::Result<()> {
+    let channel = format!("bars:{}", bar.symbol);
+    let _: () = conn.publish(channel, serde_json::to_string(bar)?).await?;
+    Ok(())
 }
 
+/// Published bar. Quote-derived fields are null until the first quote arrives.
 #[derive(Serialize)]
 struct Bar {
     symbol: String,
@@ -23,15 +192,44 @@ struct Bar {
     low: f64,
     close: f64,
     volume: f64,
+    vwap: f64,
+    trade_count: u64,
+    // Top of book at the end of the bar
+    bid: Option<f64>,
+    ask: Option<f64>,
+    // Time-weighted quoted spread over the bar
+    spread: Option<f64>,
+    imbalance: Option<f64>,
+    // Buyer-initiated minus seller-initiated volume
+    signed_volume: f64,
 }
 
-/// Bar Aggregator: subscribes to Alpaca trades and publishes 1s bars to Redis
+/// Bar Aggregator: subscribes to Alpaca trades and quotes and publishes 1s bars to Redis
 #[derive(Parser)]
 #[command(name = "bar_aggregator")]
 struct Args {
     /// Ticker symbol to subscribe to (e.g. SPY)
     #[arg(long)]
     symbol: String,
+    /// Milliseconds to wait past the end of a second for late events before publishing its bar
+    #[arg(long, default_value_t = 250)]
+    grace_ms: i64,
+    /// Token written to `aggregator:<symbol>:ready` once the subscription is confirmed
+    #[arg(long, default_value = "")]
+    ready_token: String,
+    /// Milliseconds between heartbeat writes to `aggregator:<symbol>:heartbeat` (and `:last_event`)
+    #[arg(long, default_value_t = 200)]
+    heartbeat_ms: u64,
+}
+
+// `aggregator:<symbol>:last_event` must outlive quiet stretches (e.g. the overnight close) so the
+// supervisor can tell how long the feed has been silent
+const LAST_EVENT_TTL_MS: u64 = 86_400_000;
+
+/// Write a key with a millisecond expiry so stale state disappears if the process dies
+async fn set_px(conn: &mut redis::aio::Connection, key: &str, value: &str, ttl_ms: u64) -> anyhow::Result<()> {
+    let _: () = redis::cmd("SET").arg(key).arg(value).arg("PX").arg(ttl_ms).query_async(conn).await?;
+    Ok(())
 }
 
 // Allow configuring which Alpaca stream to use (SIP or IEX). Default to IEX for free data.
@@ -42,6 +240,10 @@ async fn main() -> anyhow::Result<()> {
     // Parse command-line arguments
     let args = Args::parse();
     let symbol = args.symbol;
+    let grace_ms = args.grace_ms;
+    let ready_key = format!("aggregator:{}:ready", symbol);
+    let heartbeat_key = format!("aggregator:{}:heartbeat", symbol);
+    let last_event_key = format!("aggregator:{}:last_event", symbol);
     // Load Alpaca API credentials from env
     let api_key = env::var("APCA_API_KEY_ID")?;
     let api_secret = env::var("APCA_API_SECRET_KEY")?;
@@ -62,7 +264,9 @@ async fn main() -> anyhow::Result<()> {
     write.send(Message::Text(auth_msg.to_string())).await?;
     println!("[Agg] Auth message sent");
 
-    // Subscribe to trade and quote streams for the provided symbol
+    // Subscribe to trades and quotes for the provided symbol. OHLCV is built from trades only, so it
+    // matches the historical bars the Python provider builds from Alpaca's trade history; quotes
+    // feed the book-derived bar fields (bid/ask, spread, imbalance, trade signs).
     println!("[Agg] Subscribing to trades and quotes for symbol: {}", symbol);
     let sub_msg = json!({"action":"subscribe","trades":[symbol.clone()],"quotes":[symbol.clone()]});
     write.send(Message::Text(sub_msg.to_string())).await?;
@@ -73,10 +277,13 @@ async fn main() -> anyhow::Result<()> {
     let client = redis::Client::open(redis_url)?;
     let mut redis_conn = client.get_async_connection().await?;
 
-    // Channel for raw trade events
-    let (tx, mut rx) = mpsc::unbounded_channel::<TradeEvent>();
+    // Channel for raw trade and quote events
+    let (tx, mut rx) = mpsc::unbounded_channel::<MarketEvent>();
+    // Fired once the server confirms the subscription; that is the readiness signal
+    let (ready_tx, mut ready_rx) = oneshot::channel::<()>();
+    let mut ready_tx = Some(ready_tx);
 
-    // Task: read websocket messages and push trades to channel
+    // Task: read websocket messages and push trades and quotes to channel
     tokio::spawn(async move {
         println!("[Agg] Entered WebSocket read loop");
         while let Some(msg) = read.next().await {
@@ -93,17 +300,28 @@ async fn main() -> anyhow::Result<()> {
                                     let price = event.get("p").and_then(|v| v.as_f64()).unwrap_or(0.0);
                                     let size = event.get("s").and_then(|v| v.as_f64()).unwrap_or(0.0);
                                     // println!("[Agg] Sending TradeEvent: price={}, size={}", price, size);
-                                    let _ = tx.send(TradeEvent { price, size });
+                                    let _ = tx.send(MarketEvent::Trade { price, size, ns: event_ns(&event) });
                                 },
                                 "q" => {
-                                    // quote event: compute mid-price and combined size
-                                    let bid = event.get("bp").and_then(|v| v.as_f64()).unwrap_or(0.0);
-                                    let ask = event.get("ap").and_then(|v| v.as_f64()).unwrap_or(0.0);
-                                    let price = (bid + ask) / 2.0;
-                                    let size = event.get("bs").and_then(|v| v.as_f64()).unwrap_or(0.0)
-                                        + event.get("as").and_then(|v| v.as_f64()).unwrap_or(0.0);
-                                    // println!("[Agg] Sending QuoteEvent as TradeEvent: price={}, size={}", price, size);
-                                    let _ = tx.send(TradeEvent { price, size });
+                                    // quote event: top of book
+                                    let field = |k: &str| event.get(k).and_then(|v| v.as_f64()).unwrap_or(0.0);
+                                    let _ = tx.send(MarketEvent::Quote {
+                                        bid: field("bp"),
+                                        ask: field("ap"),
+                                        bid_size: field("bs"),
+                                        ask_size: field("as"),
+                                        ns: event_ns(&event),
+                                    });
+                                },
+                                "subscription" => {
+                                    if let Some(ready) = ready_tx.take() {
+                                        let _ = ready.send(());
+                                    }
+                                },
+                                "error" => {
+                                    // auth or subscription rejected: end the read loop so the process exits
+                                    eprintln!("[Agg][Error] Stream error: {}", event);
+                                    return;
                                 },
                                 _ => {
                                     // println!("[Agg] Ignoring event type: {}", event_type);
@@ -118,47 +336,79 @@ async fn main() -> anyhow::Result<()> {
         }
     });
 
-    // Aggregation: collect events per-second, flush every second
-    let mut buf = Vec::new();
-    let mut ticker = interval(Duration::from_secs(1));
+    // Aggregation: bucket events on whole UTC seconds of their exchange timestamp. A bucket is
+    // published as soon as an event for a later second arrives, or once the wall clock passes the
+    // end of the bucket plus the grace period. Seconds without trades produce no bar, and late
+    // events for an already published second are folded into the next bar.
+    let mut current: Option<OpenBar> = None;
+    let mut book = Book::default();
+    let mut last_published: i64 = i64::MIN;
+    let mut ticker = interval(Duration::from_millis(100));
+    let mut heartbeat = interval(Duration::from_millis(args.heartbeat_ms));
+    let mut ready_pending = true;
+    // Wall-clock ms when the last trade or quote arrived; the heartbeat alone only proves this loop
+    // runs, not that the WebSocket still delivers
+    let mut last_event_ms: Option<i64> = None;
+    let mut last_event_written: Option<i64> = None;
     loop {
         tokio::select! {
-            Some(evt) = rx.recv() => {
-                // println!("[Agg] Received trade event from channel: price={}, size={}", evt.price, evt.size);
-                buf.push(evt);
+            maybe_evt = rx.recv() => {
+                // The read task only drops its sender when the WebSocket closes or errors; exit
+                // non-zero so the supervisor restarts us instead of running without a feed
+                let Some(evt) = maybe_evt else {
+                    anyhow::bail!("WebSocket stream ended");
+                };
+                last_event_ms = Some(Utc::now().timestamp_millis());
+                let ns = evt.ns();
+                let second = ns.div_euclid(NANOS_PER_SECOND).max(last_published.saturating_add(1));
+                if current.as_ref().map_or(false, |bar| second > bar.second) {
+                    let bar = current.take().unwrap();
+                    last_published = bar.second;
+                    publish_bar(&mut redis_conn, &bar.finish(&symbol, &book)).await?;
+                }
+                match evt {
+                    MarketEvent::Trade { price, size, .. } => {
+                        let sign = book.trade_sign(price);
+                        match current.as_mut() {
+                            Some(bar) => bar.on_trade(price, size, sign),
+                            None => current = Some(OpenBar::new(second, price, size, sign)),
+                        }
+                    }
+                    MarketEvent::Quote { bid, ask, bid_size, ask_size, .. } => {
+                        // The old spread applied until this quote; then the book moves
+                        if let Some(bar) = current.as_mut() {
+                            bar.accrue_spread(ns, &book);
+                        }
+                        book.update(bid, ask, bid_size, ask_size);
+                    }
+                }
             }
-            _ = ticker.tick() => {
-                // println!("[Agg] Aggregation tick; events in buffer: {}", buf.len());
-                if buf.is_empty() { 
-                    // println!("[Agg] No events to aggregate, skipping tick");
-                    continue; 
+            res = &mut ready_rx, if ready_pending => {
+                ready_pending = false;
+                if res.is_ok() {
+                    set_px(&mut redis_conn, &ready_key, &args.ready_token, 60_000).await?;
+                    println!("[Agg] READY {}", symbol);
                 }
-                // compute OHLCV
-                let open = buf[0].price;
-                let mut high = open;
-                let mut low = open;
-                let mut close = open;
-                let mut volume = 0.0;
-                for e in &buf {
-                    high = high.max(e.price);
-                    low = low.min(e.price);
-                    close = e.price;
-                    volume += e.size;
+            }
+            _ = heartbeat.tick() => {
+                let now_ms = Utc::now().timestamp_millis().to_string();
+                set_px(&mut redis_conn, &heartbeat_key, &now_ms, args.heartbeat_ms * 10).await?;
+                if last_event_ms != last_event_written {
+                    if let Some(ms) = last_event_ms {
+                        set_px(&mut redis_conn, &last_event_key, &ms.to_string(), LAST_EVENT_TTL_MS).await?;
+                    }
+                    last_event_written = last_event_ms;
+                }
+            }
+            _ = ticker.tick() => {
+                let due = current.as_ref()
+                    .map_or(false, |bar| Utc::now().timestamp_millis() >= (bar.second + 1) * 1000 + grace_ms);
+                if due {
+                    let bar = current.take().unwrap();
+                    last_published = bar.second;
+                    publish_bar(&mut redis_conn, &bar.finish(&symbol, &book)).await?;
                 }
-                let bar = Bar {
-                    symbol: symbol.clone(),
-                    timestamp: Utc::now().to_rfc3339(),
-                    open,
-                    high,
-                    low,
-                    close,
-                    volume,
-                };
-                let channel = format!("bars:{}", symbol);
-                // println!("[Agg] Publishing bar JSON: {}", serde_json::to_string(&bar)?);
-                let _: () = redis_conn.publish(channel, serde_json::to_string(&bar)?).await?;
-                buf.clear();
             }
         }
     }
-} 
\ No newline at end of file
+}
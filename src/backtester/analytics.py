@@ -0,0 +1,139 @@
+# Vectorized performance analytics over equity curves and per-trade PnL
+from typing import Any, Dict
+
+import numpy as np
+
+from src.data_providers.timeframes import periods_per_year
+
+
+def returns(equity: np.ndarray) -> np.ndarray:
+    """Simple per-bar returns along axis 0 (equity may be 1-D or bars x runs)."""
+    equity = np.asarray(equity, dtype=np.float64)
+    prev = equity[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.diff(equity, axis=0) / prev
+    return np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def sharpe_ratio(equity: np.ndarray, periods: float) -> np.ndarray:
+    """Annualized Sharpe ratio of per-bar returns (zero risk-free rate)."""
+    return _sharpe(returns(equity), periods)
+
+
+def sortino_ratio(equity: np.ndarray, periods: float) -> np.ndarray:
+    """Annualized Sortino ratio: mean return over downside deviation."""
+    return _sortino(returns(equity), periods)
+
+
+def _sharpe(r: np.ndarray, periods: float) -> np.ndarray:
+    if r.shape[0] < 2:
+        return np.zeros(r.shape[1:]) if r.ndim > 1 else 0.0
+    std = r.std(axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(std > 0, r.mean(axis=0) / std, 0.0) * np.sqrt(periods)
+    return out
+
+
+def _sortino(r: np.ndarray, periods: float) -> np.ndarray:
+    if r.shape[0] < 2:
+        return np.zeros(r.shape[1:]) if r.ndim > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(r, 0.0) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(downside > 0, r.mean(axis=0) / downside, 0.0) * np.sqrt(periods)
+    return out
+
+
+def max_drawdown(equity: np.ndarray):
+    """Return (max drawdown as a fraction of the running peak, longest underwater stretch in bars)."""
+    equity = np.asarray(equity, dtype=np.float64)
+    peak = np.maximum.accumulate(equity, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    # Duration: bars elapsed since the most recent bar that sat at its running peak
+    idx = np.arange(equity.shape[0]).reshape((-1,) + (1,) * (equity.ndim - 1))
+    at_peak = np.where(equity >= peak, idx, 0)
+    last_peak = np.maximum.accumulate(at_peak, axis=0)
+    duration = idx - last_peak
+    return dd.max(axis=0), duration.max(axis=0)
+
+
+def trade_segments(position: np.ndarray, fill_bars: np.ndarray):
+    """Distinct fill bars and the trade each one's segment (up to the next fill bar) belongs to.
+
+    A segment that starts flat, after an exit, only carries the next entry's fees and slippage, so
+    it is merged into the following holding; flat segments after the last holding go to that one.
+    Returns (bars, owner) with owner[i] the trade index of bars[i]; both are empty if nothing is
+    held. fill_bars must be non-decreasing, as recorded during a replay.
+    """
+    bars = np.asarray(fill_bars, dtype=np.int64)
+    if bars.size:
+        bars = bars[np.r_[True, bars[1:] != bars[:-1]]]
+    held = np.asarray(position)[bars] != 0
+    if not held.any():
+        return bars[:0], bars[:0]
+    idx = np.arange(bars.size)
+    # Index of the next holding segment at or after each one (bars.size past the last holding)
+    following = np.minimum.accumulate(np.where(held, idx, bars.size)[::-1])[::-1]
+    rank = np.cumsum(held) - 1
+    owner = np.where(following < bars.size, rank[np.minimum(following, bars.size - 1)], rank[-1])
+    return bars, owner
+
+
+def trade_pnl(equity: np.ndarray, position: np.ndarray, fill_bars: np.ndarray) -> np.ndarray:
+    """PnL of each trade: equity change over its holding segment, from the fill bar that opens it to the next fill bar.
+
+    The last segment runs to the last bar. Stretches spent flat between an exit and the next entry
+    are not trades; their only change (that entry's costs) counts towards the next trade.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    bars, owner = trade_segments(position, fill_bars)
+    if bars.size == 0:
+        return np.empty(0)
+    marks = equity[np.append(bars, equity.shape[0] - 1)]
+    return np.bincount(owner, weights=np.diff(marks))
+
+
+def win_rate(pnl: np.ndarray) -> float:
+    """Fraction of trades with positive PnL."""
+    pnl = np.asarray(pnl)
+    return float(np.count_nonzero(pnl > 0) / pnl.size) if pnl.size else 0.0
+
+
+def profit_factor(pnl: np.ndarray) -> float:
+    """Gross profit over gross loss (inf when there are no losing trades)."""
+    pnl = np.asarray(pnl)
+    gross_profit = pnl[pnl > 0].sum()
+    gross_loss = -pnl[pnl < 0].sum()
+    if gross_loss == 0:
+        return float('inf') if gross_profit > 0 else 0.0
+    return float(gross_profit / gross_loss)
+
+
+def exposure(position: np.ndarray) -> np.ndarray:
+    """Fraction of bars with a non-zero net position."""
+    position = np.asarray(position)
+    if position.shape[0] == 0:
+        return 0.0
+    return np.count_nonzero(position, axis=0) / position.shape[0]
+
+
+def summarize(
+    equity: np.ndarray,
+    position: np.ndarray,
+    fill_bars: np.ndarray,
+    timeframe: str,
+) -> Dict[str, Any]:
+    """Compute the standard risk/return metrics for a single 1-D equity curve."""
+    periods = periods_per_year(timeframe)
+    r = returns(equity)
+    dd, dd_bars = max_drawdown(equity)
+    pnl = trade_pnl(equity, position, fill_bars)
+    return {
+        'sharpe': float(_sharpe(r, periods)),
+        'sortino': float(_sortino(r, periods)),
+        'max_drawdown': float(dd),
+        'max_drawdown_duration': int(dd_bars),
+        'win_rate': win_rate(pnl),
+        'profit_factor': profit_factor(pnl),
+        'exposure': float(exposure(position)),
+    }
@@ -1,13 +1,98 @@
 import asyncio
 import os
-import json
+import queue
+import threading
 from datetime import datetime
-from typing import Type, Dict, Any
+from typing import Type, Dict, Any, Iterable, Iterator, List, Optional, Union, Callable, Sequence
 from inspect import signature
 
+import numpy as np
+import pandas as pd
+
+from src.data_providers.bar import Bar
 from src.data_providers.base_data_provider import BaseDataProvider
+from src.config.config import RiskConfig
+from src.log import get_logger
+from src.risk import RiskEngine, session_day
 from src.strategies.base_strategy import BaseStrategy
+from src.brokers.risk_broker import RiskCheckedBroker
 from src.brokers.simulated_broker import SimulatedBroker
+from src.brokers.warmup_broker import WarmupBroker
+from src.backtester import analytics
+from src.backtester.trade_log import save_backtest
+from src.backtester.result_cache import ResultCache, data_fingerprint
+from src.backtester.checkpoint import Checkpoint, CheckpointStore
+
+log = get_logger(__name__)
+
+
+class BacktestResult:
+    """Metrics plus the columnar trade log and per-bar equity curve of one replay."""
+
+    def __init__(
+        self,
+        metrics: Dict[str, Any],
+        trades: List[Dict[str, Any]],
+        time: np.ndarray,
+        equity: np.ndarray,
+        position: np.ndarray
+    ) -> None:
+        self.metrics = metrics
+        self.trades = trades
+        self.time = time
+        self.equity = equity
+        self.position = position
+
+    def save(self, path: str) -> None:
+        save_backtest(
+            path, self.trades, self.time, self.equity, self.position,
+            start_cash=np.float64(self.metrics['start_cash'])
+        )
+
+
+def prefetched(iterable: Iterable[Any], depth: int = 1) -> Iterator[Any]:
+    """Iterate while a background thread reads up to `depth` items ahead (e.g. fetching the next chunk)."""
+    items: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    done = object()
+    stop = threading.Event()
+
+    def offer(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not offer((item, None)):
+                    return
+            offer((done, None))
+        except BaseException as e:
+            offer((done, e))
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Let the producer exit if the consumer stops early
+        stop.set()
+
+
+# Called at each checkpoint with (bars replayed, equity so far, position so far, trades so far);
+# returning False stops the replay there
+ProgressCallback = Callable[[int, np.ndarray, np.ndarray, List[Dict[str, Any]]], bool]
+
 
 class Backtester:
     """Run a BaseStrategy over historical bar data and simulate trades."""
@@ -19,7 +104,11 @@ class Backtester:
         data_provider: BaseDataProvider,
         start_cash: float = 100000.0,
         slippage: float = 0.0001,
-        commission: float = 0.0002
+        commission: float = 0.0002,
+        cache: Union[ResultCache, bool, None] = True,
+        checkpoints: Union[CheckpointStore, bool, None] = None,
+        chunk_bars: Optional[int] = None,
+        risk: Optional[Dict[str, Any]] = None
     ) -> None:
         self.strategy_cls = strategy_cls
         self.config = config
@@ -27,21 +116,40 @@ class Backtester:
         self.start_cash = start_cash
         self.slippage = slippage
         self.commission = commission
+        # Result cache: True uses the default location unless BACKTEST_CACHE=off
+        if cache is True:
+            cache = ResultCache() if os.getenv('BACKTEST_CACHE', 'on').lower() not in ('0', 'off', 'false') else None
+        self.cache: Optional[ResultCache] = cache or None
+        # Checkpoints: resume from the end of an earlier run over a prefix of the same bars (opt-in;
+        # True uses the default location unless BACKTEST_CHECKPOINTS=off)
+        if checkpoints is True:
+            checkpoints = CheckpointStore() if os.getenv('BACKTEST_CHECKPOINTS', 'on').lower() not in ('0', 'off', 'false') else None
+        self.checkpoints: Optional[CheckpointStore] = checkpoints or None
+        self.resumed_from = 0
+        # With chunk_bars, run() streams the period through iter_historical_bars instead of loading it whole
+        self.chunk_bars = chunk_bars
+        # Risk limits (RiskConfig fields): orders pass the same RiskCheckedBroker as live, on the bars' trading days
+        self.risk = RiskConfig.model_validate(risk).model_dump() if risk is not None else None
 
-    def run(
-        self,
-        symbol: str,
-        start: datetime,
-        end: datetime,
-        timeframe: str = '1Min'
-    ) -> Dict[str, Any]:
-        # fetch data via provider
-        df = self.data_provider.get_historical_bars(symbol, start, end, timeframe)
-        if df.empty:
-            raise ValueError('No data fetched for symbol')
+    def _sim(self) -> Dict[str, Any]:
+        """Simulation settings that determine a result, for the cache and checkpoint keys."""
+        sim = {'start_cash': self.start_cash, 'slippage': self.slippage, 'commission': self.commission}
+        if self.risk is not None:
+            sim['risk'] = self.risk
+        return sim
 
-        # init simulation
-        broker = SimulatedBroker(self.start_cash, self.slippage, self.commission)
+    def _account(self, broker: SimulatedBroker):
+        """The broker a strategy trades through: the simulated account, risk-checked if limits are set."""
+        if self.risk is None:
+            return broker
+
+        def clock():
+            return None if broker.bar_time is None else session_day(broker.bar_time)
+
+        risk = RiskEngine.from_config(RiskConfig(**self.risk), start_equity=self.start_cash, clock=clock)
+        return RiskCheckedBroker(broker, risk)
+
+    def _make_strategy(self, broker: SimulatedBroker) -> BaseStrategy:
         # Dynamically instantiate strategy: always pass params first, include broker if constructor accepts it
         sig = signature(self.strategy_cls.__init__)
         param_names = list(sig.parameters.keys())[1:]  # skip 'self'
@@ -50,42 +158,278 @@ class Backtester:
             args = [self.config]
             if 'broker' in param_names:
                 args.append(broker)
-            strategy = self.strategy_cls(*args)
+            return self.strategy_cls(*args)
         elif param_names[:2] in (['broker', 'config'], ['broker', 'params']):
             # backwards compatibility: __init__(self, broker, config)
-            strategy = self.strategy_cls(broker, self.config)
-        else:
-            raise TypeError(f"Unsupported constructor signature for {self.strategy_cls}: {param_names}")
+            return self.strategy_cls(broker, self.config)
+        raise TypeError(f"Unsupported constructor signature for {self.strategy_cls}: {param_names}")
+
+    def warmup_bars(self) -> int:
+        """Bars the strategy needs before it can trade (its lookback_bars()), asked of a throwaway instance."""
+        return self._make_strategy(SimulatedBroker(self.start_cash, self.slippage, self.commission)).lookback_bars()
+
+    def replay(
+        self,
+        df: pd.DataFrame,
+        timeframe: str = '1Min',
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Sequence[int] = (),
+        warmup: int = 0
+    ) -> BacktestResult:
+        """Replay a bar DataFrame through a fresh strategy and simulated broker (or return the cached result).
+
+        With a progress callback, it is invoked after each checkpoint bar count; if it returns False
+        the replay stops early and the result covers only the bars replayed (metrics['stopped_at']),
+        also when the full run comes from the cache. Stopped results are not cached.
+
+        The first `warmup` bars only prime the strategy's indicators, as BaseStrategy.warm_up does
+        live: their orders are dropped, and the result (bar numbers included) covers the bars after.
+        """
+        if len(df) <= warmup:
+            raise ValueError('No data fetched for symbol')
+        if self.cache is None:
+            return self._replay(df, timeframe, progress, checkpoints, warmup)
+        sim = self._sim()
+        if warmup:
+            sim['warmup'] = warmup
+        key = self.cache.key(self.strategy_cls, self.config, sim, timeframe, df)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._replay(df, timeframe, progress, checkpoints, warmup)
+            if 'stopped_at' not in result.metrics:
+                self.cache.put(key, result, self.strategy_cls)
+        elif progress is not None:
+            # The full run is already known; still report the checkpoints so callers see the same progress
+            for n in sorted(c for c in checkpoints if 0 < c < len(df) - warmup):
+                trades = [t for t in result.trades if t['bar'] < n]
+                if not progress(n, result.equity[:n], result.position[:n], trades):
+                    return self._stopped(result, n, trades, timeframe)
+        return result
+
+    def _stopped(self, result: BacktestResult, stopped: int, trades: List[Dict[str, Any]], timeframe: str) -> BacktestResult:
+        """The result a replay stopped after `stopped` bars would give, cut from a full run's result."""
+        # As in _replay: positions are closed at the equity marked on the stop bar
+        equity, position = result.equity[:stopped], result.position[:stopped]
+        final_cash = float(equity[-1])
+        metrics = {
+            'start_cash': self.start_cash,
+            'final_cash': final_cash,
+            'total_return': (final_cash / self.start_cash - 1),
+            'trades': len(trades)
+        }
+        fill_bars = np.fromiter((t['bar'] for t in trades), dtype=np.int64, count=len(trades))
+        metrics.update(analytics.summarize(equity, position, fill_bars, timeframe))
+        metrics['stopped_at'] = stopped
+        return BacktestResult(metrics, trades, result.time[:stopped], equity, position)
+
+    def _replay(
+        self,
+        df: pd.DataFrame,
+        timeframe: str,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Sequence[int] = (),
+        warmup: int = 0
+    ) -> BacktestResult:
+        # init simulation
+        broker = SimulatedBroker(self.start_cash, self.slippage, self.commission)
+        account = self._account(broker)
+        strategy = self._make_strategy(account)
+        warm, df = df.iloc[:warmup], df.iloc[warmup:]
+
+        # Pull columns out once; iterating numpy arrays avoids per-row Series construction
+        times = df.index.values.astype('datetime64[ns]').view(np.int64)
+        opens = df['open'].to_numpy(dtype=np.float64)
+        highs = df['high'].to_numpy(dtype=np.float64)
+        lows = df['low'].to_numpy(dtype=np.float64)
+        closes = df['close'].to_numpy(dtype=np.float64)
+        volumes = df['volume'].to_numpy(dtype=np.float64)
+        n = len(df)
+        equity = np.empty(n)
+        position = np.empty(n)
+        pending = sorted(c for c in checkpoints if 0 < c < n) if progress is not None else []
+
+        # Continue from the checkpoint of an earlier run over a prefix of these bars
+        key = None
+        start = 0
+        # Pending lifecycle timers and exits are not part of a checkpoint, nor are the warm-up bars
+        if self.checkpoints is not None and broker.lifecycle is None and not warmup:
+            key = self.checkpoints.key(self.strategy_cls, self.config, self._sim(), timeframe)
+            saved = self.checkpoints.load(key)
+            if saved is not None and saved.matches(df):
+                strategy.restore(saved.strategy_state)
+                broker.restore(saved.broker_state)
+                if account is not broker:
+                    account.risk.restore(saved.broker_state['risk'])
+                start = saved.bars
+                equity[:start] = saved.equity
+                position[:start] = saved.position
+        self.resumed_from = start
+
+        stopped = None
+        while pending and pending[0] <= start:
+            # Checkpoints inside the resumed prefix are reported from the restored curves
+            c = pending.pop(0)
+            if not progress(c, equity[:c], position[:c], [t for t in broker.trades if t['bar'] < c]):
+                stopped = c
+                break
 
         # run strategy hooks
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(strategy.on_start())
-
-        # feed bars
-        for _, bar in df.iterrows():
-            bar = {
-                'open': float(bar['open']),
-                'high': float(bar['high']),
-                'low': float(bar['low']),
-                'close': float(bar['close']),
-                'volume': float(bar['volume'])
-            }
-            loop.run_until_complete(strategy.on_new_data(bar))
+        if start == 0:
+            loop.run_until_complete(strategy.on_start())
+            if warmup:
+                self._warm_up(loop, strategy, broker, warm)
+
+        # feed bars up to each progress checkpoint in turn
+        if stopped is None:
+            columns = (opens, highs, lows, closes, volumes)
+            done = start
+            for check in pending + [n]:
+                self._feed(loop, strategy, broker, columns, done, check, equity, position, times=times)
+                done = check
+                if check < n and not progress(check, equity[:check], position[:check], broker.trades):
+                    stopped = check
+                    break
+
+        if key is not None and stopped is None and start < n:
+            # Snapshot before on_stop and close_positions so the next run continues an open book
+            broker_state = broker.snapshot()
+            if account is not broker:
+                broker_state['risk'] = account.risk.snapshot()
+            self.checkpoints.save(key, Checkpoint(
+                n, data_fingerprint(df), strategy.snapshot(), broker_state, times, equity, position))
 
         loop.run_until_complete(strategy.on_stop())
         loop.close()
 
-        # close any open positions
-        last_price = float(df.iloc[-1]['close'])
-        broker.close_positions(last_price)
+        if stopped is not None:
+            times, equity, position = times[:stopped], equity[:stopped], position[:stopped]
+            broker.trades = [t for t in broker.trades if t['bar'] < stopped]
+            # The equity marked at the stop bar is what closing there realizes (the broker may be further on
+            # when the stop falls inside a resumed prefix)
+            broker.close_positions(float(closes[stopped - 1]))
+            broker.cash = float(equity[-1])
+        else:
+            # close any open positions
+            broker.close_positions(float(closes[-1]))
+
+        metrics = broker.performance()
+        fill_bars = np.fromiter((t['bar'] for t in broker.trades), dtype=np.int64, count=len(broker.trades))
+        metrics.update(analytics.summarize(equity, position, fill_bars, timeframe))
+        if stopped is not None:
+            metrics['stopped_at'] = stopped
+        return BacktestResult(metrics, broker.trades, times, equity, position)
+
+    def _warm_up(self, loop, strategy: BaseStrategy, broker: SimulatedBroker, df: pd.DataFrame) -> None:
+        """Feed bars with the strategy's orders swallowed, then drop the positions it thinks it took."""
+        columns = tuple(df[c].to_numpy(dtype=np.float64) for c in ('open', 'high', 'low', 'close', 'volume'))
+        times = df.index.values.astype('datetime64[ns]').view(np.int64)
+        scratch = np.empty(len(df))
+        account = strategy.broker
+        strategy.broker = WarmupBroker(broker)
+        try:
+            self._feed(loop, strategy, broker, columns, 0, len(df), scratch, scratch, times=times)
+        finally:
+            strategy.broker = account
+        strategy.reset_trading_state()
+
+    @staticmethod
+    def _feed(loop, strategy: BaseStrategy, broker: SimulatedBroker, columns, lo: int, hi: int,
+              equity: np.ndarray, position: np.ndarray, offset: int = 0, times: Optional[np.ndarray] = None) -> None:
+        """Feed bars [lo, hi) of the OHLCV column arrays, marking equity and position after each one.
+
+        A strategy's order lifecycle manager sees each bar first, at the bar's timestamp (times, in ns).
+        """
+        opens, highs, lows, closes, volumes = columns
+        lifecycle = broker.lifecycle
+        for i in range(lo, hi):
+            bar = Bar(float(opens[i]), float(highs[i]), float(lows[i]), float(closes[i]), float(volumes[i]))
+            broker.bar_index = offset + i
+            broker.mark = bar.close
+            if times is not None:
+                broker.bar_time = int(times[i])
+            if lifecycle is not None:
+                loop.run_until_complete(lifecycle.on_bar(bar, int(times[i]) / 1e9))
+            loop.run_until_complete(strategy.on_new_data(bar))
+            equity[i] = broker.equity(bar.close)
+            position[i] = broker.net_size
+
+    def replay_stream(self, chunks: Iterable[pd.DataFrame], timeframe: str = '1Min', prefetch: int = 1) -> BacktestResult:
+        """Replay bars arriving as a sequence of DataFrame chunks with bounded memory.
+
+        A background thread reads up to `prefetch` chunks ahead while the current one replays, so
+        at most prefetch + 1 chunks of bars are held at once; the curves still cost 24 bytes per bar.
+        Results equal replay() over the concatenated chunks. Streamed replays bypass the result
+        cache and checkpoints, which are keyed on the complete DataFrame.
+        """
+        broker = SimulatedBroker(self.start_cash, self.slippage, self.commission)
+        strategy = self._make_strategy(self._account(broker))
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        times, equities, positions = [], [], []
+        offset = 0
+        last_close = None
+        try:
+            loop.run_until_complete(strategy.on_start())
+            for chunk in prefetched(chunks, prefetch):
+                if chunk.empty:
+                    continue
+                n = len(chunk)
+                closes = chunk['close'].to_numpy(dtype=np.float64)
+                columns = (chunk['open'].to_numpy(dtype=np.float64), chunk['high'].to_numpy(dtype=np.float64),
+                           chunk['low'].to_numpy(dtype=np.float64), closes, chunk['volume'].to_numpy(dtype=np.float64))
+                equity = np.empty(n)
+                position = np.empty(n)
+                chunk_times = chunk.index.values.astype('datetime64[ns]').view(np.int64)
+                self._feed(loop, strategy, broker, columns, 0, n, equity, position, offset, chunk_times)
+                times.append(chunk_times)
+                equities.append(equity)
+                positions.append(position)
+                offset += n
+                last_close = float(closes[-1])
+            if not offset:
+                raise ValueError('No data fetched for symbol')
+            loop.run_until_complete(strategy.on_stop())
+        finally:
+            loop.close()
+
+        broker.close_positions(last_close)
+        time, equity, position = np.concatenate(times), np.concatenate(equities), np.concatenate(positions)
+        metrics = broker.performance()
+        fill_bars = np.fromiter((t['bar'] for t in broker.trades), dtype=np.int64, count=len(broker.trades))
+        metrics.update(analytics.summarize(equity, position, fill_bars, timeframe))
+        return BacktestResult(metrics, broker.trades, time, equity, position)
+
+    def run(
+        self,
+        symbol: str,
+        start: datetime,
+        end: datetime,
+        timeframe: str = '1Min'
+    ) -> Dict[str, Any]:
+        if self.chunk_bars:
+            # Stream the period chunk by chunk instead of loading it whole
+            chunks = self.data_provider.iter_historical_bars(symbol, start, end, timeframe, self.chunk_bars)
+            result = self.replay_stream(chunks, timeframe)
+            log.info("streamed backtest", bars=len(result.time), chunk_bars=self.chunk_bars)
+            return self._save(result)
+        # fetch data via provider
+        df = self.data_provider.get_historical_bars(symbol, start, end, timeframe)
+        result = self.replay(df, timeframe)
+        if self.cache is not None and self.cache.hits:
+            log.info("loaded cached backtest result", strategy=self.strategy_cls.__name__)
+        elif self.resumed_from:
+            log.info("resumed from checkpoint", strategy=self.strategy_cls.__name__, bar=self.resumed_from,
+                     replayed=len(df) - self.resumed_from)
+        return self._save(result)
 
-        # save trades to file
+    def _save(self, result: BacktestResult) -> Dict[str, Any]:
+        # save trades and equity curve as columnar arrays
         os.makedirs('backtests', exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
-        filename = f"backtests/backtest-{self.strategy_cls.__name__}-{timestamp}.json"
-        with open(filename, 'w') as f:
-            json.dump(broker.trades, f, indent=2)
-        print(f"Saved trades to {filename}")
+        filename = f"backtests/backtest-{self.strategy_cls.__name__}-{timestamp}.npz"
+        result.save(filename)
+        log.info("saved trades and equity curve", path=filename)
         # return performance report
-        return broker.performance() 
\ No newline at end of file
+        return result.metrics
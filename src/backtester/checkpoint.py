@@ -0,0 +1,94 @@
+# End-of-run checkpoints (strategy and broker state plus curves) so extended backtests only replay new bars
+import hashlib
+import json
+import os
+import pickle
+import zipfile
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.backtester.result_cache import canonical_params, canonical_sim, data_fingerprint, strategy_code_hash
+
+
+class Checkpoint:
+    """State of a replay after its last bar, before positions were closed."""
+
+    def __init__(
+        self,
+        bars: int,
+        fingerprint: str,
+        strategy_state: Dict[str, Any],
+        broker_state: Dict[str, Any],
+        time: np.ndarray,
+        equity: np.ndarray,
+        position: np.ndarray
+    ) -> None:
+        self.bars = bars
+        # data_fingerprint of the bars replayed so far; resuming requires the new data to start with them
+        self.fingerprint = fingerprint
+        self.strategy_state = strategy_state
+        self.broker_state = broker_state
+        self.time = time
+        self.equity = equity
+        self.position = position
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        return len(df) >= self.bars and data_fingerprint(df.iloc[:self.bars]) == self.fingerprint
+
+
+class CheckpointStore:
+    """One .npz checkpoint per strategy code, params (ignoring the period), sim settings and timeframe.
+
+    Curves are stored as arrays and the strategy/broker state as a zlib-compressed pickle. Location
+    comes from BACKTEST_CHECKPOINT_DIR (default .backtest_checkpoints).
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = root or os.getenv('BACKTEST_CHECKPOINT_DIR', '.backtest_checkpoints')
+
+    def key(self, strategy_cls: type, params: Any, sim: Dict[str, Any], timeframe: str) -> str:
+        params = json.loads(canonical_params(params))
+        if isinstance(params, dict):
+            # Extending the period must land on the same checkpoint
+            params.pop('period', None)
+        parts = {
+            'strategy': f"{strategy_cls.__module__}.{strategy_cls.__qualname__}",
+            'code': strategy_code_hash(strategy_cls),
+            'params': params,
+            'sim': canonical_sim(sim),
+            'timeframe': timeframe,
+        }
+        return hashlib.blake2b(json.dumps(parts, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npz")
+
+    def load(self, key: str) -> Optional[Checkpoint]:
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                state = pickle.loads(zlib.decompress(data['state'].tobytes()))
+                return Checkpoint(int(data['bars']), str(data['fingerprint']), state['strategy'], state['broker'],
+                                  data['time'], data['equity'], data['position'])
+        except (FileNotFoundError, ValueError, OSError, KeyError, zipfile.BadZipFile, zlib.error, pickle.UnpicklingError):
+            return None
+
+    def save(self, key: str, checkpoint: Checkpoint) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        state = zlib.compress(pickle.dumps(
+            {'strategy': checkpoint.strategy_state, 'broker': checkpoint.broker_state},
+            protocol=pickle.HIGHEST_PROTOCOL))
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            bars=np.int64(checkpoint.bars),
+            fingerprint=np.array(checkpoint.fingerprint),
+            state=np.frombuffer(state, dtype=np.uint8),
+            time=np.asarray(checkpoint.time, dtype=np.int64),
+            equity=np.asarray(checkpoint.equity, dtype=np.float64),
+            position=np.asarray(checkpoint.position, dtype=np.float64)
+        )
+        os.replace(tmp, path)
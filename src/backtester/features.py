@@ -0,0 +1,166 @@
+# Offline feature matrices: a strategy's model features over long histories, labeled and memory-mapped
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from src.config.registry import resolve
+from src.log import get_logger
+from src.strategies.base_strategy import BaseStrategy
+
+log = get_logger(__name__)
+
+# Label classes: the first is read as P_down and the last as P_up by strategies using the model
+LABEL_DOWN, LABEL_FLAT, LABEL_UP = 0, 1, 2
+
+
+def feature_kernel(strategy_cls: Type[BaseStrategy], params: Any) -> Any:
+    if not getattr(strategy_cls, 'feature_kernel', None):
+        raise ValueError(f"{strategy_cls.__name__} has no feature kernel")
+    return resolve(strategy_cls.feature_kernel)(params)
+
+
+def label_returns(close: np.ndarray, horizon: int, threshold: float = 0.0) -> np.ndarray:
+    """Direction of the close horizon bars ahead: up/down beyond +-threshold (a fraction), else flat.
+
+    The last horizon bars have no label (-1).
+    """
+    labels = np.full(len(close), -1, dtype=np.int8)
+    if len(close) > horizon:
+        ret = close[horizon:] / close[:-horizon] - 1
+        labels[:-horizon] = np.where(ret > threshold, LABEL_UP, np.where(ret < -threshold, LABEL_DOWN, LABEL_FLAT))
+    return labels
+
+
+def day_partitions(index: pd.DatetimeIndex, days: int) -> List[Tuple[int, int]]:
+    """[lo, hi) bar ranges covering `days` calendar days each."""
+    day_ids = index.normalize().asi8
+    starts = np.flatnonzero(np.r_[True, day_ids[1:] != day_ids[:-1]])
+    bounds = starts[::days].tolist() + [len(index)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _fill_partition(task) -> int:
+    """Compute one date partition's features (with leading overlap) into the shared memmap."""
+    strategy_cls, params, bars, skip, path, row_lo = task
+    values = feature_kernel(strategy_cls, params).compute(bars)[skip:]
+    matrix = np.load(path, mmap_mode='r+')
+    matrix[row_lo:row_lo + len(values)] = values
+    matrix.flush()
+    return len(values)
+
+
+def build_feature_matrix(
+    strategy_cls: Type[BaseStrategy],
+    params: Any,
+    df: pd.DataFrame,
+    out_dir: str,
+    horizon: int = 5,
+    threshold: float = 0.0,
+    partition_days: int = 20,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Write features.npy, labels.npy, time.npy and meta.json for every bar with features and a label.
+
+    Date partitions are computed in parallel, each from its own slice of bars plus the kernel's
+    overlap, straight into the memory-mapped output. meta.json is written last.
+    """
+    if df.empty:
+        raise ValueError('No data fetched for symbol')
+    kernel = feature_kernel(strategy_cls, params)
+    first, end = kernel.first_row, len(df) - horizon
+    if end <= first:
+        raise ValueError(f"Not enough bars ({len(df)}) for features and a {horizon}-bar label")
+    rows = end - first
+    os.makedirs(out_dir, exist_ok=True)
+    features_path = os.path.join(out_dir, 'features.npy')
+    matrix = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float64, shape=(rows, len(kernel.columns)))
+    del matrix
+
+    close = df['close'].to_numpy(dtype=np.float64)
+    np.save(os.path.join(out_dir, 'labels.npy'), label_returns(close, horizon, threshold)[first:end])
+    np.save(os.path.join(out_dir, 'time.npy'), df.index.values.astype('datetime64[ns]').view(np.int64)[first:end])
+
+    tasks = []
+    for lo, hi in day_partitions(pd.DatetimeIndex(df.index), partition_days):
+        lo, hi = max(lo, first), min(hi, end)
+        if lo >= hi:
+            continue
+        start = max(0, lo - kernel.overlap)
+        tasks.append((strategy_cls, params, df.iloc[start:hi], lo - start, features_path, lo - first))
+    log.info("building features", rows=rows, features=len(kernel.columns), partitions=len(tasks))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        written = sum(pool.map(_fill_partition, tasks))
+
+    labels = np.load(os.path.join(out_dir, 'labels.npy'))
+    meta = {
+        'strategy': f"{strategy_cls.__module__}.{strategy_cls.__qualname__}",
+        'params': params.model_dump(mode='json') if hasattr(params, 'model_dump') else params,
+        'columns': list(kernel.columns),
+        'rows': rows,
+        'horizon': horizon,
+        'threshold': threshold,
+        'start': str(df.index[first]),
+        'end': str(df.index[end - 1]),
+        'label_counts': {name: int((labels == cls).sum()) for name, cls in
+                         (('down', LABEL_DOWN), ('flat', LABEL_FLAT), ('up', LABEL_UP))},
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    if written != rows:
+        raise RuntimeError(f"Partitions wrote {written} of {rows} rows")
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_feature_matrix(out_dir: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+    """(features, labels, time, meta); features are memory-mapped read-only."""
+    with open(os.path.join(out_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    return (np.load(os.path.join(out_dir, 'features.npy'), mmap_mode='r'),
+            np.load(os.path.join(out_dir, 'labels.npy')),
+            np.load(os.path.join(out_dir, 'time.npy')),
+            meta)
+
+
+def check_parity(
+    strategy_cls: Type[BaseStrategy],
+    params: Any,
+    df: pd.DataFrame,
+    out_dir: Optional[str] = None,
+    bars: Optional[int] = None,
+    rtol: float = 1e-7,
+    atol: float = 1e-9
+) -> Dict[str, Any]:
+    """Compare offline features with the strategy's own incremental values, bar for bar.
+
+    The reference replays the first `bars` bars (all by default) through the strategy. Offline
+    values come from a built matrix in out_dir, or from the kernel over the same bars.
+    """
+    kernel = feature_kernel(strategy_cls, params)
+    bars = min(bars or len(df), len(df))
+    live = kernel.live(df.iloc[:bars])
+    if out_dir is not None:
+        matrix, _, _, meta = load_feature_matrix(out_dir)
+        stop = min(bars, kernel.first_row + meta['rows'])
+        offline = np.full_like(live, np.nan)
+        offline[kernel.first_row:stop] = matrix[:stop - kernel.first_row]
+        live[stop:] = np.nan
+    else:
+        offline = kernel.compute(df.iloc[:bars])
+    both = ~np.isnan(live) & ~np.isnan(offline)
+    missing = int((np.isnan(live) != np.isnan(offline)).any(axis=1).sum())
+    mismatched = ~np.isclose(offline, live, rtol=rtol, atol=atol) & both
+    diff = np.where(both, np.abs(offline - live), 0.0)
+    return {
+        'bars': bars,
+        'rows': int(both.all(axis=1).sum()),
+        'missing_rows': missing,
+        'mismatched_rows': int(mismatched.any(axis=1).sum()),
+        'max_abs_diff': dict(zip(kernel.columns, diff.max(axis=0).tolist())),
+        'ok': missing == 0 and not mismatched.any(),
+    }
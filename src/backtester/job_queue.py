@@ -0,0 +1,394 @@
+# Redis-backed backtest job queue: coordinators submit replays, workers on any host run them
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import redis
+
+from src.backtester.backtester import Backtester, BacktestResult
+from src.backtester.result_cache import data_fingerprint
+from src.backtester.trade_log import columns_to_trades, load_backtest, save_backtest
+from src.config.registry import resolve
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+# Atomically pop the next job id, lease it to a worker and return it with its spec
+_CLAIM = """
+local id = redis.call('RPOP', KEYS[1])
+if not id then return nil end
+local spec = redis.call('HGET', KEYS[5], id)
+if not spec then return nil end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), id)
+redis.call('HINCRBY', KEYS[3], id, 1)
+redis.call('HSET', KEYS[4], id, ARGV[2])
+return {id, spec}
+"""
+
+# Extend a lease, only for the worker that holds it
+_RENEW = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# Store a result and notify the submitting coordinator; ignored if the lease was lost meanwhile
+_COMPLETE = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+local reply = redis.call('HGET', KEYS[4], ARGV[1])
+if reply then redis.call('RPUSH', reply, ARGV[1]) end
+return 1
+"""
+
+# Release a job after an error: retry it first in line, or dead-letter it once out of attempts
+_FAIL = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+local attempts = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+if attempts >= tonumber(ARGV[4]) then
+  redis.call('HSET', KEYS[5], ARGV[1], ARGV[3])
+  local reply = redis.call('HGET', KEYS[6], ARGV[1])
+  if reply then redis.call('RPUSH', reply, ARGV[1]) end
+  return 2
+end
+redis.call('RPUSH', KEYS[4], ARGV[1])
+return 1
+"""
+
+# Requeue (or dead-letter) every job whose lease has expired, e.g. because its worker died
+_REAP = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)
+for _, id in ipairs(ids) do
+  redis.call('ZREM', KEYS[1], id)
+  redis.call('HDEL', KEYS[2], id)
+  local attempts = tonumber(redis.call('HGET', KEYS[3], id) or '0')
+  if attempts >= tonumber(ARGV[1]) then
+    redis.call('HSET', KEYS[5], id, 'lease expired on attempt ' .. attempts)
+    local reply = redis.call('HGET', KEYS[6], id)
+    if reply then redis.call('RPUSH', reply, id) end
+  else
+    redis.call('RPUSH', KEYS[4], id)
+  end
+end
+return #ids
+"""
+
+
+class JobFailed(RuntimeError):
+    """A job that exhausted its attempts and was moved to the dead-letter hash."""
+
+
+def encode_result(result: BacktestResult) -> bytes:
+    buf = io.BytesIO()
+    save_backtest(buf, result.trades, result.time, result.equity, result.position,
+                  metrics=np.array(json.dumps(result.metrics)))
+    return buf.getvalue()
+
+
+def decode_result(payload: bytes) -> BacktestResult:
+    data = load_backtest(io.BytesIO(payload))
+    return BacktestResult(json.loads(str(data['metrics'])), columns_to_trades(data),
+                          data['time'], data['equity'], data['position'])
+
+
+def class_path(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+class BacktestQueue:
+    """Backtest jobs in Redis under `backtest:<name>:*`, leased to workers with retries.
+
+    A claimed job is leased for `lease` seconds and the worker renews the lease while it runs. A job
+    whose lease expires (its worker crashed or hung) goes back to the front of the queue. After
+    max_attempts claims it is moved to the dead-letter hash instead. Bar data is shared
+    through Redis, stored once per dataset fingerprint, so workers need no data provider.
+    """
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        name: str = 'default',
+        lease: float = 30.0,
+        max_attempts: int = 3,
+        bars_ttl: int = 86400
+    ) -> None:
+        self.redis = client or redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+        self.name = name
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.bars_ttl = bars_ttl
+        prefix = f"backtest:{name}"
+        self.pending_key = f"{prefix}:pending"
+        self.leases_key = f"{prefix}:leases"
+        self.attempts_key = f"{prefix}:attempts"
+        self.owners_key = f"{prefix}:owners"
+        self.jobs_key = f"{prefix}:jobs"
+        self.results_key = f"{prefix}:results"
+        self.replies_key = f"{prefix}:replies"
+        self.dead_key = f"{prefix}:dead"
+        self.bars_prefix = f"{prefix}:bars"
+        self._claim = self.redis.register_script(_CLAIM)
+        self._renew = self.redis.register_script(_RENEW)
+        self._complete = self.redis.register_script(_COMPLETE)
+        self._fail = self.redis.register_script(_FAIL)
+        self._reap = self.redis.register_script(_REAP)
+        # Worker-side copies of shared bar sets, most recently used last
+        self._bars: 'OrderedDict[str, pd.DataFrame]' = OrderedDict()
+
+    # --- shared bar cache -------------------------------------------------
+
+    def put_bars(self, df: pd.DataFrame) -> str:
+        """Store a bar DataFrame for workers (once per fingerprint) and return its key."""
+        key = data_fingerprint(df)
+        path = f"{self.bars_prefix}:{key}"
+        if not self.redis.expire(path, self.bars_ttl):
+            buf = io.BytesIO()
+            np.savez(buf, time=df.index.values.astype('datetime64[ns]').view(np.int64),
+                     **{col: df[col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close', 'volume')})
+            self.redis.set(path, buf.getvalue(), ex=self.bars_ttl)
+        return key
+
+    def get_bars(self, key: str) -> pd.DataFrame:
+        if key in self._bars:
+            self._bars.move_to_end(key)
+            return self._bars[key]
+        payload = self.redis.get(f"{self.bars_prefix}:{key}")
+        if payload is None:
+            raise KeyError(f"Bar set {key} is no longer in Redis")
+        with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+            index = pd.DatetimeIndex(data['time'].astype('datetime64[ns]'), name='timestamp')
+            df = pd.DataFrame({col: data[col] for col in ('open', 'high', 'low', 'close', 'volume')}, index=index)
+        self._bars[key] = df
+        if len(self._bars) > 4:
+            self._bars.popitem(last=False)
+        return df
+
+    # --- coordinator side -------------------------------------------------
+
+    def job(
+        self,
+        strategy_cls: type,
+        params: Any,
+        bars: str,
+        timeframe: str,
+        sim: Dict[str, Any],
+        start: int = 0,
+        end: Optional[int] = None,
+        warmup: int = 0
+    ) -> Dict[str, Any]:
+        """Spec of one replay of bars[start:end] (bars as returned by put_bars), primed on the `warmup` bars before start."""
+        is_model = hasattr(params, 'model_dump')
+        return {
+            'strategy': class_path(strategy_cls),
+            'params_model': class_path(type(params)) if is_model else None,
+            'params': params.model_dump(mode='json') if is_model else params,
+            'symbol': getattr(params, 'symbol', None) if is_model else params.get('symbol'),
+            'bars': bars,
+            'start': start,
+            'end': end,
+            'warmup': warmup,
+            'timeframe': timeframe,
+            'sim': sim,
+        }
+
+    def submit(self, specs: Sequence[Dict[str, Any]]) -> Tuple[str, List[str]]:
+        """Enqueue jobs; returns the reply key to wait on and the job ids in submission order."""
+        reply = f"backtest:{self.name}:reply:{uuid.uuid4().hex}"
+        ids = [uuid.uuid4().hex for _ in specs]
+        pipe = self.redis.pipeline()
+        for job_id, spec in zip(ids, specs):
+            pipe.hset(self.jobs_key, job_id, json.dumps(spec))
+            pipe.hset(self.replies_key, job_id, reply)
+        if ids:
+            # pending is consumed from the right, so push in reverse to run jobs in submission order
+            pipe.lpush(self.pending_key, *reversed(ids))
+        pipe.execute()
+        return reply, ids
+
+    def gather(self, reply: str, ids: List[str], timeout: Optional[float] = None) -> List[Union[BacktestResult, JobFailed]]:
+        """Wait for every job of a submission; dead-lettered jobs come back as JobFailed."""
+        remaining = set(ids)
+        out: Dict[str, Union[BacktestResult, JobFailed]] = {}
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while remaining:
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError(f"{len(remaining)} of {len(ids)} backtest jobs still running")
+                # Coordinators also reap, so expired leases are recovered even when every worker is gone
+                self.reap()
+                item = self.redis.blpop(reply, timeout=1)
+                if item is None:
+                    continue
+                job_id = item[1].decode()
+                if job_id not in remaining:
+                    continue
+                remaining.discard(job_id)
+                payload = self.redis.hget(self.results_key, job_id)
+                if payload is not None:
+                    out[job_id] = decode_result(payload)
+                else:
+                    error = self.redis.hget(self.dead_key, job_id)
+                    out[job_id] = JobFailed(error.decode() if error else 'job failed')
+        finally:
+            self._forget(ids)
+            self.redis.delete(reply)
+        return [out.get(job_id, JobFailed('not finished')) for job_id in ids]
+
+    def map(self, specs: Sequence[Dict[str, Any]], timeout: Optional[float] = None) -> List[Union[BacktestResult, JobFailed]]:
+        reply, ids = self.submit(specs)
+        return self.gather(reply, ids, timeout)
+
+    def _forget(self, ids: List[str]) -> None:
+        # Dead-letter entries are kept for inspection; everything else about the jobs is dropped
+        pipe = self.redis.pipeline()
+        for key in (self.jobs_key, self.replies_key, self.results_key, self.attempts_key):
+            pipe.hdel(key, *ids)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, int]:
+        pipe = self.redis.pipeline()
+        pipe.llen(self.pending_key)
+        pipe.zcard(self.leases_key)
+        pipe.hlen(self.dead_key)
+        pending, leased, dead = pipe.execute()
+        return {'pending': pending, 'leased': leased, 'dead': dead}
+
+    # --- worker side ------------------------------------------------------
+
+    def claim(self, worker: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        item = self._claim(
+            keys=[self.pending_key, self.leases_key, self.attempts_key, self.owners_key, self.jobs_key],
+            args=[int(self.lease * 1000), worker])
+        if not item:
+            return None
+        return item[0].decode(), json.loads(item[1])
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        return bool(self._renew(keys=[self.leases_key, self.owners_key], args=[job_id, worker, int(self.lease * 1000)]))
+
+    def complete(self, job_id: str, worker: str, result: BacktestResult) -> bool:
+        return bool(self._complete(
+            keys=[self.leases_key, self.owners_key, self.results_key, self.replies_key],
+            args=[job_id, worker, encode_result(result)]))
+
+    def fail(self, job_id: str, worker: str, error: str) -> int:
+        """Returns 1 if the job was requeued, 2 if dead-lettered, 0 if the lease was already lost."""
+        return int(self._fail(
+            keys=[self.leases_key, self.owners_key, self.attempts_key, self.pending_key, self.dead_key, self.replies_key],
+            args=[job_id, worker, error, self.max_attempts]))
+
+    def reap(self) -> int:
+        return int(self._reap(
+            keys=[self.leases_key, self.owners_key, self.attempts_key, self.pending_key, self.dead_key, self.replies_key],
+            args=[self.max_attempts]))
+
+    def execute(self, spec: Dict[str, Any]) -> BacktestResult:
+        """Run one job spec with the Backtester (results still go through the local result cache)."""
+        strategy_cls = resolve(spec['strategy'])
+        params = spec['params']
+        if spec.get('params_model'):
+            params = resolve(spec['params_model']).model_validate(params)
+        warmup = spec.get('warmup', 0)
+        df = self.get_bars(spec['bars']).iloc[spec['start'] - warmup:spec['end']]
+        bt = Backtester(strategy_cls, params, None, **spec['sim'])
+        return bt.replay(df, spec['timeframe'], warmup=warmup)
+
+
+def run_worker(
+    queue: BacktestQueue,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 0.2,
+    max_jobs: Optional[int] = None,
+    idle_exit: Optional[float] = None
+) -> int:
+    """Pull and run jobs until max_jobs are done or the queue stays empty for idle_exit seconds."""
+    worker = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    done = 0
+    idle_since = time.monotonic()
+    log.info("serving queue", worker=worker, queue=queue.name)
+    while max_jobs is None or done < max_jobs:
+        queue.reap()
+        job = queue.claim(worker)
+        if job is None:
+            if idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+                break
+            time.sleep(poll_interval)
+            continue
+        job_id, spec = job
+        # Renew the lease from a side thread while the replay runs
+        finished = threading.Event()
+
+        def heartbeat() -> None:
+            while not finished.wait(queue.lease / 3):
+                if not queue.renew(job_id, worker):
+                    log.warning("lost lease on job", worker=worker, job=job_id)
+                    return
+
+        beat = threading.Thread(target=heartbeat, name=f"lease-{job_id}", daemon=True)
+        beat.start()
+        started = time.perf_counter()
+        try:
+            result = queue.execute(spec)
+        except Exception as e:
+            finished.set()
+            outcome = queue.fail(job_id, worker, f"{type(e).__name__}: {e}")
+            log.error("job failed", worker=worker, job=job_id, outcome='dead-lettered' if outcome == 2 else 'will retry', error=str(e))
+        else:
+            finished.set()
+            if queue.complete(job_id, worker, result):
+                log.info("job done", worker=worker, job=job_id, symbol=spec.get('symbol'), seconds=round(time.perf_counter() - started, 2))
+        beat.join()
+        done += 1
+        idle_since = time.monotonic()
+    return done
+
+
+def _worker_process(name: str, lease: float, max_attempts: int, idle_exit: Optional[float]) -> None:
+    run_worker(BacktestQueue(name=name, lease=lease, max_attempts=max_attempts), idle_exit=idle_exit)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run backtest workers for a Redis job queue (REDIS_URL)")
+    parser.add_argument('--queue', default='default', help='queue name')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes to run on this host')
+    parser.add_argument('--lease', type=float, default=30.0, help='lease length in seconds')
+    parser.add_argument('--max-attempts', type=int, default=3, help='claims before a job is dead-lettered')
+    parser.add_argument('--idle-exit', type=float, default=None, help='exit after this many idle seconds')
+    args = parser.parse_args(argv)
+    if args.processes == 1:
+        _worker_process(args.queue, args.lease, args.max_attempts, args.idle_exit)
+        return
+    procs = [multiprocessing.Process(target=_worker_process, args=(args.queue, args.lease, args.max_attempts, args.idle_exit))
+             for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
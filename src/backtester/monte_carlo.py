@@ -0,0 +1,180 @@
+# Monte Carlo / bootstrap robustness analysis of completed backtests
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from src.backtester import analytics
+from src.backtester.trade_log import load_backtest
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+METHODS = ('shuffle', 'bootstrap', 'slippage')
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+# Cap on simulated path elements held in memory per chunk (8 bytes each)
+CHUNK_ELEMENTS = 8_000_000
+
+
+def _paths(
+    rng: np.random.Generator,
+    method: str,
+    series: np.ndarray,
+    notional: Optional[np.ndarray],
+    sims: int,
+    block: int,
+    slippage: float
+) -> np.ndarray:
+    """Draw a (sims, n) matrix of resampled per-step values."""
+    n = series.size
+    if method == 'shuffle':
+        # Same trades, random order: final equity is unchanged, path risk is not
+        return rng.permuted(np.tile(series, (sims, 1)), axis=1)
+    if method == 'bootstrap':
+        # Circular block bootstrap preserves short-range dependence between consecutive trades
+        n_blocks = -(-n // block)
+        starts = rng.integers(0, n, (sims, n_blocks, 1))
+        idx = (starts + np.arange(block)).reshape(sims, -1)[:, :n] % n
+        return series[idx]
+    if method == 'slippage':
+        # Original order, each trade pays an extra random cost with mean `slippage` x notional
+        base = notional if notional is not None else np.abs(series)
+        return series - rng.exponential(slippage, (sims, n)) * base
+    raise ValueError(f"Unknown Monte Carlo method: {method}")
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(series: np.ndarray, notional: Optional[np.ndarray]) -> None:
+    _WORKER.update(series=series, notional=notional)
+
+
+def _simulate_chunk(task):
+    """Run one chunk of simulations and reduce each path to (final equity, max drawdown, ruined)."""
+    seed, method, sims, kind, start_cash, ruin, block, slippage = task
+    rng = np.random.default_rng(seed)
+    steps = _paths(rng, method, _WORKER['series'], _WORKER['notional'], sims, block, slippage)
+    # Build equity paths in place to keep peak memory at one (sims, n) matrix plus the running peak
+    if kind == 'returns':
+        steps += 1.0
+        equity = np.cumprod(steps, axis=1, out=steps)
+        equity *= start_cash
+    else:
+        equity = np.cumsum(steps, axis=1, out=steps)
+        equity += start_cash
+    # Running peak includes the starting point so a loss on the first step counts as drawdown
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(peak, start_cash, out=peak)
+    dd = ((peak - equity) / peak).max(axis=1)
+    ruined = equity.min(axis=1) <= start_cash * (1.0 - ruin)
+    return equity[:, -1], dd, ruined
+
+
+class MonteCarlo:
+    """Resample a backtest's trade PnL (dollars) or per-bar returns to get distributions of outcomes."""
+
+    def __init__(
+        self,
+        series: Sequence[float],
+        start_cash: float = 100000.0,
+        kind: str = 'pnl',
+        notional: Optional[Sequence[float]] = None,
+        workers: Optional[int] = None
+    ) -> None:
+        if kind not in ('pnl', 'returns'):
+            raise ValueError("kind must be 'pnl' or 'returns'")
+        self.series = np.ascontiguousarray(series, dtype=np.float64)
+        if self.series.size == 0:
+            raise ValueError("Monte Carlo analysis needs at least one trade or return")
+        self.notional = None if notional is None else np.ascontiguousarray(notional, dtype=np.float64)
+        self.start_cash = start_cash
+        self.kind = kind
+        self.workers = workers or os.cpu_count()
+
+    @classmethod
+    def from_backtest(cls, path: str, start_cash: Optional[float] = None, **kwargs) -> 'MonteCarlo':
+        """Build from a saved backtest .npz using per-trade PnL segments and their traded notional."""
+        data = load_backtest(path)
+        equity = data['equity']
+        bars = data['trade_bar']
+        if start_cash is None:
+            start_cash = float(data['start_cash']) if 'start_cash' in data else float(equity[0])
+        pnl = analytics.trade_pnl(equity, data['position'], bars)
+        notional = None
+        if pnl.size:
+            # Fold the fees and marks before the first fill into the first trade so PnL sums to the total
+            pnl[0] += equity[bars[0]] - start_cash
+            # Notional traded over each trade's segments, aligned with its PnL
+            segments, owner = analytics.trade_segments(data['position'], bars)
+            first = np.searchsorted(bars, segments[np.r_[True, owner[1:] != owner[:-1]]])
+            notional = np.add.reduceat(data['trade_size'] * data['trade_price'], first)
+        return cls(pnl, start_cash=start_cash, kind='pnl', notional=notional, **kwargs)
+
+    def run(
+        self,
+        sims: int = 10000,
+        methods: Sequence[str] = METHODS,
+        ruin: float = 0.5,
+        block: int = 10,
+        slippage: float = 0.0005,
+        seed: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Simulate each method and return percentile tables plus risk of ruin.
+
+        ruin is the fractional loss from start_cash that counts as ruin (0.5 = half the account).
+        """
+        n = self.series.size
+        chunk = max(1, min(sims, CHUNK_ELEMENTS // (n + 1)))
+        root = np.random.SeedSequence(seed)
+        report = {}
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.series, self.notional)
+        ) as pool:
+            for method in methods:
+                sizes = [min(chunk, sims - i) for i in range(0, sims, chunk)]
+                seeds = root.spawn(len(sizes))
+                tasks = [(s, method, k, self.kind, self.start_cash, ruin, block, slippage) for s, k in zip(seeds, sizes)]
+                finals, dds, ruined = zip(*pool.map(_simulate_chunk, tasks))
+                final = np.concatenate(finals)
+                dd = np.concatenate(dds)
+                ruined = np.concatenate(ruined)
+                report[method] = {
+                    'sims': int(final.size),
+                    'final_equity': dict(zip(PERCENTILES, np.percentile(final, PERCENTILES).tolist())),
+                    'max_drawdown': dict(zip(PERCENTILES, np.percentile(dd, PERCENTILES).tolist())),
+                    'probability_of_loss': float(np.mean(final < self.start_cash)),
+                    'risk_of_ruin': float(np.mean(ruined)),
+                }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness analysis of a saved backtest")
+    parser.add_argument('path', help="Backtest .npz written by the Backtester")
+    parser.add_argument('--sims', type=int, default=10000)
+    parser.add_argument('--methods', nargs='+', default=list(METHODS), choices=METHODS)
+    parser.add_argument('--ruin', type=float, default=0.5, help="Fractional loss that counts as ruin")
+    parser.add_argument('--block', type=int, default=10, help="Block length for the block bootstrap")
+    parser.add_argument('--slippage', type=float, default=0.0005, help="Mean extra cost per trade as a fraction of notional")
+    parser.add_argument('--start-cash', type=float)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mc = MonteCarlo.from_backtest(args.path, start_cash=args.start_cash, workers=args.workers)
+    report = mc.run(args.sims, args.methods, args.ruin, args.block, args.slippage, args.seed)
+    for method, stats in report.items():
+        log.info("monte carlo results", method=method, sims=stats['sims'],
+                 probability_of_loss=round(stats['probability_of_loss'], 4), risk_of_ruin=round(stats['risk_of_ruin'], 4))
+        print("  pct  final_equity  max_drawdown")
+        for p in PERCENTILES:
+            print(f"  {p:>3}  {stats['final_equity'][p]:>12,.2f}  {stats['max_drawdown'][p]:>11.2%}")
+
+
+if __name__ == '__main__':
+    main()
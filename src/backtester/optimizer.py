@@ -0,0 +1,293 @@
+# Hyperparameter search with asynchronous successive halving: losing trials are stopped partway through the data
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Type
+
+import numpy as np
+import pandas as pd
+
+from src.backtester import analytics
+from src.backtester.backtester import Backtester
+from src.backtester.result_cache import canonical_params, data_fingerprint
+from src.backtester.walk_forward import apply_overrides, objective_score
+from src.log import get_logger
+from src.strategies.base_strategy import BaseStrategy
+
+log = get_logger(__name__)
+
+# Grids up to this many points are sampled without replacement; larger spaces are sampled at random
+MAX_ENUMERATED_GRID = 1_000_000
+
+
+def sample_trials(space: Dict[str, Any], trials: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Draw parameter overrides from a search space.
+
+    Each entry is either a list of choices or a range {"low", "high", "log": bool, "int": bool}.
+    The sequence only depends on the space and seed, so asking for more trials extends it.
+    """
+    keys = list(space)
+    if all(isinstance(space[k], list) for k in keys):
+        sizes = [len(space[k]) for k in keys]
+        total = math.prod(sizes)
+        if total <= MAX_ENUMERATED_GRID:
+            order = np.random.default_rng(seed).permutation(total)[:trials]
+            combos = []
+            for flat in order.tolist():
+                combo = {}
+                for k, size in zip(reversed(keys), reversed(sizes)):
+                    flat, j = divmod(flat, size)
+                    combo[k] = space[k][j]
+                combos.append({k: combo[k] for k in keys})
+            return combos
+    combos = []
+    for t in range(trials):
+        rng = np.random.default_rng([seed, t])
+        combo = {}
+        for k in keys:
+            spec = space[k]
+            if isinstance(spec, list):
+                combo[k] = spec[int(rng.integers(len(spec)))]
+                continue
+            low, high = spec['low'], spec['high']
+            if spec.get('log'):
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            combo[k] = int(round(value)) if spec.get('int') else float(value)
+        combos.append(combo)
+    return combos
+
+
+def rung_bars(n_bars: int, min_fraction: float, eta: int) -> List[int]:
+    """Bar counts at which trials are compared: min_fraction * eta^k of the data, below the full length."""
+    rungs = []
+    fraction = min_fraction
+    while fraction < 1:
+        bars = max(1, math.ceil(n_bars * fraction))
+        if bars >= n_bars:
+            break
+        if not rungs or bars > rungs[-1]:
+            rungs.append(bars)
+        fraction *= eta
+    return rungs
+
+
+def promotable(score: float, rung_scores: List[float], eta: int) -> bool:
+    """A trial continues while it is in the top 1/eta of the scores recorded at this rung."""
+    if len(rung_scores) < eta:
+        # Too few comparisons to judge yet
+        return True
+    ranked = sorted(rung_scores, reverse=True)
+    return score >= ranked[len(ranked) // eta - 1]
+
+
+def partial_metrics(
+    equity: np.ndarray,
+    position: np.ndarray,
+    trades: List[Dict[str, Any]],
+    start_cash: float,
+    timeframe: str
+) -> Dict[str, Any]:
+    """Metrics of a replay so far, with open positions marked at the last close."""
+    fills = np.fromiter((t['bar'] for t in trades), dtype=np.int64, count=len(trades))
+    metrics = {
+        'final_cash': float(equity[-1]),
+        'total_return': float(equity[-1] / start_cash - 1),
+        'trades': len(trades),
+    }
+    metrics.update(analytics.summarize(equity, position, fills, timeframe))
+    return metrics
+
+
+class Study:
+    """Append-only JSONL record of a search: a header line, then one line per finished trial."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self, header: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        """Return finished trials by id; raises if the file belongs to a different search."""
+        if not os.path.exists(self.path):
+            return {}
+        trials = {}
+        with open(self.path) as f:
+            lines = [line for line in f if line.strip()]
+        if not lines:
+            return {}
+        stored = json.loads(lines[0]).get('study')
+        if stored != header:
+            raise ValueError(f"Study file {self.path} was created for a different search; use another path")
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by an interrupted run
+                continue
+            trials[record['trial']] = record
+        return trials
+
+    def start(self, header: Dict[str, Any]) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'study': header}) + '\n')
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+# Per-process state installed once by the pool initializer
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(df: pd.DataFrame, strategy_cls, base_params, sim: Dict[str, Any], timeframe: str,
+                 objective: str, eta: int, rungs: List[int], table, lock) -> None:
+    _WORKER.update(df=df, strategy_cls=strategy_cls, base_params=base_params, sim=sim, timeframe=timeframe,
+                   objective=objective, eta=eta, rungs=rungs, table=table, lock=lock)
+
+
+def _run_trial(trial: int, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Replay one trial, reporting at every rung and stopping once it falls out of the top 1/eta."""
+    w = _WORKER
+    params = apply_overrides(w['base_params'], overrides)
+    scores: Dict[str, float] = {}
+
+    def report(bars: int, equity: np.ndarray, position: np.ndarray, trades: List[Dict[str, Any]]) -> bool:
+        metrics = partial_metrics(equity, position, trades, w['sim']['start_cash'], w['timeframe'])
+        score = objective_score(metrics, w['objective'])
+        scores[str(bars)] = score
+        with w['lock']:
+            rung_scores = w['table'].get(bars, []) + [score]
+            w['table'][bars] = rung_scores
+        return promotable(score, rung_scores, w['eta'])
+
+    bt = Backtester(w['strategy_cls'], params, None, **w['sim'])
+    result = bt.replay(w['df'], w['timeframe'], progress=report, checkpoints=w['rungs'])
+    stopped = result.metrics.get('stopped_at')
+    return {
+        'trial': trial,
+        'params': overrides,
+        'state': 'pruned' if stopped else 'complete',
+        'bars': stopped or len(w['df']),
+        'rungs': scores,
+        'value': objective_score(result.metrics, w['objective']),
+        'metrics': result.metrics,
+    }
+
+
+class SuccessiveHalving:
+    """Random search over a parameter space with asynchronous successive halving (ASHA), parallel
+    across processes.
+
+    Every trial replays the full data unless, at one of the rungs (min_fraction * eta^k of the bars),
+    its objective so far is outside the top 1/eta of all trials that reached that rung. Finished
+    trials are appended to a JSONL study file, so an interrupted search resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        strategy_cls: Type[BaseStrategy],
+        base_params: Any,
+        space: Dict[str, Any],
+        trials: int = 100,
+        objective: str = 'sharpe',
+        eta: int = 3,
+        min_fraction: float = 1 / 27,
+        workers: Optional[int] = None,
+        study_path: Optional[str] = None,
+        seed: int = 0,
+        start_cash: float = 100000.0,
+        slippage: float = 0.0001,
+        commission: float = 0.0002,
+        risk: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.strategy_cls = strategy_cls
+        self.base_params = base_params
+        self.space = space
+        self.trials = trials
+        self.objective = objective
+        self.eta = eta
+        self.min_fraction = min_fraction
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.sim = {'start_cash': start_cash, 'slippage': slippage, 'commission': commission}
+        if risk is not None:
+            # Trials are scored with the account's risk limits (RiskConfig fields) applied
+            self.sim['risk'] = risk
+        symbol = getattr(base_params, 'symbol', 'data')
+        self.study = Study(study_path or f"studies/optimize-{strategy_cls.__name__}-{symbol}.jsonl")
+
+    def _header(self, df: pd.DataFrame, timeframe: str) -> Dict[str, Any]:
+        return {
+            'strategy': f"{self.strategy_cls.__module__}.{self.strategy_cls.__qualname__}",
+            'base_params': canonical_params(self.base_params),
+            'space': json.loads(json.dumps(self.space, sort_keys=True)),
+            'objective': self.objective,
+            'eta': self.eta,
+            'min_fraction': self.min_fraction,
+            'seed': self.seed,
+            'sim': self.sim,
+            'timeframe': timeframe,
+            'data': data_fingerprint(df),
+        }
+
+    def run(self, df: pd.DataFrame, timeframe: str = '1Min') -> Dict[str, Any]:
+        if df.empty:
+            raise ValueError('No data fetched for symbol')
+        n_bars = len(df)
+        rungs = rung_bars(n_bars, self.min_fraction, self.eta)
+        header = self._header(df, timeframe)
+        done = self.study.load(header)
+        self.study.start(header)
+        combos = sample_trials(self.space, self.trials, self.seed)
+        todo = [(t, combo) for t, combo in enumerate(combos) if t not in done]
+        log.info("starting search", trials=len(combos), done=len(done), study=self.study.path, rungs=rungs,
+                 bars=n_bars, eta=self.eta, workers=self.workers)
+
+        started = time.perf_counter()
+        with multiprocessing.Manager() as manager:
+            # Rung scores shared by all workers, seeded with the trials finished in earlier sessions
+            table = manager.dict()
+            lock = manager.Lock()
+            for record in done.values():
+                for bars, score in record['rungs'].items():
+                    table[int(bars)] = table.get(int(bars), []) + [score]
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(df, self.strategy_cls, self.base_params, self.sim, timeframe,
+                          self.objective, self.eta, rungs, table, lock)
+            ) as pool:
+                futures = [pool.submit(_run_trial, t, combo) for t, combo in todo]
+                for future in as_completed(futures):
+                    record = future.result()
+                    self.study.append(record)
+                    done[record['trial']] = record
+                    log.info("trial finished", trial=record['trial'], state=record['state'], bars=record['bars'],
+                             **{self.objective: record['metrics'].get(self.objective)})
+        elapsed = time.perf_counter() - started
+        return self.report(done, combos, n_bars, elapsed)
+
+    def report(self, done: Dict[int, Dict[str, Any]], combos: List[Dict[str, Any]], n_bars: int, elapsed: float) -> Dict[str, Any]:
+        """Summarize the study: best complete trial, prune counts and bars saved versus full replays."""
+        records = [done[t] for t in range(len(combos)) if t in done]
+        complete = [r for r in records if r['state'] == 'complete']
+        best = max(complete, key=lambda r: r['value'], default=None)
+        bars_replayed = sum(r['bars'] for r in records)
+        bars_full = len(records) * n_bars
+        return {
+            'best': best,
+            'trials': len(records),
+            'complete': len(complete),
+            'pruned': len(records) - len(complete),
+            'bars_replayed': bars_replayed,
+            'bars_full': bars_full,
+            'compute_saved': 1 - bars_replayed / bars_full if bars_full else 0.0,
+            'elapsed': elapsed,
+        }
@@ -0,0 +1,215 @@
+# Content-addressed cache of backtest results keyed on strategy code, params, settings and input bars
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import re
+import sys
+import zipfile
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from src.backtester.trade_log import columns_to_trades, load_backtest, save_backtest
+
+# Modules whose code changes every result, whatever the strategy
+ENGINE_MODULES = ('src.backtester.backtester', 'src.brokers.simulated_broker', 'src.backtester.analytics')
+# Project imports anywhere in a file (including inside functions), and 'module:attr' references
+# resolved at runtime such as a strategy's batch_kernel
+_IMPORT = re.compile(r'^[ \t]*(?:from[ \t]+(src(?:\.\w+)*)[ \t]+import[ \t]+(\([^)]*\)|[^\n#]+)|import[ \t]+(src(?:\.\w+)*))', re.M)
+_REFERENCE = re.compile(r'''['"](src(?:\.\w+)+):\w+['"]''')
+
+
+@lru_cache(maxsize=None)
+def _module_file(module_name: str) -> Optional[str]:
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    return spec.origin if spec is not None and spec.has_location else None
+
+
+def _src_imports(path: str) -> Set[str]:
+    """Project modules a source file imports or refers to."""
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    found = set(_REFERENCE.findall(source))
+    for package, names, module in _IMPORT.findall(source):
+        if module:
+            found.add(module)
+            continue
+        found.add(package)
+        # `from src.backtester import analytics` imports a module, not an attribute
+        for name in names.strip('()').split(','):
+            name = name.split()[0] if name.split() else ''
+            if name and _module_file(f"{package}.{name}"):
+                found.add(f"{package}.{name}")
+    return found
+
+
+def code_modules(strategy_cls: type) -> Dict[str, str]:
+    """Source file of every project module a result can depend on: the strategy class, its bases,
+    the simulation engine and everything they import from src, transitively."""
+    pending = [c.__module__ for c in inspect.getmro(strategy_cls) if c.__module__ not in ('builtins', 'abc')]
+    pending += list(ENGINE_MODULES)
+    files: Dict[str, str] = {}
+    while pending:
+        name = pending.pop()
+        if name in files:
+            continue
+        module = sys.modules.get(name)
+        path = getattr(module, '__file__', None) or _module_file(name)
+        if not path or not path.endswith('.py'):
+            continue
+        files[name] = path
+        pending.extend(_src_imports(path))
+    return files
+
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def strategy_code_hash(strategy_cls: type) -> str:
+    """Hash the source files of the strategy class, its bases, the simulation engine and the project modules they import."""
+    h = hashlib.blake2b(digest_size=16)
+    for name, path in sorted(code_modules(strategy_cls).items()):
+        h.update(name.encode())
+        h.update(_file_digest(path).encode())
+    return h.hexdigest()
+
+
+def canonical_params(params: Any) -> str:
+    """Stable JSON form of a params model or dict (sorted keys, JSON-mode values)."""
+    if hasattr(params, 'model_dump'):
+        params = params.model_dump(mode='json')
+    return json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+
+
+def canonical_sim(sim: Dict[str, Any]) -> Dict[str, Any]:
+    """Simulation settings for a cache key: numbers as floats, nested settings (risk limits) likewise."""
+    return {k: canonical_sim(v) if isinstance(v, dict) else (None if v is None else float(v))
+            for k, v in sorted(sim.items())}
+
+
+def data_fingerprint(df: pd.DataFrame) -> str:
+    """Hash of the bar timestamps and OHLCV values."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.values.astype('datetime64[ns]').view(np.int64)).data)
+    for col in ('open', 'high', 'low', 'close', 'volume'):
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)).data)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """On-disk store of BacktestResult columns, one .npz per key, evicted least-recently-used by size.
+
+    Location and size come from BACKTEST_CACHE_DIR (default .backtest_cache) and
+    BACKTEST_CACHE_MAX_MB (default 1024). Keys include a hash of the source files of the strategy,
+    the engine and every project module they import, so editing any of them makes old entries
+    unreachable; they age out through eviction or can be removed at once with
+    invalidate(strategy_cls, stale_only=True).
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        self.root = root or os.getenv('BACKTEST_CACHE_DIR', '.backtest_cache')
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('BACKTEST_CACHE_MAX_MB', '1024')) * 2**20)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def strategy_name(strategy_cls: type) -> str:
+        return f"{strategy_cls.__module__}.{strategy_cls.__qualname__}"
+
+    def key(self, strategy_cls: type, params: Any, sim: Dict[str, Any], timeframe: str, df: pd.DataFrame) -> str:
+        parts = {
+            'strategy': self.strategy_name(strategy_cls),
+            'code': strategy_code_hash(strategy_cls),
+            'params': canonical_params(params),
+            'sim': canonical_sim(sim),
+            'timeframe': timeframe,
+            'data': data_fingerprint(df),
+        }
+        return hashlib.blake2b(json.dumps(parts, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npz")
+
+    def get(self, key: str):
+        """Return the cached BacktestResult for a key, or None."""
+        from src.backtester.backtester import BacktestResult
+        path = self._path(key)
+        try:
+            data = load_backtest(path)
+        except (FileNotFoundError, ValueError, OSError, EOFError, KeyError, zipfile.BadZipFile):
+            # missing, or a partially written / corrupt file
+            self.misses += 1
+            return None
+        # Refresh the access time used for LRU eviction
+        os.utime(path)
+        self.hits += 1
+        trades = columns_to_trades(data)
+        metrics = json.loads(str(data['metrics']))
+        return BacktestResult(metrics, trades, data['time'], data['equity'], data['position'])
+
+    def put(self, key: str, result, strategy_cls: Optional[type] = None) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        # Write then rename so concurrent readers (e.g. walk-forward workers) never see partial files
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        save_backtest(
+            tmp, result.trades, result.time, result.equity, result.position,
+            start_cash=np.float64(result.metrics['start_cash']),
+            metrics=np.array(json.dumps(result.metrics)),
+            strategy=np.array(self.strategy_name(strategy_cls) if strategy_cls else ''),
+            code=np.array(strategy_code_hash(strategy_cls) if strategy_cls else '')
+        )
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete least-recently-used entries until the cache fits in max_bytes; returns files removed."""
+        try:
+            entries = [e for e in os.scandir(self.root) if e.name.endswith('.npz') and '.tmp' not in e.name]
+        except FileNotFoundError:
+            return 0
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in stats)
+        removed = 0
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, strategy_cls: Optional[type] = None, stale_only: bool = False) -> int:
+        """Remove cached results: all of them, or one strategy's, or only that strategy's entries
+        produced by code other than what is loaded now. Returns the number of files removed."""
+        name = self.strategy_name(strategy_cls) if strategy_cls else None
+        current = strategy_code_hash(strategy_cls) if strategy_cls else None
+        removed = 0
+        try:
+            entries = [e for e in os.scandir(self.root) if e.name.endswith('.npz')]
+        except FileNotFoundError:
+            return 0
+        for e in entries:
+            if name is not None:
+                try:
+                    with np.load(e.path, allow_pickle=False) as data:
+                        if str(data['strategy']) != name or (stale_only and str(data['code']) == current):
+                            continue
+                except (KeyError, ValueError, OSError, zipfile.BadZipFile):
+                    pass
+            os.remove(e.path)
+            removed += 1
+        return removed
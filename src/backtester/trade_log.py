@@ -0,0 +1,63 @@
+# Columnar (.npz) storage for backtest trades and per-bar equity curves
+from typing import IO, Any, Dict, List, Union
+
+import numpy as np
+
+
+def trades_to_columns(trades: List[Dict[str, Any]], timestamps: np.ndarray) -> Dict[str, np.ndarray]:
+    """Convert SimulatedBroker trade records into typed column arrays."""
+    n = len(trades)
+    bars = np.fromiter((t.get('bar', -1) for t in trades), dtype=np.int64, count=n)
+    # Trades placed outside a replay (bar -1) carry no timestamp
+    times = np.zeros(n, dtype=np.int64)
+    known = bars >= 0
+    times[known] = timestamps[bars[known]]
+    return {
+        'trade_bar': bars,
+        'trade_time': times,
+        'trade_symbol': np.array([t.get('symbol') or '' for t in trades], dtype=str),
+        'trade_side': np.fromiter((1 if t['side'] == 'BUY' else -1 for t in trades), dtype=np.int8, count=n),
+        'trade_size': np.fromiter((t['size'] for t in trades), dtype=np.float64, count=n),
+        'trade_price': np.fromiter((t['price'] for t in trades), dtype=np.float64, count=n),
+        'trade_commission': np.fromiter((t['commission'] for t in trades), dtype=np.float64, count=n),
+    }
+
+
+def columns_to_trades(data: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Rebuild SimulatedBroker trade records from the columns written by trades_to_columns."""
+    sides = np.where(data['trade_side'] > 0, 'BUY', 'SELL')
+    return [
+        {'symbol': str(sym), 'bar': int(bar), 'side': str(side), 'size': float(size), 'price': float(price), 'commission': float(fee)}
+        for sym, bar, side, size, price, fee in zip(
+            data['trade_symbol'], data['trade_bar'], sides,
+            data['trade_size'], data['trade_price'], data['trade_commission'])
+    ]
+
+
+def save_backtest(
+    path: Union[str, IO[bytes]],
+    trades: List[Dict[str, Any]],
+    timestamps: np.ndarray,
+    equity: np.ndarray,
+    position: np.ndarray,
+    **columns: np.ndarray
+) -> None:
+    """Write trades and the per-bar equity curve (timestamps as int64 ns since epoch) to one .npz file.
+
+    Extra keyword arrays are stored as additional columns.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    np.savez(
+        path,
+        time=timestamps,
+        equity=np.asarray(equity, dtype=np.float64),
+        position=np.asarray(position, dtype=np.float64),
+        **trades_to_columns(trades, timestamps),
+        **columns
+    )
+
+
+def load_backtest(path: Union[str, IO[bytes]]) -> Dict[str, np.ndarray]:
+    """Load a saved backtest into a dict of column arrays."""
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
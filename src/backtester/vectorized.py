@@ -0,0 +1,209 @@
+# Parameter-broadcast backtesting: many parameter sets advance together through one pass over the bars
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+import numpy as np
+import pandas as pd
+
+from src.backtester import analytics
+from src.backtester.backtester import BacktestResult
+from src.config.config import RiskConfig
+from src.config.registry import resolve
+from src.risk import RiskEngine, RiskRejected, session_day
+from src.strategies.base_strategy import BaseStrategy
+
+# Cap on bars x parameter sets held per equity/position block (8 bytes each)
+BLOCK_ELEMENTS = 20_000_000
+
+
+class VectorizedSimulatedBroker:
+    """SimulatedBroker with one account per parameter set, held as arrays.
+
+    Fills, fees and the running aggregates use the same expressions as SimulatedBroker, so every
+    run's cash, equity and trade log match an individual replay bit for bit. With risk limits each
+    run has its own RiskEngine, consulted order by order as the Backtester's RiskCheckedBroker does.
+    """
+
+    def __init__(
+        self,
+        n_runs: int,
+        start_cash: float = 100000.0,
+        slippage: float = 0.0001,
+        commission: float = 0.0002,
+        risk: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.n_runs = n_runs
+        self.start_cash = start_cash
+        self.slippage = slippage
+        self.commission = commission
+        self.cash = np.full(n_runs, start_cash, dtype=np.float64)
+        self.net_size = np.zeros(n_runs)
+        # Number of fills per run; SimulatedBroker keeps one position record per fill until close_positions
+        self.n_trades = np.zeros(n_runs, dtype=np.int64)
+        self.bar_index = -1
+        self.bar_time = None
+        self._fills: List[tuple] = []
+        self.risk: Optional[List[RiskEngine]] = None
+        if risk is not None:
+            config = RiskConfig(**risk)
+            self.risk = [RiskEngine.from_config(config, start_equity=start_cash, clock=self._session_day)
+                         for _ in range(n_runs)]
+
+    def _session_day(self):
+        return None if self.bar_time is None else session_day(self.bar_time)
+
+    def place_orders(self, runs: np.ndarray, side: str, size, price) -> np.ndarray:
+        """Fill market/limit orders for the given runs at `price` (scalar or per-run array); returns the runs filled."""
+        if runs.size == 0:
+            return runs
+        size = np.broadcast_to(np.asarray(size, dtype=np.float64), runs.shape)
+        price = np.broadcast_to(np.asarray(price, dtype=np.float64), runs.shape)
+        if self.risk is not None:
+            runs, size, price, reserved = self._approve(runs, side, size, price)
+            if runs.size == 0:
+                return runs
+        if side == 'BUY':
+            fill = price * (1 + self.slippage)
+        else:
+            fill = price * (1 - self.slippage)
+        cost = fill * size
+        fee = np.abs(cost) * self.commission
+        if side == 'BUY':
+            self.cash[runs] -= cost + fee
+            signed = size
+        else:
+            self.cash[runs] += cost - fee
+            signed = -size
+        self.net_size[runs] += signed
+        self.n_trades[runs] += 1
+        self._fills.append((self.bar_index, runs.copy(), 1 if side == 'BUY' else -1, np.array(size), fill, fee))
+        if self.risk is not None:
+            for r, s, p, c, res in zip(runs.tolist(), np.asarray(signed).tolist(), fill.tolist(), fee.tolist(), reserved):
+                self.risk[r].on_fill(None, s, p, c, res)
+        return runs
+
+    def _approve(self, runs: np.ndarray, side: str, size: np.ndarray, price: np.ndarray):
+        """Drop the orders each run's RiskEngine rejects; returns the approved runs, sizes, prices and reservations."""
+        sign = 1.0 if side == 'BUY' else -1.0
+        keep, reserved = [], []
+        for j, (r, s, p) in enumerate(zip(runs.tolist(), size.tolist(), price.tolist())):
+            try:
+                reserved.append(self.risk[r].approve(None, sign * s, p))
+            except RiskRejected:
+                continue
+            keep.append(j)
+        if len(keep) == runs.size:
+            return runs, size, price, reserved
+        return runs[keep], size[keep], price[keep], reserved
+
+    def equity(self, price: float) -> np.ndarray:
+        # Cash plus the signed market value of open positions; fees were paid from cash at the fill
+        return self.cash + self.net_size * price
+
+    def close_positions(self, last_price: float) -> None:
+        self.cash = self.equity(last_price)
+        self.net_size[:] = 0.0
+
+    def trades(self, symbol: str) -> List[List[Dict[str, Any]]]:
+        """Per-run trade records in the SimulatedBroker format, in fill order."""
+        out: List[List[Dict[str, Any]]] = [[] for _ in range(self.n_runs)]
+        for bar, runs, side, size, fill, fee in self._fills:
+            name = 'BUY' if side > 0 else 'SELL'
+            for r, s, p, f in zip(runs.tolist(), size.tolist(), fill.tolist(), fee.tolist()):
+                out[r].append({'symbol': symbol, 'bar': bar, 'side': name, 'size': s, 'price': p, 'commission': f})
+        return out
+
+
+class BatchBacktester:
+    """Replay one bar DataFrame for many parameter sets of a strategy that defines a batch kernel.
+
+    The strategy's `batch_kernel` ('module:attr') names a class built as kernel(params_list, broker)
+    with an on_bar(i, open, high, low, close, volume) method that advances every parameter set by
+    one bar. Results equal those of Backtester.replay run once per parameter set.
+    """
+
+    def __init__(
+        self,
+        strategy_cls: Type[BaseStrategy],
+        params_list: Sequence[Any],
+        start_cash: float = 100000.0,
+        slippage: float = 0.0001,
+        commission: float = 0.0002,
+        keep_curves: bool = True,
+        risk: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if not self.supports(strategy_cls, params_list):
+            raise ValueError(f"{strategy_cls.__name__} has no batch kernel for these parameters")
+        self.strategy_cls = strategy_cls
+        self.kernel_cls = resolve(strategy_cls.batch_kernel)
+        self.params_list = list(params_list)
+        self.start_cash = start_cash
+        self.slippage = slippage
+        self.commission = commission
+        # Without curves, results keep metrics and trades only (for large sweeps)
+        self.keep_curves = keep_curves
+        # Risk limits (RiskConfig fields), enforced per run as Backtester(risk=...) does
+        self.risk = RiskConfig.model_validate(risk).model_dump() if risk is not None else None
+
+    @staticmethod
+    def supports(strategy_cls: Type[BaseStrategy], params_list: Sequence[Any] = ()) -> bool:
+        return bool(getattr(strategy_cls, 'batch_kernel', None)) and all(
+            strategy_cls.batch_compatible(p) for p in params_list)
+
+    def replay(self, df: pd.DataFrame, timeframe: str = '1Min') -> List[BacktestResult]:
+        if df.empty:
+            raise ValueError('No data fetched for symbol')
+        n = len(df)
+        block = max(1, BLOCK_ELEMENTS // n)
+        results: List[BacktestResult] = []
+        for lo in range(0, len(self.params_list), block):
+            results.extend(self._replay_block(df, timeframe, self.params_list[lo:lo + block]))
+        return results
+
+    def _replay_block(self, df: pd.DataFrame, timeframe: str, params_list: List[Any]) -> List[BacktestResult]:
+        times = df.index.values.astype('datetime64[ns]').view(np.int64)
+        opens = df['open'].to_numpy(dtype=np.float64)
+        highs = df['high'].to_numpy(dtype=np.float64)
+        lows = df['low'].to_numpy(dtype=np.float64)
+        closes = df['close'].to_numpy(dtype=np.float64)
+        volumes = df['volume'].to_numpy(dtype=np.float64)
+        n = len(df)
+        runs = len(params_list)
+        broker = VectorizedSimulatedBroker(runs, self.start_cash, self.slippage, self.commission, self.risk)
+        kernel = self.kernel_cls(params_list, broker)
+        equity = np.empty((n, runs))
+        position = np.empty((n, runs))
+
+        # Bars are handed over as Python floats, exactly as Backtester.replay builds its bar dicts
+        for i in range(n):
+            close = float(closes[i])
+            broker.bar_index = i
+            broker.bar_time = int(times[i])
+            kernel.on_bar(i, float(opens[i]), float(highs[i]), float(lows[i]), close, float(volumes[i]))
+            equity[i] = broker.equity(close)
+            position[i] = broker.net_size
+
+        broker.close_positions(float(closes[-1]))
+        symbols = [getattr(p, 'symbol', None) for p in params_list]
+        trades = broker.trades(symbols[0] if len(set(symbols)) == 1 else None)
+        results = []
+        for r in range(runs):
+            if symbols[r] is not None:
+                for t in trades[r]:
+                    t['symbol'] = symbols[r]
+            # Contiguous per-run columns give the same floating point reductions as a 1-D replay
+            eq = np.ascontiguousarray(equity[:, r])
+            pos = np.ascontiguousarray(position[:, r])
+            final_cash = float(broker.cash[r])
+            metrics = {
+                'start_cash': self.start_cash,
+                'final_cash': final_cash,
+                'total_return': (final_cash / self.start_cash - 1),
+                'trades': len(trades[r]),
+            }
+            fill_bars = np.fromiter((t['bar'] for t in trades[r]), dtype=np.int64, count=len(trades[r]))
+            metrics.update(analytics.summarize(eq, pos, fill_bars, timeframe))
+            if self.keep_curves:
+                results.append(BacktestResult(metrics, trades[r], times, eq, pos))
+            else:
+                results.append(BacktestResult(metrics, trades[r], times[:0], eq[:0], pos[:0]))
+        return results
@@ -0,0 +1,286 @@
+# Walk-forward optimization: optimize on rolling/anchored in-sample folds, evaluate out-of-sample
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from src.backtester import analytics
+from src.backtester.backtester import Backtester
+from src.backtester.trade_log import save_backtest
+from src.backtester.vectorized import BatchBacktester
+from src.log import get_logger
+from src.strategies.base_strategy import BaseStrategy
+
+log = get_logger(__name__)
+
+if TYPE_CHECKING:
+    from src.backtester.job_queue import BacktestQueue
+
+# Metrics where a smaller value is better when used as the optimization objective
+MINIMIZE_OBJECTIVES = {'max_drawdown', 'max_drawdown_duration'}
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Cartesian product of a {param: [values]} grid as a list of override dicts."""
+    if not grid:
+        return [{}]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def apply_overrides(params: Any, overrides: Dict[str, Any]) -> Any:
+    """Return a validated copy of a params model (or dict) with overrides applied."""
+    if not overrides:
+        return params
+    if hasattr(params, 'model_validate'):
+        return type(params).model_validate({**params.model_dump(), **overrides})
+    return {**params, **overrides}
+
+
+def objective_score(metrics: Dict[str, Any], objective: str) -> float:
+    """Score metrics so that higher is always better; non-finite values rank last."""
+    value = float(metrics.get(objective, float('nan')))
+    if math.isnan(value):
+        return float('-inf')
+    return -value if objective in MINIMIZE_OBJECTIVES else value
+
+
+def make_folds(n_bars: int, in_sample: int, out_of_sample: int, anchored: bool = False) -> List[Tuple[int, int, int, int]]:
+    """Split [0, n_bars) into (is_start, is_end, oos_start, oos_end) folds stepping by out_of_sample.
+
+    Rolling folds keep a fixed-length in-sample window; anchored folds always start at bar 0.
+    """
+    folds = []
+    is_end = in_sample
+    while is_end < n_bars:
+        oos_end = min(is_end + out_of_sample, n_bars)
+        is_start = 0 if anchored else is_end - in_sample
+        folds.append((is_start, is_end, is_end, oos_end))
+        is_end = oos_end
+    return folds
+
+
+# Per-process state installed once by the pool initializer so the dataset is shipped once per worker
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(df: pd.DataFrame, strategy_cls, base_params, sim: Dict[str, Any], timeframe: str) -> None:
+    _WORKER.update(df=df, strategy_cls=strategy_cls, base_params=base_params, sim=sim, timeframe=timeframe)
+
+
+def _evaluate(start: int, end: int, overrides: Dict[str, Any], warm_up: bool = False):
+    """Replay one parameter set over bars [start, end) of the worker's dataset.
+
+    With warm_up, the strategy is first primed on up to its lookback of the bars before start.
+    """
+    params = apply_overrides(_WORKER['base_params'], overrides)
+    bt = Backtester(_WORKER['strategy_cls'], params, None, **_WORKER['sim'])
+    warmup = min(start, bt.warmup_bars()) if warm_up else 0
+    return bt.replay(_WORKER['df'].iloc[start - warmup:end], _WORKER['timeframe'], warmup=warmup)
+
+
+def _score_in_sample(task):
+    fold, start, end, combo, overrides, objective = task
+    try:
+        metrics = _evaluate(start, end, overrides).metrics
+    except ValueError:
+        # e.g. an empty slice; never select this combination
+        return fold, combo, float('-inf'), {}
+    return fold, combo, objective_score(metrics, objective), metrics
+
+
+def _score_in_sample_batch(task):
+    """Replay a block of parameter sets over one in-sample window in a single vectorized pass."""
+    fold, start, end, combo_ids, combos, objective = task
+    try:
+        params_list = [apply_overrides(_WORKER['base_params'], overrides) for overrides in combos]
+        results = BatchBacktester(_WORKER['strategy_cls'], params_list, keep_curves=False, **_WORKER['sim']).replay(
+            _WORKER['df'].iloc[start:end], _WORKER['timeframe'])
+    except ValueError:
+        return [(fold, c, float('-inf'), {}) for c in combo_ids]
+    return [(fold, c, objective_score(r.metrics, objective), r.metrics) for c, r in zip(combo_ids, results)]
+
+
+def _run_out_of_sample(task):
+    fold, start, end, overrides = task
+    # Out-of-sample windows continue from the in-sample bars before them rather than from flat indicators
+    result = _evaluate(start, end, overrides, warm_up=True)
+    return fold, result.metrics, result.trades, result.time, result.equity, result.position
+
+
+class WalkForward:
+    """Walk-forward optimizer over one preloaded bar DataFrame, parallel across processes."""
+
+    def __init__(
+        self,
+        strategy_cls: Type[BaseStrategy],
+        base_params: Any,
+        grid: Dict[str, List[Any]],
+        in_sample: int,
+        out_of_sample: int,
+        anchored: bool = False,
+        objective: str = 'sharpe',
+        workers: Optional[int] = None,
+        start_cash: float = 100000.0,
+        slippage: float = 0.0001,
+        commission: float = 0.0002,
+        queue: Optional['BacktestQueue'] = None,
+        risk: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.strategy_cls = strategy_cls
+        self.base_params = base_params
+        self.combos = expand_grid(grid)
+        # Validate every parameter set up front: a bad grid value is a caller error, not a losing combination
+        self.params = []
+        for combo in self.combos:
+            try:
+                self.params.append(apply_overrides(base_params, combo))
+            except ValueError as e:
+                raise ValueError(f"Invalid walk-forward parameter set {combo}: {e}") from e
+        self.in_sample = in_sample
+        self.out_of_sample = out_of_sample
+        self.anchored = anchored
+        self.objective = objective
+        self.workers = workers or os.cpu_count()
+        self.sim = {'start_cash': start_cash, 'slippage': slippage, 'commission': commission}
+        if risk is not None:
+            # Risk limits (RiskConfig fields) apply to every replay, in-sample and out-of-sample
+            self.sim['risk'] = risk
+        # With a BacktestQueue, replays run on distributed workers instead of a local process pool
+        self.queue = queue
+
+    def run(self, df: pd.DataFrame, timeframe: str = '1Min') -> Dict[str, Any]:
+        folds = make_folds(len(df), self.in_sample, self.out_of_sample, self.anchored)
+        if not folds:
+            raise ValueError(f"Not enough bars ({len(df)}) for an in-sample window of {self.in_sample}")
+        where = f"queue '{self.queue.name}'" if self.queue is not None else f"{self.workers} workers"
+        log.info("starting walk-forward", folds=len(folds), parameter_sets=len(self.combos), on=where)
+
+        if self.queue is not None:
+            best, oos = self._optimize_on_queue(df, folds, timeframe)
+        else:
+            best, oos = self._optimize_local(df, folds, timeframe)
+
+        # Stitch out-of-sample curves: each fold starts from the previous fold's ending equity
+        start_cash = self.sim['start_cash']
+        times, equities, positions, fold_ids, trades = [], [], [], [], []
+        carry = start_cash
+        offset = 0
+        fold_reports = []
+        for fold, metrics, fold_trades, t, eq, pos in oos:
+            is_start, is_end, oos_start, oos_end = folds[fold]
+            # Re-index trade bars onto the stitched curve
+            trades.extend({**tr, 'bar': tr['bar'] + offset} for tr in fold_trades)
+            offset += len(t)
+            equities.append(eq * (carry / start_cash))
+            carry = equities[-1][-1]
+            times.append(t)
+            positions.append(pos)
+            fold_ids.append(np.full(len(t), fold, dtype=np.int32))
+            fold_reports.append({
+                'fold': fold,
+                'in_sample': (str(df.index[is_start]), str(df.index[is_end - 1])),
+                'out_of_sample': (str(df.index[oos_start]), str(df.index[oos_end - 1])),
+                'params': self.combos[best[fold][1]],
+                'in_sample_score': best[fold][0],
+                'out_of_sample_metrics': metrics,
+            })
+
+        time = np.concatenate(times)
+        equity = np.concatenate(equities)
+        position = np.concatenate(positions)
+        fills = np.fromiter((tr['bar'] for tr in trades), dtype=np.int64, count=len(trades))
+        metrics = {
+            'start_cash': start_cash,
+            'final_cash': float(equity[-1]),
+            'total_return': float(equity[-1] / start_cash - 1),
+        }
+        metrics.update(analytics.summarize(equity, position, fills, timeframe))
+        return {
+            'folds': fold_reports,
+            'metrics': metrics,
+            'trades': trades,
+            'time': time,
+            'equity': equity,
+            'position': position,
+            'fold': np.concatenate(fold_ids),
+        }
+
+    def _optimize_local(self, df: pd.DataFrame, folds: List[Tuple[int, int, int, int]], timeframe: str):
+        """Run both stages in a local process pool; returns (best per fold, out-of-sample runs)."""
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(df, self.strategy_cls, self.base_params, self.sim, timeframe)
+        ) as pool:
+            # Stage 1: every (fold, parameter set) in-sample replay is an independent task
+            best: Dict[int, Tuple[float, int, Dict[str, Any]]] = {}
+            for fold, combo, score, metrics in self._score_folds(pool, folds):
+                if fold not in best or score > best[fold][0]:
+                    best[fold] = (score, combo, metrics)
+
+            # Stage 2: evaluate each fold's winner on the following out-of-sample window
+            oos_tasks = [(f, os_, oe, self.combos[best[f][1]]) for f, (_, _, os_, oe) in enumerate(folds)]
+            oos = sorted(pool.map(_run_out_of_sample, oos_tasks), key=lambda r: r[0])
+        return best, oos
+
+    def _optimize_on_queue(self, df: pd.DataFrame, folds: List[Tuple[int, int, int, int]], timeframe: str):
+        """Run both stages as jobs on the Redis queue, for workers on any number of hosts."""
+        bars = self.queue.put_bars(df)
+        params = self.params
+        tasks = [(f, c) for f in range(len(folds)) for c in range(len(self.combos))]
+        specs = [self.queue.job(self.strategy_cls, params[c], bars, timeframe, self.sim, folds[f][0], folds[f][1])
+                 for f, c in tasks]
+        best: Dict[int, Tuple[float, int, Dict[str, Any]]] = {}
+        for (fold, combo), result in zip(tasks, self.queue.map(specs)):
+            if isinstance(result, Exception):
+                log.error("parameter set failed", fold=fold, parameter_set=combo, error=str(result))
+                score, metrics = float('-inf'), {}
+            else:
+                score, metrics = objective_score(result.metrics, self.objective), result.metrics
+            if fold not in best or score > best[fold][0]:
+                best[fold] = (score, combo, metrics)
+
+        # Out-of-sample windows are primed on the in-sample bars before them, as in _run_out_of_sample
+        specs = []
+        for f, (_, _, os_, oe) in enumerate(folds):
+            winner = params[best[f][1]]
+            warmup = min(os_, Backtester(self.strategy_cls, winner, None, **self.sim).warmup_bars())
+            specs.append(self.queue.job(self.strategy_cls, winner, bars, timeframe, self.sim, os_, oe, warmup))
+        oos = []
+        for fold, result in enumerate(self.queue.map(specs)):
+            if isinstance(result, Exception):
+                raise RuntimeError(f"Out-of-sample replay of fold {fold} failed: {result}")
+            oos.append((fold, result.metrics, result.trades, result.time, result.equity, result.position))
+        return best, oos
+
+    def _score_folds(self, pool: ProcessPoolExecutor, folds: List[Tuple[int, int, int, int]]):
+        """Yield (fold, combo index, score, metrics) for every in-sample replay."""
+        if BatchBacktester.supports(self.strategy_cls, self.params):
+            # Strategies with a batch kernel replay a block of parameter sets per task, sized so
+            # that every worker still gets about two tasks
+            block = max(1, math.ceil(len(self.combos) * len(folds) / (self.workers * 2)))
+            tasks = [(f, s, e, list(range(lo, min(lo + block, len(self.combos)))), self.combos[lo:lo + block], self.objective)
+                     for f, (s, e, _, _) in enumerate(folds)
+                     for lo in range(0, len(self.combos), block)]
+            for scored in pool.map(_score_in_sample_batch, tasks):
+                yield from scored
+            return
+        tasks = [(f, s, e, c, combo, self.objective)
+                 for f, (s, e, _, _) in enumerate(folds)
+                 for c, combo in enumerate(self.combos)]
+        yield from pool.map(_score_in_sample, tasks, chunksize=max(1, len(tasks) // (self.workers * 4)))
+
+    def save(self, result: Dict[str, Any], directory: str = 'backtests') -> str:
+        """Write the stitched out-of-sample curve to a columnar .npz file."""
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        filename = f"{directory}/walkforward-{self.strategy_cls.__name__}-{timestamp}.npz"
+        save_backtest(filename, result['trades'], result['time'], result['equity'], result['position'],
+                      fold=result['fold'], start_cash=np.float64(result['metrics']['start_cash']))
+        return filename
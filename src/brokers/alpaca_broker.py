@@ -3,6 +3,9 @@ from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import LimitOrderRequest, MarketOrderRequest, GetOrdersRequest
 from alpaca.trading.enums import OrderSide, TimeInForce, QueryOrderStatus
 from src.brokers.base_broker import BaseBroker
+from src.log import get_logger
+
+log = get_logger(__name__)
 
 class AlpacaBroker(BaseBroker):
     """Broker wrapper for Alpaca Trading API."""
@@ -31,6 +34,10 @@ class AlpacaBroker(BaseBroker):
         )
         return await self.client.get_orders(filter=request_params)
 
+    async def get_order(self, order_id):
+        """Fetch one order by id."""
+        return self.client.get_order_by_id(order_id)
+
     async def place_order(self, side: str, size: float, price: float, symbol: str, order_type: str):
         """Place an order on Alpaca, branching between market and limit types."""
         # Convert string side into OrderSide enum
@@ -51,6 +58,11 @@ class AlpacaBroker(BaseBroker):
                 side=order_side,
                 time_in_force=TimeInForce.DAY
             )
-        print(f"[AlpacaBroker] Placing order: {order_req}")
+        log.info("placing order", order=order_req)
         # Submit the order to Alpaca and return the response
-        return self.client.submit_order(order_data=order_req)
\ No newline at end of file
+        return self.client.submit_order(order_data=order_req)
+
+    async def cancel_order(self, order_id):
+        """Cancel an open order on Alpaca by id."""
+        log.info("cancelling order", order_id=order_id)
+        return self.client.cancel_order_by_id(order_id)
@@ -18,6 +18,10 @@ class BaseBroker(ABC):
         """Get orders with given status (open, closed, all) and side (buy, sell)."""
         raise NotImplementedError
 
+    async def get_order(self, order_id):
+        """Get one order by its broker order id (status, filled_qty, filled_avg_price)."""
+        raise NotImplementedError
+
     @abstractmethod
     async def place_order(
         self,
@@ -28,4 +32,8 @@ class BaseBroker(ABC):
         order_type: str = "market"
     ):
         """Place an order with side, size, price, symbol, and order type (market or limit, defaulting to market)."""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def cancel_order(self, order_id):
+        """Cancel an open order by its broker order id."""
+        raise NotImplementedError
@@ -0,0 +1,54 @@
+# LeaderGatedBroker: routes orders only while this instance holds the hot-standby leader lease
+from src.brokers.base_broker import BaseBroker
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+
+class LeaderGatedBroker(BaseBroker):
+    """Wraps the live broker for hot-standby pairs.
+
+    Account, position and order queries always go to the live broker. Orders are placed only
+    while the lease is held (LeaderLease.leading(), answered from memory so the event loop never
+    waits on Redis). That state lapses shortly before the lease could expire in Redis, so a stalled
+    former primary cannot trade after a standby has taken over.
+    """
+
+    def __init__(self, live_broker, lease):
+        self.live_broker = live_broker
+        self.lease = lease
+        self.suppressed_orders = 0
+
+    async def get_account(self):
+        return await self.live_broker.get_account()
+
+    async def get_all_positions(self):
+        return await self.live_broker.get_all_positions()
+
+    async def get_orders(self, status: str = "open", side: str = "sell"):
+        return await self.live_broker.get_orders(status=status, side=side)
+
+    async def get_order(self, order_id):
+        return await self.live_broker.get_order(order_id)
+
+    async def place_order(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        symbol: str,
+        order_type: str = "market"
+    ):
+        """Forward the order if this instance is the leader, otherwise count and drop it."""
+        if not self.lease.leading():
+            self.suppressed_orders += 1
+            log.debug("standby, not routing order", side=side, size=size, symbol=symbol)
+            return None
+        return await self.live_broker.place_order(side=side, size=size, price=price, symbol=symbol, order_type=order_type)
+
+    async def cancel_order(self, order_id):
+        """Cancels are forwarded only by the leader, like orders."""
+        if not self.lease.leading():
+            log.debug("standby, not cancelling order", order_id=order_id)
+            return None
+        return await self.live_broker.cancel_order(order_id)
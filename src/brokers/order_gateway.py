@@ -0,0 +1,303 @@
+# OrderGateway: rate-limited, prioritized order routing between strategies and a live broker
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.brokers.base_broker import BaseBroker
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+# Queue priorities, most urgent first
+PRIORITY_CANCEL, PRIORITY_EXIT, PRIORITY_ENTRY = 0, 1, 2
+PRIORITY_NAMES = {PRIORITY_CANCEL: 'cancel', PRIORITY_EXIT: 'exit', PRIORITY_ENTRY: 'entry'}
+# Sent limit orders remembered for cancels
+MAX_RESTING = 10_000
+
+
+class TokenBucket:
+    """`rate` requests per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError('Token bucket needs a positive rate and a burst of at least 1')
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+
+class _Request:
+    """One queued broker call; coalesced market orders share a request, one (future, signed size) per caller."""
+
+    __slots__ = ('seq', 'priority', 'kind', 'symbol', 'order_type', 'price', 'net', 'order_id', 'callers', 'enqueued')
+
+    def __init__(self, seq: int, priority: int, kind: str, symbol: Optional[str] = None, order_type: Optional[str] = None,
+                 price: Optional[float] = None, net: float = 0.0, order_id: Any = None) -> None:
+        self.seq = seq
+        self.priority = priority
+        self.kind = kind
+        self.symbol = symbol
+        self.order_type = order_type
+        self.price = price
+        # Signed size: BUY positive, SELL negative
+        self.net = net
+        self.order_id = order_id
+        self.callers: List[Tuple[Future, float]] = []
+        self.enqueued = time.perf_counter()
+
+    @property
+    def mergeable(self) -> bool:
+        # Limit orders rest under their own id, which callers reprice and cancel, so they are never shared
+        return self.kind == 'order' and self.order_type.lower() == 'market'
+
+    @property
+    def key(self) -> Tuple:
+        return (self.symbol, self.order_type.lower())
+
+
+def _allocation(result, signed: float, symbol: str):
+    """One caller's share of a coalesced market order: its own side and size, the order's fill price.
+
+    It has no id: the merged order belongs to no single caller, so none of them may cancel it.
+    """
+    return SimpleNamespace(id=None, side='BUY' if signed > 0 else 'SELL', qty=abs(signed), symbol=symbol,
+                           filled_avg_price=getattr(result, 'filled_avg_price', None), order=result)
+
+
+class OrderGateway(BaseBroker):
+    """Sits between strategies and a live broker so their orders share one request budget.
+
+    Orders and cancels are queued and sent one at a time from the gateway's own thread and event
+    loop, at most `rate` per second with bursts of `burst` (Alpaca allows 200 requests a minute).
+    Cancels go first, then exits, then entries, each in arrival order. An order is an exit if it
+    reduces the position the gateway has routed for its symbol so far; orders that fail and
+    resting orders that are cancelled are taken back out of that position. A queued market order
+    is merged with an earlier queued market order for the same symbol: duplicates add up and
+    opposing orders net, so two strategies buying and selling the same symbol on one bar cost one
+    request, or none if they cancel out. A caller alone in its request gets the broker's
+    response; callers of a merged order each get their own allocation (see _allocation), or None
+    if it netted to zero. Limit orders are never merged. Account, position and order queries
+    bypass the queue.
+    """
+
+    def __init__(self, broker, rate: float = 200 / 60, burst: int = 10) -> None:
+        self.broker = broker
+        self.bucket = TokenBucket(rate, burst)
+        # Net size routed per symbol, used to tell exits from entries
+        self.positions: Dict[str, float] = {}
+        # Resting orders sent, by broker id: (symbol, signed size), so a cancel can take them back out
+        self.resting: Dict[Any, Tuple[str, float]] = {}
+        self._queue: List[_Request] = []
+        self._open: Dict[Tuple, _Request] = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        # Seconds from enqueue to send, per priority
+        self.queue_delay: Dict[int, deque] = {p: deque(maxlen=10_000) for p in PRIORITY_NAMES}
+        self.sent = 0
+        self.coalesced = 0
+        self.netted = 0
+        self.throttled = 0
+        self.errors = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='order-gateway', daemon=True)
+        self._thread.start()
+
+    async def get_account(self):
+        return await self.broker.get_account()
+
+    async def get_all_positions(self):
+        return await self.broker.get_all_positions()
+
+    async def get_orders(self, status: str = "open", side: str = "sell"):
+        return await self.broker.get_orders(status=status, side=side)
+
+    async def get_order(self, order_id):
+        return await self.broker.get_order(order_id)
+
+    async def place_order(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        symbol: str,
+        order_type: str = "market"
+    ):
+        """Queue the order and wait until it (or the order it was merged into) has been sent."""
+        return await asyncio.wrap_future(self.submit(side, size, price, symbol, order_type))
+
+    async def cancel_order(self, order_id):
+        """Queue a cancel ahead of all orders and wait for the broker's answer."""
+        future: Future = Future()
+        with self._cond:
+            self._check_open()
+            request = _Request(self._next_seq(), PRIORITY_CANCEL, 'cancel', order_id=order_id)
+            request.callers.append((future, 0.0))
+            self._queue.append(request)
+            self._cond.notify()
+        return await asyncio.wrap_future(future)
+
+    def submit(self, side: str, size: float, price: float, symbol: str, order_type: str = "market") -> Future:
+        """Thread-safe enqueue; the future resolves to the broker's response (None if netted out)."""
+        signed = size if side.upper() == 'BUY' else -size
+        future: Future = Future()
+        with self._cond:
+            self._check_open()
+            held = self.positions.get(symbol, 0.0)
+            self.positions[symbol] = held + signed
+            priority = PRIORITY_EXIT if held * signed < 0 else PRIORITY_ENTRY
+            request = _Request(self._next_seq(), priority, 'order', symbol, order_type, price, signed)
+            queued = self._open.get(request.key) if request.mergeable else None
+            if queued is not None:
+                queued.net += signed
+                queued.priority = min(queued.priority, priority)
+                queued.callers.append((future, signed))
+                self.coalesced += 1
+                if abs(queued.net) < 1e-9:
+                    # Opposing orders cancelled out: nothing to send
+                    self._queue.remove(queued)
+                    del self._open[queued.key]
+                    self.netted += len(queued.callers)
+                    for f, _ in queued.callers:
+                        f.set_result(None)
+                return future
+            request.callers.append((future, signed))
+            self._queue.append(request)
+            if request.mergeable:
+                self._open[request.key] = request
+            self._cond.notify()
+        return future
+
+    def _check_open(self) -> None:
+        if self._stopped:
+            raise RuntimeError('OrderGateway is closed')
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def _next_request(self) -> Optional[_Request]:
+        with self._cond:
+            while True:
+                if not self._queue:
+                    if self._stopped:
+                        return None
+                    self._cond.wait()
+                    continue
+                wait = self.bucket.wait_time()
+                if wait <= 0:
+                    break
+                # Out of tokens; orders arriving meanwhile are still prioritized and merged
+                self.throttled += 1
+                self._cond.wait(wait)
+            request = min(self._queue, key=lambda r: (r.priority, r.seq))
+            self._queue.remove(request)
+            if request.mergeable:
+                del self._open[request.key]
+            self.bucket.take()
+            self.queue_delay[request.priority].append(time.perf_counter() - request.enqueued)
+        return request
+
+    async def _send(self, request: _Request):
+        if request.kind == 'cancel':
+            return await self.broker.cancel_order(request.order_id)
+        return await self.broker.place_order(
+            side='BUY' if request.net > 0 else 'SELL',
+            size=abs(request.net),
+            price=request.price,
+            symbol=request.symbol,
+            order_type=request.order_type
+        )
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        while True:
+            request = self._next_request()
+            if request is None:
+                break
+            try:
+                result = self._loop.run_until_complete(self._send(request))
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                    if request.kind == 'order':
+                        # Nothing was routed: a later order must not count as an exit of this one
+                        for _, signed in request.callers:
+                            self._unroute(request.symbol, signed)
+                log.error("request failed", kind=request.kind, symbol=request.symbol, error=str(e))
+                for future, _ in request.callers:
+                    future.set_exception(e)
+                continue
+            with self._cond:
+                self.sent += 1
+                self._settle(request, result)
+            if len(request.callers) == 1:
+                request.callers[0][0].set_result(result)
+            else:
+                for future, signed in request.callers:
+                    future.set_result(_allocation(result, signed, request.symbol))
+        self._loop.close()
+
+    def _unroute(self, symbol: str, signed: float) -> None:
+        self.positions[symbol] = self.positions.get(symbol, 0.0) - signed
+
+    def _settle(self, request: _Request, result) -> None:
+        """Track a sent resting order by id, or take a successfully cancelled one out of the routed position."""
+        if request.kind == 'cancel':
+            resting = self.resting.pop(request.order_id, None)
+            if resting is not None:
+                symbol, signed = resting
+                # Shares that filled before the cancel stay routed
+                filled = float(getattr(result, 'filled_qty', None) or 0.0)
+                self._unroute(symbol, signed - (filled if signed > 0 else -filled))
+            return
+        order_id = getattr(result, 'id', None)
+        if order_id is not None and not request.mergeable:
+            self.resting[order_id] = (request.symbol, request.net)
+            if len(self.resting) > MAX_RESTING:
+                # Orders that fill are never reported here; forget the oldest
+                del self.resting[next(iter(self.resting))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                'sent': self.sent,
+                'queued': len(self._queue),
+                'coalesced': self.coalesced,
+                'netted': self.netted,
+                'throttled': self.throttled,
+                'errors': self.errors,
+            }
+            for priority, name in PRIORITY_NAMES.items():
+                delays = self.queue_delay[priority]
+                stats[f'{name}_delay_ms_p50'] = float(np.percentile(delays, 50) * 1000) if delays else float('nan')
+                stats[f'{name}_delay_ms_p99'] = float(np.percentile(delays, 99) * 1000) if delays else float('nan')
+        return stats
+
+    def close(self) -> None:
+        """Send what is still queued, then stop the gateway thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
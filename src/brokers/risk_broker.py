@@ -0,0 +1,150 @@
+# RiskCheckedBroker: every order is approved by the account's RiskEngine before it reaches the broker
+from typing import Optional, Tuple
+
+from src.brokers.base_broker import BaseBroker
+from src.log import get_logger
+from src.risk import EPSILON, RiskEngine, RiskRejected
+
+log = get_logger(__name__)
+
+# Order statuses after which nothing more fills (Alpaca OrderStatus values)
+DONE_STATUSES = ('filled', 'canceled', 'expired', 'rejected', 'replaced', 'done_for_day')
+
+
+def _fill_price(result, price: float) -> float:
+    """Average fill price from a broker's order response (e.g. an Alpaca Order), else the order price."""
+    filled = getattr(result, 'filled_avg_price', None)
+    return float(filled) if filled is not None else price
+
+
+def _commission(result) -> float:
+    """Commission reported with a fill (SimulatedBroker); brokers that report none charge none."""
+    return float(getattr(result, 'commission', None) or 0.0)
+
+
+def _status(order) -> str:
+    status = getattr(order, 'status', None)
+    return str(getattr(status, 'value', status)).lower()
+
+
+def _holding(position) -> Tuple[str, float, float]:
+    """(symbol, signed size, entry price) of an Alpaca Position or a SimulatedBroker position record."""
+    if isinstance(position, dict):
+        symbol, size, price, side = position['symbol'], position['size'], position['entry'], position['side']
+    else:
+        symbol, size, price, side = position.symbol, position.qty, position.avg_entry_price, position.side
+    size = abs(float(size))
+    return symbol, -size if str(getattr(side, 'value', side)).lower() == 'short' else size, float(price)
+
+
+class RiskCheckedBroker(BaseBroker):
+    """Wraps the live broker (normally the OrderGateway) with pre-trade checks.
+
+    Rejected orders are logged and raise RiskRejected, which strategies catch to stay flat; they
+    need no risk limits of their own. An order the broker accepts counts as filled at its reported
+    average fill price and commission, or at the order price if it has not filled yet. A None
+    response (a shadow signal, or an order netted away by the gateway) counts as filled at the
+    order price. A resting limit or stop order instead keeps its open-order slot and reserved
+    exposure until it is reported filled (fill(), or its status on the symbol's next order) or
+    is cancelled. Before the first order the engine reads the account's open positions and,
+    unless it was given, its starting equity.
+    """
+
+    def __init__(self, live_broker, risk: RiskEngine):
+        self.live_broker = live_broker
+        self.risk = risk
+        # Accepted orders not yet filled, by broker id: (symbol, signed size, order price, reserved exposure)
+        self.resting = {}
+
+    async def get_account(self):
+        return await self.live_broker.get_account()
+
+    async def get_all_positions(self):
+        return await self.live_broker.get_all_positions()
+
+    async def get_orders(self, status: str = "open", side: str = "sell"):
+        return await self.live_broker.get_orders(status=status, side=side)
+
+    async def get_order(self, order_id):
+        return await self.live_broker.get_order(order_id)
+
+    async def _sync(self) -> None:
+        """Seed the engine from the account before the first order."""
+        if self.risk.start_equity is None:
+            try:
+                account = await self.live_broker.get_account()
+                self.risk.start_equity = float(getattr(account, 'equity', account.cash))
+            except Exception:
+                # Brokers without account access (e.g. ShadowBroker) skip equity-based limits
+                self.risk.start_equity = 0.0
+        if not self.risk.synced:
+            try:
+                positions = [_holding(p) for p in await self.live_broker.get_all_positions()]
+            except Exception as e:
+                log.warning("positions unavailable, risk books start flat", error=str(e))
+                positions = []
+            self.risk.load_positions(positions)
+
+    async def place_order(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        symbol: str,
+        order_type: str = "market"
+    ):
+        """Route the order if the risk engine approves it (else raise RiskRejected); settle the engine with the result."""
+        await self._sync()
+        if any(resting[0] == symbol for resting in self.resting.values()):
+            await self._reconcile(symbol)
+        signed = size if side.upper() == 'BUY' else -size
+        try:
+            reserved = self.risk.approve(symbol, signed, price)
+        except RiskRejected as e:
+            log.warning("order rejected", side=side, reason=str(e))
+            raise
+        try:
+            result = await self.live_broker.place_order(side=side, size=size, price=price, symbol=symbol, order_type=order_type)
+        except BaseException:
+            self.risk.release(symbol, reserved)
+            raise
+        order_id = getattr(result, 'id', None)
+        if order_id is not None and order_type.lower() != 'market' and getattr(result, 'filled_avg_price', None) is None:
+            self.resting[order_id] = (symbol, signed, price, reserved)
+        else:
+            self.risk.on_fill(symbol, signed, _fill_price(result, price), _commission(result), reserved)
+        return result
+
+    def fill(self, order_id, price: Optional[float] = None, size: Optional[float] = None, commission: float = 0.0) -> None:
+        """Settle a resting order that is done: `size` filled (all of it if None) at `price` (else the order price)."""
+        resting = self.resting.pop(order_id, None)
+        if resting is None:
+            return
+        symbol, signed, order_price, reserved = resting
+        if size is not None:
+            signed = size if signed > 0 else -size
+        if abs(signed) <= EPSILON:
+            self.risk.release(symbol, reserved)
+        else:
+            self.risk.on_fill(symbol, signed, order_price if price is None else price, commission, reserved)
+
+    async def _reconcile(self, symbol: str) -> None:
+        """Settle the symbol's resting orders that the broker reports done."""
+        for order_id in [k for k, resting in self.resting.items() if resting[0] == symbol]:
+            try:
+                order = await self.live_broker.get_order(order_id)
+            except Exception as e:
+                # The order keeps counting until a later check can tell how it ended
+                log.warning("order status unavailable", order_id=order_id, error=str(e))
+                continue
+            resting = self.resting.get(order_id)
+            if resting is not None and _status(order) in DONE_STATUSES:
+                filled = float(getattr(order, 'filled_qty', None) or 0.0)
+                self.fill(order_id, _fill_price(order, resting[2]), filled, _commission(order))
+
+    async def cancel_order(self, order_id):
+        result = await self.live_broker.cancel_order(order_id)
+        resting = self.resting.pop(order_id, None)
+        if resting is not None:
+            self.risk.release(resting[0], resting[3])
+        return result
@@ -1,8 +1,11 @@
 # ShadowBroker class for logging signals instead of placing orders
 from src.brokers.base_broker import BaseBroker
+from src.log import get_logger
 import os
 import httpx
 
+log = get_logger(__name__)
+
 class ShadowBroker(BaseBroker):
     """Broker that logs signals instead of placing orders."""
     def __init__(self, paper: bool = False, **kwargs):
@@ -13,7 +16,7 @@ class ShadowBroker(BaseBroker):
         self.webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
 
         if not self.webhook_url:
-            print("Warning: No Discord webhook URL configured; Discord notifications disabled")
+            log.warning("no Discord webhook URL configured; Discord notifications disabled")
 
     async def place_order(
         self,
@@ -25,9 +28,13 @@ class ShadowBroker(BaseBroker):
     ):
         """Log shadow order signals; 'order_type' parameter is accepted but ignored."""
         message = f"Shadow Signal -> {side} {size} @ {price} ({symbol})"
-        print(message)
+        log.info("shadow signal", side=side, size=size, price=price, symbol=symbol)
         if self.webhook_url:
             payload = {"content": message}
             async with httpx.AsyncClient() as client:
                 await client.post(self.webhook_url, json=payload)
-        return None 
\ No newline at end of file
+        return None
+
+    async def cancel_order(self, order_id):
+        """Shadow orders are never placed, so there is nothing to cancel."""
+        return None
@@ -16,6 +16,15 @@ class SimulatedBroker:
         self.commission = commission
         self.trades = []  # list of trade records
         self.positions = []  # open positions
+        # Net open size so equity can be marked in O(1) per bar
+        self.net_size = 0.0  # signed size: long positive, short negative
+        # Index and UTC timestamp (ns) of the bar currently being replayed (set by the Backtester)
+        self.bar_index = -1
+        self.bar_time = None
+        # Close of that bar; open positions are marked at it in get_account
+        self.mark = 0.0
+        # OrderLifecycleManager on this broker's simulated clock; the Backtester advances it to each bar's timestamp
+        self.lifecycle = None
 
     async def place_order(
         self,
@@ -24,8 +33,11 @@ class SimulatedBroker:
         price: float,
         symbol: str,
         order_type: str = "limit"
-    ) -> None:
-        """Execute order immediately with slippage & commission. 'symbol' and 'order_type' parameters are accepted but ignored."""
+    ) -> SimpleNamespace:
+        """Execute order immediately with slippage & commission and return its fill (filled_avg_price, commission).
+
+        'symbol' and 'order_type' parameters are accepted but ignored.
+        """
         # adjust for slippage
         fill_price = price * (1 + self.slippage) if side.upper() == 'BUY' else price * (1 - self.slippage)
         cost = fill_price * size
@@ -35,23 +47,45 @@ class SimulatedBroker:
         if side.upper() == 'BUY':
             self.cash -= cost + fee
             self.positions.append({'symbol': symbol, 'side': 'LONG', 'size': size, 'entry': fill_price, 'commission': fee})
+            signed = size
         else:
             # SELL means short
             self.cash += cost - fee
             self.positions.append({'symbol': symbol, 'side': 'SHORT', 'size': size, 'entry': fill_price, 'commission': fee})
+            signed = -size
+        self.net_size += signed
 
         # record trade
-        self.trades.append({'side': side.upper(), 'size': size, 'price': fill_price, 'commission': fee})
+        self.trades.append({'symbol': symbol, 'bar': self.bar_index, 'side': side.upper(), 'size': size, 'price': fill_price, 'commission': fee})
+        return SimpleNamespace(filled_avg_price=fill_price, commission=fee)
+
+    def equity(self, price: float) -> float:
+        """Cash plus the signed market value of open positions at the given mark price."""
+        # Fills already moved their notional and fee through cash, so nothing else is owed
+        return self.cash + self.net_size * price
 
     def close_positions(self, last_price: float) -> None:
         """Mark-to-market and close all open positions at last_price."""
-        for pos in self.positions:
-            if pos['side'] == 'LONG':
-                pnl = (last_price - pos['entry']) * pos['size'] - pos['commission']
-            else:
-                pnl = (pos['entry'] - last_price) * pos['size'] - pos['commission']
-            self.cash += pnl
+        self.cash = self.equity(last_price)
         self.positions = []
+        self.net_size = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the account, open positions and trade log (see restore)."""
+        return {
+            'cash': self.cash,
+            'trades': [dict(t) for t in self.trades],
+            'positions': [dict(p) for p in self.positions],
+            'net_size': self.net_size,
+            'bar_index': self.bar_index,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.cash = state['cash']
+        self.trades = [dict(t) for t in state['trades']]
+        self.positions = [dict(p) for p in state['positions']]
+        self.net_size = state['net_size']
+        self.bar_index = state['bar_index']
 
     def performance(self) -> Dict[str, Any]:
         """Return basic performance metrics."""
@@ -63,9 +97,8 @@ class SimulatedBroker:
         }
 
     async def get_account(self):
-        """Return simulated account with cash and equity attributes."""
-        # Simulated equity equals current cash (ignoring open positions for simplicity)
-        return SimpleNamespace(cash=self.cash, equity=self.cash)
+        """Return simulated account with cash and equity (open positions marked at the current bar's close)."""
+        return SimpleNamespace(cash=self.cash, equity=self.equity(self.mark))
 
     async def get_all_positions(self):
         """Return a list of current open positions."""
@@ -73,4 +106,4 @@ class SimulatedBroker:
 
     async def get_orders(self, status: str = "open", side: str = "sell"):
         """Return empty list (no order book in simulation)."""
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,51 @@
+# WarmupBroker: stands in for the live broker while history is replayed through a strategy
+from types import SimpleNamespace
+
+from src.brokers.base_broker import BaseBroker
+
+
+class WarmupBroker(BaseBroker):
+    """Broker that swallows orders and answers account queries from one cached snapshot.
+
+    Used during warm-up so replayed bars build indicator state without trading or hitting the API
+    on every bar.
+    """
+
+    def __init__(self, live_broker=None):
+        self.live_broker = live_broker
+        self._account = None
+        self.suppressed_orders = 0
+
+    async def get_account(self):
+        """Fetch the live account once, then keep returning that snapshot."""
+        if self._account is None:
+            try:
+                self._account = await self.live_broker.get_account()
+            except Exception:
+                # Brokers without account access (e.g. ShadowBroker) still need a usable answer
+                self._account = SimpleNamespace(cash=0.0, equity=0.0)
+        return self._account
+
+    async def get_all_positions(self):
+        """Warm-up never opens positions."""
+        return []
+
+    async def get_orders(self, status: str = "open", side: str = "sell"):
+        """Warm-up never leaves orders on the book."""
+        return []
+
+    async def place_order(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        symbol: str,
+        order_type: str = "market"
+    ):
+        """Count and drop the order."""
+        self.suppressed_orders += 1
+        return None
+
+    async def cancel_order(self, order_id):
+        """Warm-up never leaves orders on the book."""
+        return None
@@ -1,12 +1,11 @@
-from src.brokers.alpaca_broker import AlpacaBroker
-from src.brokers.shadow_broker import ShadowBroker
+from src.config.registry import PluginRegistry
 
-# Single source of truth for all brokers
-BROKER_CONFIG = {
-    AlpacaBroker.__name__: {
+# Single source of truth for all brokers (lazily imported; plugins via the entry-point group)
+BROKER_CONFIG = PluginRegistry("delfi.brokers", "broker_class", {
+    "AlpacaBroker": {
         "display_name": "Alpaca Broker",
-        "broker_class": AlpacaBroker,
+        "broker_class": "src.brokers.alpaca_broker:AlpacaBroker",
         "config_model": None  # no extra Pydantic model
     }
     # Future brokers can be added here
-} 
\ No newline at end of file
+})
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Optional
 from datetime import date
 import json
 
@@ -13,19 +13,98 @@ class SimulationConfig(BaseModel):
     commission: float = Field(0.0002)
     timeframe: str = Field("1Min")
     period: Period = Field(Period(start=date.today(), end=date.today()))
+    # Stream backtest history in chunks of this many bars instead of loading the whole period
+    chunk_bars: Optional[int] = Field(None, ge=1)
+
+class WalkForwardConfig(BaseModel):
+    """Walk-forward optimization settings; window lengths are in bars."""
+    in_sample: int = Field(..., ge=1)
+    out_of_sample: int = Field(..., ge=1)
+    anchored: bool = Field(False)
+    objective: str = Field("sharpe")
+    workers: Optional[int] = Field(None, ge=1)
+    # Parameter grid searched on every in-sample fold, e.g. {"short_window": [3, 5, 8]}
+    grid: Dict[str, List[Any]] = Field(default_factory=dict)
+    # Redis job queue name (REDIS_URL) to run replays on distributed workers instead of local processes
+    queue: Optional[str] = Field(None)
+
+class OptimizeConfig(BaseModel):
+    """Successive-halving parameter search settings."""
+    # {"param": [choices]} or {"param": {"low": 1, "high": 50, "log": false, "int": true}}
+    space: Dict[str, Any] = Field(default_factory=dict)
+    trials: int = Field(100, ge=1)
+    objective: str = Field("sharpe")
+    # Keep the top 1/eta of trials at each rung; the first rung is min_fraction of the bars
+    eta: int = Field(3, ge=2)
+    min_fraction: float = Field(1 / 27, gt=0, le=1)
+    workers: Optional[int] = Field(None, ge=1)
+    # JSONL study file; rerunning with the same settings resumes it
+    study: Optional[str] = Field(None)
+    seed: int = Field(0)
+
+class FeaturesConfig(BaseModel):
+    """Offline feature matrix settings for training a strategy's model."""
+    # Label: direction of the close this many bars ahead, flat within +-threshold (fraction)
+    horizon: int = Field(5, ge=1)
+    threshold: float = Field(0.0, ge=0)
+    partition_days: int = Field(20, ge=1)
+    workers: Optional[int] = Field(None, ge=1)
+    # Output directory; defaults to features/<strategy>-<symbol>-<timeframe>
+    out: Optional[str] = Field(None)
+    # Bars replayed through the strategy to check the matrix against live values (0 skips the check)
+    parity_bars: int = Field(20000, ge=0)
+
+class FailoverConfig(BaseModel):
+    """Hot-standby settings: instances sharing a group elect one leader through Redis (REDIS_URL)."""
+    group: str
+    # Leader lease in seconds; a standby takes over about this long after the primary stops renewing
+    lease: float = Field(2.0, gt=0)
 
 class StrategyItem(BaseModel):
     name: str
     enabled: bool = Field(True)
-    operation: Literal["backtest", "live"] = Field("backtest")
+    operation: Literal["backtest", "live", "walk_forward", "optimize", "features"] = Field("backtest")
     paper: bool = Field(False)
     shadow_mode: bool = Field(False)
     config: Dict[str, Any]
+    walk_forward: Optional[WalkForwardConfig] = Field(None)
+    optimize: Optional[OptimizeConfig] = Field(None)
+    features: Optional[FeaturesConfig] = Field(None)
+    failover: Optional[FailoverConfig] = Field(None)
+
+class GatewayConfig(BaseModel):
+    """Order gateway limits shared by every live strategy in the process."""
+    # Alpaca allows 200 order requests a minute per account
+    rate_per_minute: float = Field(200, gt=0)
+    burst: int = Field(10, ge=1)
+
+class AggregatorConfig(BaseModel):
+    """Health limits the AggregatorSupervisor applies to each symbol's bar_aggregator."""
+    # Interval at which the aggregator refreshes its heartbeat key
+    heartbeat_ms: int = Field(200, ge=10)
+    # Restart once the heartbeat is older than this many seconds
+    dead_after: float = Field(2.0, gt=0)
+    # Restart once a feed that delivered events stays silent this many seconds of the regular session
+    # (None: never); stale_after_symbols overrides it per symbol, e.g. for thinly traded names
+    stale_after: Optional[float] = Field(120.0, gt=0)
+    stale_after_symbols: Dict[str, Optional[float]] = Field(default_factory=dict)
+
+class RiskConfig(BaseModel):
+    """Pre-trade limits enforced across every live strategy on the account."""
+    # Reject new exposure once intraday PnL is down this fraction of the day's starting equity
+    daily_drawdown: float = Field(0.03, ge=0)
+    # Symbols with an open position
+    max_total_positions: int = Field(10, ge=1)
+    # Orders approved but not yet filled, per symbol
+    max_open_orders_per_symbol: int = Field(1, ge=1)
+    # Gross exposure as a multiple of starting equity (None: unlimited)
+    max_gross_exposure: Optional[float] = Field(None, gt=0)
 
 class BrokerItem(BaseModel):
     """Configuration for selecting and parameterizing a broker."""
     name: str
     config: Dict[str, Any]
+    gateway: GatewayConfig = Field(default_factory=GatewayConfig)
 
 class DataProviderItem(BaseModel):
     """Configuration for selecting and parameterizing a data provider."""
@@ -37,6 +116,7 @@ class Config(BaseModel):
     broker: BrokerItem
     data_provider: DataProviderItem
     strategies: List[StrategyItem]
+    risk: RiskConfig = Field(default_factory=RiskConfig)
 
     class Config:
         validate_by_name = True
@@ -1,11 +1,11 @@
-from src.data_providers.alpaca_data_provider import AlpacaDataProvider
+from src.config.registry import PluginRegistry
 
-# Single source of truth for all data providers
-DATA_PROVIDER_CONFIG = {
-    AlpacaDataProvider.__name__: {
+# Single source of truth for all data providers (lazily imported; plugins via the entry-point group)
+DATA_PROVIDER_CONFIG = PluginRegistry("delfi.data_providers", "provider_class", {
+    "AlpacaDataProvider": {
         "display_name": "Alpaca Data Provider",
-        "provider_class": AlpacaDataProvider,
+        "provider_class": "src.data_providers.alpaca_data_provider:AlpacaDataProvider",
         "config_model": None
     },
     # Future providers can be added here
-} 
\ No newline at end of file
+})
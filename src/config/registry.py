@@ -0,0 +1,98 @@
+# Lazy plugin registries: entries name their classes as 'module:attr' and import on first use
+from collections.abc import Mapping
+from importlib import import_module
+from typing import Any, Dict, Iterator
+
+
+def resolve(target: Any) -> Any:
+    """Import a 'package.module:attr' reference; anything else is returned unchanged."""
+    if not isinstance(target, str) or ':' not in target:
+        return target
+    module, _, attr = target.partition(':')
+    obj = import_module(module)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+class LazyEntry(Mapping):
+    """Registry metadata whose 'module:attr' values are imported when read."""
+
+    def __init__(self, meta: Dict[str, Any]) -> None:
+        self._meta = dict(meta)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._meta[key]
+        if key != 'display_name' and isinstance(value, str) and ':' in value:
+            value = self._meta[key] = resolve(value)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._meta)
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+
+class PluginRegistry(Mapping):
+    """Name -> metadata registry of built-ins plus installed plugins from an entry-point group.
+
+    A plugin is registered in its own package metadata, e.g. in pyproject.toml:
+
+        [project.entry-points."delfi.strategies"]
+        MyStrategy = "my_package.strategy:MyStrategy"
+
+    Entry points are discovered on first lookup; the target class is imported only when its
+    metadata key is read. Plugin classes may define `display_name` and `config_model` attributes.
+    """
+
+    def __init__(self, group: str, class_key: str, builtins: Dict[str, Dict[str, Any]]) -> None:
+        self.group = group
+        self.class_key = class_key
+        self._entries = {name: LazyEntry(meta) for name, meta in builtins.items()}
+        self._discovered = False
+
+    def _discover(self) -> None:
+        if self._discovered:
+            return
+        self._discovered = True
+        # importlib.metadata is comparatively slow to import; only pay for it when plugins are looked up
+        from importlib.metadata import entry_points
+        for ep in entry_points(group=self.group):
+            if ep.name not in self._entries:
+                self._entries[ep.name] = _PluginEntry(ep.name, ep.value, self.class_key)
+
+    def __getitem__(self, name: str) -> LazyEntry:
+        if name not in self._entries:
+            self._discover()
+        return self._entries[name]
+
+    def __iter__(self) -> Iterator[str]:
+        self._discover()
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        self._discover()
+        return len(self._entries)
+
+    def __contains__(self, name: object) -> bool:
+        if name not in self._entries:
+            self._discover()
+        return name in self._entries
+
+
+class _PluginEntry(LazyEntry):
+    """Entry-point metadata: display name and config model are read off the class when loaded."""
+
+    def __init__(self, name: str, target: str, class_key: str) -> None:
+        super().__init__({'display_name': name, class_key: target, 'config_model': None})
+        self._class_key = class_key
+        self._loaded = False
+
+    def __getitem__(self, key: str) -> Any:
+        if key != self._class_key and not self._loaded:
+            cls = super().__getitem__(self._class_key)
+            self._loaded = True
+            self._meta['display_name'] = getattr(cls, 'display_name', self._meta['display_name'])
+            self._meta['config_model'] = getattr(cls, 'config_model', None)
+        return super().__getitem__(key)
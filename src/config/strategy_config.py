@@ -1,19 +1,17 @@
-from src.strategies.ema_crossover.params import EMACrossoverParams
-from src.strategies.ema_crossover.strategy import EMACrossoverStrategy
-from src.strategies.high_edge.strategy import HighEdgeStrategy
-from src.strategies.high_edge.params import HighEdgeParams
+from src.config.registry import PluginRegistry
 
-# Single source of truth for all strategies
-STRATEGY_CONFIG = {
-    EMACrossoverStrategy.__name__: {
+# Single source of truth for all strategies. Classes are referenced as 'module:attr' and only
+# imported when a strategy is used; installed packages can add more via the entry-point group.
+STRATEGY_CONFIG = PluginRegistry("delfi.strategies", "strategy_class", {
+    "EMACrossoverStrategy": {
         "display_name": "EMA Crossover",
-        "strategy_class": EMACrossoverStrategy,
-        "config_model": EMACrossoverParams
+        "strategy_class": "src.strategies.ema_crossover.strategy:EMACrossoverStrategy",
+        "config_model": "src.strategies.ema_crossover.params:EMACrossoverParams"
     },
-    HighEdgeStrategy.__name__: {
+    "HighEdgeStrategy": {
         "display_name": "High Edge",
-        "strategy_class": HighEdgeStrategy,
-        "config_model": HighEdgeParams
+        "strategy_class": "src.strategies.high_edge.strategy:HighEdgeStrategy",
+        "config_model": "src.strategies.high_edge.params:HighEdgeParams"
     },
     # Future strategies can be added here
-} 
\ No newline at end of file
+})
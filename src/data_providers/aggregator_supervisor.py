@@ -0,0 +1,195 @@
+# Supervisor for the Rust bar aggregator: readiness handshake, heartbeat monitoring and restarts
+import os
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, time as dtime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import redis
+
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+MARKET_TZ = ZoneInfo('America/New_York')
+# Regular US equities session; outside it a silent feed is expected, not stalled
+SESSION_OPEN, SESSION_CLOSE = dtime(9, 30), dtime(16, 0)
+
+
+def session_open_ms(now: float) -> Optional[float]:
+    """Unix ms at which the regular session containing `now` (unix seconds) opened, or None outside it.
+
+    Weekdays 09:30-16:00 New York time; exchange holidays are not known here.
+    """
+    local = datetime.fromtimestamp(now, MARKET_TZ)
+    if local.weekday() >= 5 or not SESSION_OPEN <= local.time() < SESSION_CLOSE:
+        return None
+    return datetime.combine(local.date(), SESSION_OPEN, MARKET_TZ).timestamp() * 1000
+
+
+def wait_for_redis(client: redis.Redis, timeout: float = 10.0, interval: float = 0.05) -> None:
+    """Block until Redis answers PING, polling instead of sleeping a fixed time."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.ping()
+            return
+        except redis.exceptions.ConnectionError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Redis did not come up within {timeout:.1f}s")
+            time.sleep(interval)
+
+
+class AggregatorSupervisor:
+    """Run one bar_aggregator process per symbol and keep it alive.
+
+    start() launches the process and returns as soon as it writes the per-launch token to
+    `aggregator:<symbol>:ready` (after the stream confirms the subscription). A monitor thread then
+    checks every poll_interval that the process is running and that `aggregator:<symbol>:heartbeat`
+    (unix ms, written every heartbeat_ms) is fresher than dead_after; otherwise it kills and
+    relaunches the aggregator with exponential backoff.
+
+    The heartbeat only shows the aggregator's loop runs. `aggregator:<symbol>:last_event` (unix ms
+    of the last trade or quote received) catches a WebSocket that stalls without closing: once a
+    launch has received events, silence longer than stale_after during the regular session restarts
+    it too. Silence is counted from the session open at the earliest, so the overnight gap and the
+    quiet after the close never do; a launch that never receives any events is left running.
+    stale_after=None turns the check off (e.g. for symbols that can go minutes without a trade).
+    """
+
+    def __init__(
+        self,
+        binary: str,
+        symbol: str,
+        redis_client: redis.Redis,
+        ready_timeout: float = 15.0,
+        heartbeat_ms: int = 200,
+        dead_after: float = 2.0,
+        stale_after: Optional[float] = 120.0,
+        poll_interval: float = 0.1,
+        max_backoff: float = 30.0,
+        stable_after: float = 60.0
+    ) -> None:
+        if dead_after * 1000 <= heartbeat_ms:
+            raise ValueError(f"dead_after ({dead_after}s) must exceed the heartbeat interval ({heartbeat_ms}ms)")
+        self.binary = binary
+        self.symbol = symbol
+        self.redis = redis_client
+        self.ready_timeout = ready_timeout
+        self.heartbeat_ms = heartbeat_ms
+        self.dead_after = dead_after
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.ready_key = f"aggregator:{symbol}:ready"
+        self.heartbeat_key = f"aggregator:{symbol}:heartbeat"
+        self.last_event_key = f"aggregator:{symbol}:last_event"
+        self.proc: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self._started_at = 0.0
+        self._stop = threading.Event()
+        self._monitor_thread: Optional[threading.Thread] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.proc.pid if self.proc else None
+
+    def start(self) -> None:
+        """Launch the aggregator, wait for readiness and start monitoring; raises if it never becomes ready."""
+        if not self._launch():
+            self._kill()
+            raise RuntimeError(f"bar_aggregator for {self.symbol} did not become ready within {self.ready_timeout:.1f}s")
+        self._monitor_thread = threading.Thread(target=self._monitor, name=f"agg-supervisor-{self.symbol}", daemon=True)
+        self._monitor_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._kill()
+
+    def _launch(self) -> bool:
+        """Spawn a fresh process and wait for its readiness token. Returns False on exit or timeout."""
+        token = uuid.uuid4().hex
+        try:
+            self.redis.delete(self.ready_key, self.heartbeat_key, self.last_event_key)
+        except redis.exceptions.RedisError as e:
+            log.error("redis unavailable, bar_aggregator not launched", symbol=self.symbol, error=str(e))
+            return False
+        env = os.environ.copy()
+        env['SYMBOL'] = self.symbol
+        launched = time.monotonic()
+        # spawn without silencing stdout/stderr so we can see aggregator logs
+        self.proc = subprocess.Popen(
+            [self.binary, '--symbol', self.symbol, '--ready-token', token, '--heartbeat-ms', str(self.heartbeat_ms)],
+            env=env
+        )
+        log.info("launched bar_aggregator", pid=self.proc.pid, symbol=self.symbol)
+        deadline = launched + self.ready_timeout
+        while time.monotonic() < deadline and not self._stop.is_set():
+            if self.proc.poll() is not None:
+                log.error("bar_aggregator exited before ready", symbol=self.symbol, code=self.proc.returncode)
+                return False
+            try:
+                value = self.redis.get(self.ready_key)
+            except redis.exceptions.RedisError as e:
+                log.error("redis unavailable, readiness unknown", symbol=self.symbol, error=str(e))
+                return False
+            if value is not None and value.decode() == token:
+                self._started_at = time.monotonic()
+                log.info("bar_aggregator ready", symbol=self.symbol, seconds=round(self._started_at - launched, 3))
+                return True
+            time.sleep(0.02)
+        return False
+
+    def _kill(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def _fault(self) -> Optional[str]:
+        """Why the aggregator needs a restart, or None while it is healthy."""
+        if self.proc is None or self.proc.poll() is not None:
+            code = self.proc.poll() if self.proc else None
+            return f"exited with code {code}"
+        try:
+            beat, event = self.redis.mget(self.heartbeat_key, self.last_event_key)
+        except redis.exceptions.RedisError:
+            return "missed heartbeat"
+        now = time.time()
+        now_ms = now * 1000
+        if beat is None or now_ms - int(beat) > self.dead_after * 1000:
+            return "missed heartbeat"
+        if event is not None and self.stale_after is not None:
+            opened = session_open_ms(now)
+            if opened is not None and now_ms - max(int(event), opened) > self.stale_after * 1000:
+                return "feed stalled"
+        return None
+
+    def _monitor(self) -> None:
+        delay = 0.0
+        while not self._stop.wait(self.poll_interval):
+            reason = self._fault()
+            if reason is None:
+                # Only forget past failures once the process has stayed healthy for a while
+                if time.monotonic() - self._started_at >= self.stable_after:
+                    delay = 0.0
+                continue
+            log.warning("bar_aggregator down, restarting", symbol=self.symbol, reason=reason)
+            self._kill()
+            while not self._stop.is_set():
+                if delay:
+                    log.info("restarting bar_aggregator after backoff", symbol=self.symbol, delay=delay)
+                    if self._stop.wait(delay):
+                        return
+                # First restart after a healthy run is immediate, repeated failures back off
+                delay = min(max(delay * 2, 0.5), self.max_backoff)
+                self.restarts += 1
+                if self._launch():
+                    break
+                self._kill()
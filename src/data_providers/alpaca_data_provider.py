@@ -2,132 +2,166 @@
 import os
 import json
 import redis
-from src.data_providers.base_data_provider import BaseDataProvider
+from src.data_providers.base_data_provider import CHUNK_BARS, BaseDataProvider, rechunk
+from src.config.config import AggregatorConfig
+from src.data_providers.aggregator_supervisor import AggregatorSupervisor, wait_for_redis
+from src.data_providers.bar import Bar
+from src.data_providers.bar_cache import BarCache
+from src.data_providers.bar_resampler import MICROSTRUCTURE_FIELDS
+from src.data_providers.redis_publisher import BatchedRedisPublisher
+from src.data_providers.timeframes import timeframe_seconds
+from src.data_providers.trade_bars import raw_trades_to_arrays, resample_bars, trades_to_bars
+from src.log import get_logger
 from alpaca.data.live import StockDataStream
 from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
 import pandas as pd
 from datetime import datetime
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
+from alpaca.data.requests import StockBarsRequest, StockTradesRequest
 import subprocess
 import threading
 import pathlib
 import asyncio
-import time  # for warm-up delay
 import atexit
 
+log = get_logger(__name__)
+
 class AlpacaDataProvider(BaseDataProvider):
     """Data provider using Alpaca-py for real-time and historical bars."""
 
-    # Supports 1-second bars via Alpaca Order Streaming Aggregator and minute-bars via Alpaca
-    supported_live_timeframes: list[str] = ['1S', '1Min']
-    # List of timeframes this provider supports for historical data
-    supported_historical_timeframes: list[str] = ['1Min', '5Min', '15Min', '1H', '1D']
+    # Supports 1-second bars via Alpaca Order Streaming Aggregator and minute-bars via Alpaca;
+    # the remaining timeframes are resampled in-process from the 1-second stream
+    supported_live_timeframes: list[str] = ['1S', '5S', '15S', '30S', '1Min', '5Min', '15Min']
+    # List of timeframes this provider supports for historical data; sub-minute bars are built from trades
+    supported_historical_timeframes: list[str] = ['1S', '5S', '15S', '30S', '1Min', '5Min', '15Min', '1H', '1D']
+    # Trading days (and so cache files) are split on New York calendar dates
+    market_timezone: str = 'America/New_York'
     
     def __init__(self, **kwargs):
-        """Initialize AlpacaDataProvider by loading credentials from env and building aggregator if needed."""
-        print("[DataProvider] Initialized AlpacaDataProvider")
+        """Initialize AlpacaDataProvider by loading credentials from env and locating the aggregator binary.
+
+        An `aggregator` entry in the provider config (see AggregatorConfig) sets the supervisor's
+        heartbeat and stall limits.
+        """
+        log.info("initialized AlpacaDataProvider")
         api_key = os.getenv('APCA_API_KEY_ID')
         api_secret = os.getenv('APCA_API_SECRET_KEY')
         if not api_key or not api_secret:
             raise ValueError("Alpaca API credentials not found in environment variables")
-        # real-time stream client
-        self.stream = StockDataStream(api_key, api_secret)
+        # real-time stream client; ALPACA_WS_URL points both this client and the aggregator at
+        # an alternate endpoint such as the local feed simulator (src/simulator/feed_simulator.py)
+        self.stream = StockDataStream(api_key, api_secret, url_override=os.getenv('ALPACA_WS_URL'))
         # historical data client
         self.hist_client = StockHistoricalDataClient(api_key, api_secret)
+        # raw client for bulk trade history: skips building a model object per trade
+        self.raw_hist_client = StockHistoricalDataClient(api_key, api_secret, raw_data=True)
+        # local cache of completed days of trade-built bars
+        self.bar_cache = BarCache()
         # Redis publisher for external aggregators
         redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
         self.redis = redis.Redis.from_url(redis_url)
         # Track if Redis was started by this provider and register cleanup
         self._redis_started = False
         atexit.register(self._shutdown_redis)
-        # Track Rust aggregator processes per symbol
+        # Background batched publisher for raw trade/quote fan-out (created on first use)
+        self._publisher = None
+        # Supervised Rust aggregator processes per symbol
         self._aggregators = {}
-        # Ensure Rust bar_aggregator binary exists or build it
+        self.aggregator_config = AggregatorConfig.model_validate(kwargs.get('aggregator') or {})
+        # Locate the Rust bar_aggregator binary; building it is a setup step (./setup.sh), never done here
         bin_env = os.getenv('AGGREGATOR_BIN')
-        if bin_env and pathlib.Path(bin_env).is_file():
+        if bin_env:
             self.aggregator_bin = bin_env
         else:
             # default aggregator path relative to this file
             base = pathlib.Path(__file__).parent.parent.parent / 'aggregator'
-            release_bin = base / 'target' / 'release' / 'bar_aggregator'
-            if not release_bin.is_file():
-                # build in release mode
-                subprocess.run(['cargo', 'build', '--release'], cwd=str(base), check=True)
-            self.aggregator_bin = str(release_bin)
+            self.aggregator_bin = str(base / 'target' / 'release' / 'bar_aggregator')
+        if not pathlib.Path(self.aggregator_bin).is_file():
+            log.warning("bar_aggregator not found; 1-second live bars need it "
+                        "(run ./setup.sh or `cargo build --release` in aggregator/)", path=self.aggregator_bin)
 
     def subscribe_bars(self, handler, symbol: str, timeframe: str):
         # Dispatch based on timeframe
         match timeframe:
-            case '1S':
-                # Ensure Redis server is running; start it if necessary
-                try:
-                    self.redis.ping()
-                    print("[DataProvider] Redis is running.")
-                except redis.exceptions.ConnectionError:
-                    print("[DataProvider] Redis not running; launching redis-server...")
-                    subprocess.Popen(['redis-server', '--daemonize', 'yes'])
-                    time.sleep(2)
-                    self._redis_started = True
-                # launch external Rust aggregator
-                if symbol not in self._aggregators:
-                    env = os.environ.copy()
-                    env['SYMBOL'] = symbol
-                    # spawn without silencing stdout/stderr so we can see aggregator logs
-                    proc = subprocess.Popen(
-                        [self.aggregator_bin, '--symbol', symbol],
-                        env=env
-                    )
-                    print(f"[DataProvider] Launched Rust aggregator (no redirection) PID {proc.pid} for symbol {symbol}")
-                    time.sleep(2)  # warm-up delay to allow aggregator to connect
-                    self._aggregators[symbol] = proc
-                # subscribe to pre-aggregated 1s bars from Redis
-                channel = f"bars:{symbol}"
-                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
-                pubsub.subscribe(channel)
-                print(f"[DataProvider] Subscribed Redis pubsub to channel: {channel}")
-                def _listener():
-                    print(f"[DataProvider] Redis listener thread started for channel: {channel}")
-                    for message in pubsub.listen():
-                        if message and message['type'] == 'message':
-                            # print(f"[DataProvider] Raw Redis message: {message['data']}") TODO: Set debug log mode
-                            data = json.loads(message['data'])
-                            tick = {
-                                'open': data['open'],
-                                'high': data['high'],
-                                'low': data['low'],
-                                'close': data['close'],
-                                'volume': data['volume'],
-                            }
-                            result = handler(tick)
-                            if asyncio.iscoroutine(result):
-                                asyncio.run(result)
-                threading.Thread(target=_listener, daemon=True).start()
             case '1Min':
                 # wrap async handler so that coroutine callbacks are executed
                 tf_enum = TimeFrame(1, TimeFrame.Minute)
                 def _listener_min(bar):
-                    result = handler(bar)
+                    result = handler(Bar.from_alpaca(bar, '1Min'))
                     if asyncio.iscoroutine(result):
                         asyncio.run(result)
                 self.stream.subscribe_bars(_listener_min, symbol)
+            case tf if tf in self.supported_live_timeframes:
+                # 1S and every timeframe derived from it share one aggregated 1S feed per symbol
+                self.subscribe_timeframes(handler, symbol, [tf])
             case _:
                 raise ValueError(f"Unsupported timeframe: {timeframe}")
 
+    def _subscribe_base_bars(self, handler, symbol: str):
+        """Start (once per symbol) the Rust aggregator and a Redis listener for its 1-second bars."""
+        # Ensure Redis server is running; start it if necessary
+        try:
+            self.redis.ping()
+            log.debug("redis is running")
+        except redis.exceptions.ConnectionError:
+            log.info("redis not running, launching redis-server")
+            subprocess.Popen(['redis-server', '--daemonize', 'yes'])
+            wait_for_redis(self.redis)
+            self._redis_started = True
+        # subscribe to pre-aggregated 1s bars from Redis before the aggregator starts publishing
+        channel = f"bars:{symbol}"
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        log.info("subscribed redis pubsub", channel=channel)
+        # launch the external Rust aggregator under a supervisor; returns once it is actually ready
+        if symbol not in self._aggregators:
+            if not pathlib.Path(self.aggregator_bin).is_file():
+                raise FileNotFoundError(
+                    f"bar_aggregator binary not found at {self.aggregator_bin}. Build it with ./setup.sh "
+                    "(or `cargo build --release` in aggregator/), or set AGGREGATOR_BIN."
+                )
+            agg = self.aggregator_config
+            supervisor = AggregatorSupervisor(
+                self.aggregator_bin,
+                symbol,
+                self.redis,
+                heartbeat_ms=agg.heartbeat_ms,
+                dead_after=agg.dead_after,
+                stale_after=agg.stale_after_symbols.get(symbol, agg.stale_after)
+            )
+            supervisor.start()
+            self._aggregators[symbol] = supervisor
+        def _listener():
+            log.debug("redis listener thread started", channel=channel)
+            for message in pubsub.listen():
+                if message and message['type'] == 'message':
+                    log.debug("redis message", channel=channel, data=message['data'])
+                    data = json.loads(message['data'])
+                    # order-flow and book fields computed by the aggregator ride along as extras
+                    tick = Bar.from_mapping(data, MICROSTRUCTURE_FIELDS, self.base_live_timeframe)
+                    result = handler(tick)
+                    if asyncio.iscoroutine(result):
+                        asyncio.run(result)
+        threading.Thread(target=_listener, daemon=True).start()
+
     def run(self):
         """Kick off the live data stream."""
-        print("[DataProvider] Calling run() to start AlpacaDataStream")
+        log.info("starting AlpacaDataStream")
         self.stream.run()
 
     def stop(self):
         """Stop streaming (no-op if not supported by Alpaca-py)."""
-        # terminate any running Rust aggregator processes
-        for proc in self._aggregators.values():
+        # stop supervisors and terminate their Rust aggregator processes
+        for supervisor in self._aggregators.values():
             try:
-                proc.terminate()
+                supervisor.stop()
             except Exception:
                 pass
         self._aggregators.clear()
+        # flush pending trade/quote fan-out
+        if self._publisher is not None:
+            self._publisher.close()
+            log.info("redis fan-out stats", **self._publisher.stats())
         # note: Alpaca stream has no explicit stop
         pass
 
@@ -141,6 +175,8 @@ class AlpacaDataProvider(BaseDataProvider):
         """
         Fetch historical bars using Alpaca-py StockHistoricalDataClient.
         """
+        if timeframe in self.supported_historical_timeframes and timeframe_seconds(timeframe) < 60:
+            return self._get_trade_bars(symbol, start, end, timeframe)
         # Determine TimeFrame enum via switch
         match timeframe:
             case '1Min':
@@ -156,7 +192,7 @@ class AlpacaDataProvider(BaseDataProvider):
             case _:
                 raise ValueError(f"Unsupported timeframe: {timeframe}")
         # Build request
-        print(f"[DataProvider] Fetching historical bars for {symbol} from {start} to {end} with timeframe {tf_enum.value}")
+        log.info("fetching historical bars", symbol=symbol, start=start, end=end, timeframe=tf_enum.value)
         req = StockBarsRequest(
             symbol_or_symbols=[symbol],
             timeframe=tf_enum,
@@ -174,44 +210,111 @@ class AlpacaDataProvider(BaseDataProvider):
             df.index = df.index.tz_localize(None)
         return df[['open', 'high', 'low', 'close', 'volume']]
 
+    def iter_historical_bars(
+        self,
+        symbol: str,
+        start: datetime,
+        end: datetime,
+        timeframe: str,
+        chunk_bars: int = CHUNK_BARS
+    ):
+        """Sub-minute bars stream one trading day at a time from the bar cache; others use the base windows."""
+        if timeframe in self.supported_historical_timeframes and timeframe_seconds(timeframe) < 60:
+            log.info("streaming bars from trades", symbol=symbol, timeframe=timeframe, start=start, end=end)
+            return rechunk(self._iter_trade_bar_days(symbol, start, end, timeframe), chunk_bars)
+        return super().iter_historical_bars(symbol, start, end, timeframe, chunk_bars)
+
+    def _get_trade_bars(self, symbol: str, start: datetime, end: datetime, timeframe: str) -> pd.DataFrame:
+        """Build sub-minute bars from trade history, one trading day at a time.
+
+        Completed days are aggregated to 1S once, stored in the bar cache and resampled from there;
+        the current day is always fetched fresh. Naive start/end are taken as UTC.
+        """
+        log.info("building bars from trades", symbol=symbol, timeframe=timeframe, start=start, end=end)
+        frames = list(self._iter_trade_bar_days(symbol, start, end, timeframe))
+        return pd.concat(frames) if frames else trades_to_bars([], [], [])
+
+    def _iter_trade_bar_days(self, symbol: str, start: datetime, end: datetime, timeframe: str):
+        """Yield each trading day's bars in [start, end), from the bar cache when the day is complete."""
+        start_utc = self._as_utc(start)
+        end_utc = self._as_utc(end)
+        now = pd.Timestamp.now(tz='UTC')
+        first_day = start_utc.tz_convert(self.market_timezone).normalize()
+        last_day = end_utc.tz_convert(self.market_timezone).normalize()
+        seconds = timeframe_seconds(timeframe)
+        for day_start in pd.date_range(first_day, last_day, freq='D'):
+            day_end = day_start + pd.DateOffset(days=1)
+            complete = day_end <= now
+            bars = self.bar_cache.get(symbol, '1S', day_start.date()) if complete else None
+            if bars is None:
+                lo, hi = (day_start, day_end) if complete else (max(start_utc, day_start), min(end_utc, day_end))
+                bars = self._fetch_trade_bars(symbol, lo, hi)
+                if complete:
+                    self.bar_cache.put(symbol, '1S', day_start.date(), bars)
+            bars = bars[(bars.index >= start_utc.tz_localize(None)) & (bars.index < end_utc.tz_localize(None))]
+            yield bars if seconds == 1 else resample_bars(bars, seconds)
+
+    @staticmethod
+    def _as_utc(ts) -> pd.Timestamp:
+        ts = pd.Timestamp(ts)
+        return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+    def _fetch_trade_bars(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Page through raw trades in [start, end) and aggregate them into 1S bars."""
+        req = StockTradesRequest(symbol_or_symbols=[symbol], start=start.to_pydatetime(), end=end.to_pydatetime())
+        trades = self.raw_hist_client.get_stock_trades(req).get(symbol, [])
+        log.debug("aggregating trades", symbol=symbol, trades=len(trades), day=start.date())
+        return trades_to_bars(*raw_trades_to_arrays(trades), seconds=1)
+
+    @property
+    def publisher(self) -> BatchedRedisPublisher:
+        if self._publisher is None:
+            self._publisher = BatchedRedisPublisher(self.redis)
+        return self._publisher
+
     def subscribe_trades(self, handler, symbol: str):
         """Subscribe to real-time trade stream for the given symbol."""
+        publisher = self.publisher
+        channel = f"trades:{symbol}"
         # wrap handler to also publish raw trades to Redis for microservice aggregation
-        def _wrapped(trade):
-            # publish raw trade event
-            payload = {
+        async def _wrapped(trade):
+            # call user handler first; the Redis fan-out is queued and sent in batches off this thread
+            result = handler(trade)
+            if asyncio.iscoroutine(result):
+                await result
+            publisher.publish(channel, {
                 'symbol': symbol,
                 'timestamp': trade.timestamp.isoformat(),
                 'price': trade.price,
                 'size': trade.size
-            }
-            self.redis.publish(f"trades:{symbol}", json.dumps(payload))
-            # call user handler
-            handler(trade)
+            })
 
         self.stream.subscribe_trades(_wrapped, symbol)
 
     def subscribe_quotes(self, handler, symbol: str):
         """Subscribe to real-time quote stream (bid/ask) for the given symbol."""
-        # wrap handler to also publish raw quotes to Redis
-        def _wrapped(q):
-            payload = {
+        publisher = self.publisher
+        channel = f"quotes:{symbol}"
+        # wrap handler to also publish raw quotes to Redis (batched, after the handler)
+        async def _wrapped(q):
+            result = handler(q)
+            if asyncio.iscoroutine(result):
+                await result
+            publisher.publish(channel, {
                 'symbol': symbol,
                 'timestamp': q.timestamp.isoformat(),
                 'bid_price': q.bid_price,
                 'bid_size': q.bid_size,
                 'ask_price': q.ask_price,
                 'ask_size': q.ask_size
-            }
-            self.redis.publish(f"quotes:{symbol}", json.dumps(payload))
-            handler(q)
+            })
 
         self.stream.subscribe_quotes(_wrapped, symbol)
 
     def _shutdown_redis(self):
         """Shutdown Redis if it was started by this provider."""
         if getattr(self, '_redis_started', False):
-            print("[DataProvider] Shutting down Redis...")
+            log.info("shutting down redis")
             try:
                 subprocess.run(['redis-cli', 'shutdown'], check=False)
             except Exception:
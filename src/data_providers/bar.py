@@ -0,0 +1,88 @@
+# Bar: the one record type every provider emits and every strategy consumes
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# Fields every bar carries; anything else (e.g. MICROSTRUCTURE_FIELDS) lives in `extras`
+BAR_FIELDS = ('symbol', 'timeframe', 'timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+class Bar:
+    """One OHLCV bar with symbol, timeframe, timestamp and optional extra fields.
+
+    Fields are read as attributes (bar.close); mapping-style reads (bar['close'], bar.get('vwap'),
+    'vwap' in bar) also work and cover the extras. symbol, timeframe and timestamp may be None,
+    e.g. in backtests where bars are positional.
+    """
+
+    __slots__ = BAR_FIELDS + ('extras',)
+
+    def __init__(
+        self,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float,
+        symbol: Optional[str] = None,
+        timestamp: Any = None,
+        timeframe: Optional[str] = None,
+        extras: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.timeframe = timeframe
+        self.extras = extras
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any], extra_fields=(), timeframe: Optional[str] = None) -> 'Bar':
+        """Build from a dict such as a decoded Redis message, keeping the listed extra fields present in it."""
+        extras = {f: data[f] for f in extra_fields if f in data} or None
+        return cls(data['open'], data['high'], data['low'], data['close'], data['volume'],
+                   data.get('symbol'), data.get('timestamp'), data.get('timeframe', timeframe), extras)
+
+    @classmethod
+    def from_alpaca(cls, bar: Any, timeframe: Optional[str] = None) -> 'Bar':
+        """Build from an alpaca-py Bar model (streamed minute bars)."""
+        extras = {'vwap': bar.vwap, 'trade_count': bar.trade_count} if getattr(bar, 'vwap', None) is not None else None
+        return cls(bar.open, bar.high, bar.low, bar.close, bar.volume, bar.symbol, bar.timestamp, timeframe, extras)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in BAR_FIELDS:
+            return getattr(self, key)
+        if self.extras is not None and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in BAR_FIELDS or (self.extras is not None and key in self.extras)
+
+    def keys(self) -> Iterator[str]:
+        yield from BAR_FIELDS
+        if self.extras:
+            yield from self.extras
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Bar) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Bar({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items() if v is not None)})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
@@ -0,0 +1,57 @@
+# Local columnar cache of historical bars, one .npz file per symbol, timeframe and trading day
+import os
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data_providers.trade_bars import BAR_COLUMNS
+
+
+class BarCache:
+    """Read/write completed trading days of bars under BAR_CACHE_DIR (default .bar_cache)."""
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = root or os.getenv('BAR_CACHE_DIR', '.bar_cache')
+
+    def path(self, symbol: str, timeframe: str, day: date) -> str:
+        return os.path.join(self.root, symbol.upper(), timeframe, f"{day.isoformat()}.npz")
+
+    def get(self, symbol: str, timeframe: str, day: date) -> Optional[pd.DataFrame]:
+        """Return the cached bars for a day, or None if the day has not been cached."""
+        path = self.path(symbol, timeframe, day)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                index = pd.DatetimeIndex(data['time'], name='timestamp')
+                return pd.DataFrame({c: data[c] for c in BAR_COLUMNS}, index=index)
+        except FileNotFoundError:
+            return None
+
+    def put(self, symbol: str, timeframe: str, day: date, df: pd.DataFrame) -> None:
+        """Store a day's bars; an empty frame is stored too so holidays are not re-fetched."""
+        path = self.path(symbol, timeframe, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a crash never leaves a truncated file behind
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            time=pd.DatetimeIndex(df.index).asi8,
+            **{c: df[c].to_numpy(dtype=np.float64) for c in BAR_COLUMNS}
+        )
+        os.replace(tmp, path)
+
+    def invalidate(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        """Delete cached days for a symbol/timeframe (or everything); returns the number of files removed."""
+        base = self.root
+        if symbol:
+            base = os.path.join(base, symbol.upper())
+            if timeframe:
+                base = os.path.join(base, timeframe)
+        removed = 0
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if name.endswith('.npz') and (symbol or not timeframe or os.path.basename(dirpath) == timeframe):
+                    os.remove(os.path.join(dirpath, name))
+                    removed += 1
+        return removed
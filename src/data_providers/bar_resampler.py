@@ -0,0 +1,164 @@
+# Streaming multi-timeframe resampler: derive higher timeframes from one base bar stream
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+
+from src.data_providers.bar import Bar
+from src.data_providers.timeframes import timeframe_seconds
+
+# Extra per-bar fields computed by the Rust aggregator from trades and quotes
+MICROSTRUCTURE_FIELDS = ('vwap', 'trade_count', 'bid', 'ask', 'spread', 'imbalance', 'signed_volume')
+
+
+def epoch_seconds(ts: Any) -> float:
+    """Convert a bar timestamp (datetime, ISO string or unix seconds) to unix seconds; naive datetimes are UTC."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    raise TypeError(f"Unsupported bar timestamp: {ts!r}")
+
+
+class _Window:
+    """Open OHLCV accumulator for one derived timeframe."""
+
+    __slots__ = (
+        'timeframe', 'seconds', 'handlers', 'start', 'open', 'high', 'low', 'close', 'volume',
+        # microstructure accumulators, used when base bars carry the aggregator's extra fields
+        'micro', 'notional', 'trade_count', 'signed_volume', 'spread_sum', 'spread_bars', 'bid', 'ask', 'imbalance',
+    )
+
+    def __init__(self, timeframe: str):
+        self.timeframe = timeframe
+        self.seconds = timeframe_seconds(timeframe)
+        self.handlers: List[Callable] = []
+        self.start: Optional[int] = None
+
+
+class BarResampler:
+    """Derive any set of higher timeframes from a base bar stream (e.g. 1S) in O(1) per bar and timeframe.
+
+    Windows are aligned to multiples of their length since the epoch (UTC), like the base bars.
+    A derived bar is emitted as soon as the base bar that completes its window arrives; if that
+    base bar is missing (no trades in the final second), it is emitted when the first bar of a
+    later window arrives, or by flush().
+
+    When base bars carry MICROSTRUCTURE_FIELDS, derived bars get them too: volume-weighted vwap,
+    summed trade_count and signed_volume, last bid/ask/imbalance, and spread averaged over the
+    base bars that had one.
+    """
+
+    def __init__(self, symbol: str, base_timeframe: str = '1S'):
+        self.symbol = symbol
+        self.base_timeframe = base_timeframe
+        self.base_seconds = timeframe_seconds(base_timeframe)
+        self.base_handlers: List[Callable] = []
+        # Ordered from shortest to longest so derived bars are emitted in a stable order
+        self._windows: List[_Window] = []
+
+    def add(self, timeframe: str, handler: Callable) -> None:
+        """Register a handler for a timeframe; the base timeframe passes bars straight through."""
+        if timeframe == self.base_timeframe:
+            self.base_handlers.append(handler)
+            return
+        seconds = timeframe_seconds(timeframe)
+        if seconds % self.base_seconds:
+            raise ValueError(f"Timeframe {timeframe} is not a multiple of base timeframe {self.base_timeframe}")
+        for window in self._windows:
+            if window.timeframe == timeframe:
+                window.handlers.append(handler)
+                return
+        window = _Window(timeframe)
+        window.handlers.append(handler)
+        # Replace rather than mutate: the stream thread may be iterating the current list
+        self._windows = sorted(self._windows + [window], key=lambda w: w.seconds)
+
+    @property
+    def timeframes(self) -> List[str]:
+        return ([self.base_timeframe] if self.base_handlers else []) + [w.timeframe for w in self._windows]
+
+    def on_bar(self, bar: Bar):
+        """Consume one base bar. Returns a coroutine if any handler is async, otherwise None."""
+        pending = []
+        for handler in self.base_handlers:
+            result = handler(bar)
+            if asyncio.iscoroutine(result):
+                pending.append(result)
+
+        ts = int(epoch_seconds(bar.timestamp))
+        bar_end = ts + self.base_seconds
+        extras = bar.extras
+        for w in self._windows:
+            start = ts - ts % w.seconds
+            if w.start is not None and start != w.start:
+                # A bar from a later window closes a window whose last base bar never arrived
+                self._emit(w, pending)
+            if w.start is None:
+                w.start = start
+                w.open = bar.open
+                w.high = bar.high
+                w.low = bar.low
+                w.volume = bar.volume
+                w.micro = extras is not None and 'signed_volume' in extras
+                if w.micro:
+                    w.notional = w.trade_count = w.signed_volume = w.spread_sum = w.spread_bars = 0
+            else:
+                if bar.high > w.high:
+                    w.high = bar.high
+                if bar.low < w.low:
+                    w.low = bar.low
+                w.volume += bar.volume
+            w.close = bar.close
+            if w.micro:
+                w.notional += extras['vwap'] * bar.volume
+                w.trade_count += extras['trade_count']
+                w.signed_volume += extras['signed_volume']
+                if extras['spread'] is not None:
+                    w.spread_sum += extras['spread']
+                    w.spread_bars += 1
+                w.bid = extras['bid']
+                w.ask = extras['ask']
+                w.imbalance = extras['imbalance']
+            if bar_end >= w.start + w.seconds:
+                self._emit(w, pending)
+
+        if pending:
+            return self._drain(pending)
+        return None
+
+    def flush(self):
+        """Emit every partially filled window (e.g. at shutdown or end of session)."""
+        pending = []
+        for w in self._windows:
+            if w.start is not None:
+                self._emit(w, pending)
+        return self._drain(pending) if pending else None
+
+    def _emit(self, w: _Window, pending: list) -> None:
+        extras = None
+        if w.micro:
+            extras = {
+                'vwap': w.notional / w.volume if w.volume else w.close,
+                'trade_count': w.trade_count,
+                'bid': w.bid,
+                'ask': w.ask,
+                'spread': w.spread_sum / w.spread_bars if w.spread_bars else None,
+                'imbalance': w.imbalance,
+                'signed_volume': w.signed_volume,
+            }
+        out = Bar(w.open, w.high, w.low, w.close, w.volume, self.symbol,
+                  datetime.fromtimestamp(w.start, tz=timezone.utc), w.timeframe, extras)
+        w.start = None
+        for handler in w.handlers:
+            result = handler(out)
+            if asyncio.iscoroutine(result):
+                pending.append(result)
+
+    @staticmethod
+    async def _drain(pending: list) -> None:
+        for coro in pending:
+            await coro
@@ -1,7 +1,36 @@
 # BaseDataProvider and AlpacaDataProvider for real-time data
 from abc import ABC, abstractmethod
+import math
+from typing import Iterable, Iterator
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from src.data_providers.bar_resampler import BarResampler
+from src.data_providers.timeframes import timeframe_seconds
+
+# Default rows per chunk yielded by iter_historical_bars
+CHUNK_BARS = 100_000
+
+
+def rechunk(frames: Iterable[pd.DataFrame], rows: int) -> Iterator[pd.DataFrame]:
+    """Regroup a stream of bar DataFrames into chunks of exactly `rows` rows (the last may be shorter)."""
+    buffered: list[pd.DataFrame] = []
+    size = 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        buffered.append(frame)
+        size += len(frame)
+        if size < rows:
+            continue
+        merged = pd.concat(buffered) if len(buffered) > 1 else buffered[0]
+        cut = size - size % rows
+        for lo in range(0, cut, rows):
+            yield merged.iloc[lo:lo + rows]
+        buffered = [merged.iloc[cut:]] if cut < size else []
+        size -= cut
+    if size:
+        yield pd.concat(buffered) if len(buffered) > 1 else buffered[0]
 
 
 class BaseDataProvider(ABC):
@@ -11,12 +40,35 @@ class BaseDataProvider(ABC):
     supported_live_timeframes: list[str] = []
     # List of timeframe strings this provider supports for historical data
     supported_historical_timeframes: list[str] = []
+    # Finest live bar stream; coarser live timeframes can be derived from it by resampling
+    base_live_timeframe: str = '1S'
 
     @abstractmethod
     def subscribe_bars(self, handler, symbol: str, timeframe: str):
         """Subscribe to a real-time bar stream for the given symbol and timeframe."""
         pass
 
+    def subscribe_timeframes(self, handler, symbol: str, timeframes: list[str]):
+        """Subscribe a handler to several timeframes for one symbol, all derived from a single base stream.
+
+        Derived bars carry 'symbol', 'timeframe' and 'timestamp' (window start, UTC) keys.
+        """
+        resamplers = self.__dict__.setdefault('_resamplers', {})
+        resampler = resamplers.get(symbol)
+        is_new = resampler is None
+        if is_new:
+            resampler = BarResampler(symbol, self.base_live_timeframe)
+            resamplers[symbol] = resampler
+        for timeframe in timeframes:
+            resampler.add(timeframe, handler)
+        # Only the first subscription per symbol opens the upstream feed
+        if is_new:
+            self._subscribe_base_bars(resampler.on_bar, symbol)
+
+    def _subscribe_base_bars(self, handler, symbol: str):
+        """Open the upstream base-timeframe bar stream feeding the resampler."""
+        self.subscribe_bars(handler, symbol, self.base_live_timeframe)
+
     @abstractmethod
     def run(self):
         """Start the data stream loop."""
@@ -38,6 +90,56 @@ class BaseDataProvider(ABC):
         """Fetch historical bars for backtesting."""
         pass
 
+    def iter_historical_bars(
+        self,
+        symbol: str,
+        start: datetime,
+        end: datetime,
+        timeframe: str,
+        chunk_bars: int = CHUNK_BARS
+    ) -> Iterator[pd.DataFrame]:
+        """Yield historical bars in [start, end) as DataFrames of chunk_bars rows, oldest first.
+
+        Only about one chunk is held at a time: the period is fetched through get_historical_bars in
+        whole-day windows spanning roughly chunk_bars bars of continuous trading.
+        """
+        days = max(1, math.ceil(timeframe_seconds(timeframe) * chunk_bars / 86400))
+        window_start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+
+        def windows():
+            lo = window_start
+            last = None
+            while lo < end:
+                hi = min((lo + pd.Timedelta(days=days)).normalize(), end)
+                df = self.get_historical_bars(symbol, lo.to_pydatetime(), hi.to_pydatetime(), timeframe)
+                if last is not None:
+                    # Providers whose end bound is inclusive repeat the bar on the boundary
+                    df = df[df.index > last]
+                if not df.empty:
+                    last = df.index[-1]
+                yield df
+                lo = hi
+
+        yield from rechunk(windows(), chunk_bars)
+
+    def get_recent_bars(self, symbol: str, timeframe: str, bars: int, end: datetime = None) -> pd.DataFrame:
+        """Return up to the last `bars` completed bars before `end` (naive UTC, default now).
+
+        The request window starts at twice the bare span and widens across nights, weekends and holidays.
+        """
+        end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+        seconds = timeframe_seconds(timeframe)
+        span = timedelta(seconds=seconds * max(bars, 1) * 2)
+        max_span = max(span * 8, timedelta(days=10))
+        while True:
+            df = self.get_historical_bars(symbol, end - span, end, timeframe)
+            # Drop a bar still forming at `end`
+            df = df[df.index + pd.Timedelta(seconds=seconds) <= end]
+            if len(df) >= bars or span >= max_span:
+                return df.tail(bars)
+            span = min(span * 4, max_span)
+
     @abstractmethod
     def subscribe_trades(self, handler, symbol: str):
         """Subscribe to real-time trade events for the given symbol."""
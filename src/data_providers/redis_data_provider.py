@@ -6,7 +6,9 @@ import pandas as pd
 from datetime import datetime
 import asyncio
 
-from src.data_providers.base_data_provider import BaseDataProvider
+from src.data_providers.base_data_provider import CHUNK_BARS, BaseDataProvider
+from src.data_providers.bar import Bar
+from src.data_providers.bar_resampler import MICROSTRUCTURE_FIELDS
 from src.data_providers.alpaca_data_provider import AlpacaDataProvider
 
 class RedisBarProvider(BaseDataProvider):
@@ -31,18 +33,15 @@ class RedisBarProvider(BaseDataProvider):
         # Delegate historical fetch to AlpacaDataProvider
         return self.fallback.get_historical_bars(symbol, start, end, timeframe)
 
+    def iter_historical_bars(self, symbol: str, start: datetime, end: datetime, timeframe: str, chunk_bars: int = CHUNK_BARS):
+        return self.fallback.iter_historical_bars(symbol, start, end, timeframe, chunk_bars)
+
     def subscribe_bars(self, handler, symbol: str, timeframe: str):
         # Subscribe to the Redis channel for pre-aggregated 1-second bars
         channel = f"bars:{symbol}"
         def _handler(message):
             data = json.loads(message['data'])
-            tick = {
-                'open': data['open'],
-                'high': data['high'],
-                'low': data['low'],
-                'close': data['close'],
-                'volume': data['volume'],
-            }
+            tick = Bar.from_mapping(data, MICROSTRUCTURE_FIELDS, '1S')
             # Execute the async handler in a new event loop for each tick
             asyncio.run(handler(tick))
         self.pubsub.subscribe(**{channel: _handler})
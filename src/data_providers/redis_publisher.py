@@ -0,0 +1,107 @@
+# Background, batched Redis PUBLISH so stream callbacks never wait on a Redis round trip
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+import redis
+
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+
+class BatchedRedisPublisher:
+    """Buffer (channel, payload) messages and publish them from a background thread.
+
+    publish() only appends to a bounded in-memory buffer. The worker drains it in pipelines of up to
+    batch_size messages, flushing when a batch fills or flush_interval seconds pass, over its own
+    connection from the client's pool. When the buffer is full the oldest message is dropped and
+    counted, so a slow or unreachable Redis never blocks the caller.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        batch_size: int = 500,
+        flush_interval: float = 0.005,
+        max_buffer: int = 100_000
+    ) -> None:
+        # Separate client on the shared pool: the worker holds its own connection while pipelining
+        self.redis = redis.Redis(connection_pool=client.connection_pool)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.published = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name="redis-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        """Queue a message; serialization and network I/O happen on the worker thread."""
+        depth = len(self._buffer)
+        if depth >= self.max_buffer:
+            # deque(maxlen) evicts the oldest entry on append
+            self.dropped += 1
+        elif depth > self.max_depth:
+            self.max_depth = depth
+        self._buffer.append((channel, payload))
+        if depth + 1 >= self.batch_size:
+            self._wake.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'published': self.published,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'errors': self.errors,
+            'buffered': len(self._buffer),
+            'max_depth': self.max_depth,
+        }
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Flush what is buffered (best effort within timeout) and stop the worker."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _take_batch(self) -> list:
+        batch = []
+        popleft = self._buffer.popleft
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def _send(self, batch: list) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        for channel, payload in batch:
+            pipe.publish(channel, json.dumps(payload))
+        try:
+            pipe.execute()
+            self.published += len(batch)
+            self.batches += 1
+        except redis.exceptions.RedisError as e:
+            # Fan-out is best effort: count the loss and keep going rather than back up the feed
+            self.errors += 1
+            self.dropped += len(batch)
+            log.warning("dropped batch", messages=len(batch), error=str(e))
+            time.sleep(self.flush_interval)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self._buffer:
+                self._send(self._take_batch())
+            if self._stop.is_set():
+                return
@@ -0,0 +1,25 @@
+# Timeframe string helpers shared by providers, resamplers and analytics
+import re
+
+# Trading session length used to annualize intraday bar counts (09:30-16:00 ET)
+SESSION_SECONDS = 6.5 * 3600
+TRADING_DAYS_PER_YEAR = 252
+
+_UNIT_SECONDS = {'S': 1, 'Min': 60, 'H': 3600, 'D': 86400}
+_TIMEFRAME_RE = re.compile(r'^(\d+)(S|Min|H|D)$')
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """Return the length of a timeframe string such as '1S', '15S', '5Min', '1H' or '1D' in seconds."""
+    match = _TIMEFRAME_RE.match(timeframe)
+    if not match:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+def periods_per_year(timeframe: str) -> float:
+    """Number of bars of the given timeframe in a trading year (regular session only)."""
+    seconds = timeframe_seconds(timeframe)
+    if seconds >= 86400:
+        return TRADING_DAYS_PER_YEAR * 86400 / seconds
+    return TRADING_DAYS_PER_YEAR * SESSION_SECONDS / seconds
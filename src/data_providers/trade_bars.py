@@ -0,0 +1,66 @@
+# Vectorized aggregation of raw trades into sub-minute OHLCV bars
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def raw_trades_to_arrays(trades: List[Dict[str, Any]]):
+    """Split raw Alpaca trade dicts ('t' RFC3339, 'p' price, 's' size) into (ns, price, size) arrays."""
+    n = len(trades)
+    times = pd.to_datetime([t['t'] for t in trades], utc=True, format='ISO8601').asi8
+    prices = np.fromiter((t['p'] for t in trades), dtype=np.float64, count=n)
+    sizes = np.fromiter((t['s'] for t in trades), dtype=np.float64, count=n)
+    return times, prices, sizes
+
+
+def trades_to_bars(times: np.ndarray, prices: np.ndarray, sizes: np.ndarray, seconds: int = 1) -> pd.DataFrame:
+    """Bin trades into bars of `seconds` length, using the same rules as the live Rust aggregator.
+
+    Buckets are aligned to whole multiples of `seconds` since the epoch (UTC) on the trade's exchange
+    timestamp, each bar is stamped with its bucket start, and buckets without trades produce no bar.
+    Returns a DataFrame indexed by naive UTC timestamps, like get_historical_bars.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    if times.size == 0:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name='timestamp'), dtype=np.float64)
+    if np.any(times[1:] < times[:-1]):
+        # Stable so trades sharing a timestamp keep their feed order for open/close
+        order = np.argsort(times, kind='stable')
+        times, prices, sizes = times[order], prices[order], sizes[order]
+
+    width = np.int64(seconds) * 1_000_000_000
+    bucket = times // width
+    # One contiguous run per bucket: reduce each run instead of grouping
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], times.size]
+    index = pd.DatetimeIndex(bucket[starts] * width, name='timestamp')
+    return pd.DataFrame({
+        'open': prices[starts],
+        'high': np.maximum.reduceat(prices, starts),
+        'low': np.minimum.reduceat(prices, starts),
+        'close': prices[ends - 1],
+        'volume': np.add.reduceat(sizes, starts),
+    }, index=index)
+
+
+def resample_bars(df: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """Combine bars into coarser epoch-aligned bars of `seconds` length (same result as binning the trades)."""
+    if df.empty:
+        return df
+    width = np.int64(seconds) * 1_000_000_000
+    bucket = pd.DatetimeIndex(df.index).asi8 // width
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], bucket.size]
+    index = pd.DatetimeIndex(bucket[starts] * width, name='timestamp')
+    return pd.DataFrame({
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends - 1],
+        'volume': np.add.reduceat(df['volume'].to_numpy(), starts),
+    }, index=index)
@@ -1,18 +1,20 @@
-from src.config.config import Config
+from src.config.config import Config, FeaturesConfig
 from src.config.strategy_config import STRATEGY_CONFIG  # adjust path if needed
 from src.config.broker_config import BROKER_CONFIG
 from src.config.data_provider_config import DATA_PROVIDER_CONFIG
-from src.brokers.shadow_broker import ShadowBroker
+from src.log import get_logger
 from datetime import datetime, time as dt_time
 from zoneinfo import ZoneInfo
 
+log = get_logger(__name__)
+
 
 def run_from_config(cfg: Config) -> None:
     """Execute all enabled strategies defined in the Config model."""
     # Warn if running outside US market hours (9:30 to 16:00 ET Mon-Fri)
     now_et = datetime.now(ZoneInfo("America/New_York"))
     if now_et.weekday() >= 5 or now_et.time() < dt_time(9, 30) or now_et.time() >= dt_time(16, 0):
-        print("\033[93mWARNING: Market is closed, you may not receive updates until market opens.\033[0m")
+        log.warning("market is closed, you may not receive updates until it opens")
 
     # Unpack global simulation parameters (cash, slippage, commission)
     sim = cfg.simulation
@@ -28,15 +30,30 @@ def run_from_config(cfg: Config) -> None:
     provider_cls = provider_meta["provider_class"]
     data_provider = provider_cls(**cfg.data_provider.config)
 
+    # One risk engine and order gateway per broker account, shared by every live strategy in this process:
+    # strategy -> RiskCheckedBroker -> OrderGateway -> broker
+    gateways = {}
+    accounts = {}
+
+    def account_broker(key, make_broker):
+        if key not in accounts:
+            from src.brokers.order_gateway import OrderGateway
+            from src.brokers.risk_broker import RiskCheckedBroker
+            from src.risk import RiskEngine
+            limits = cfg.broker.gateway
+            gateways[key] = OrderGateway(make_broker(), rate=limits.rate_per_minute / 60, burst=limits.burst)
+            accounts[key] = RiskCheckedBroker(gateways[key], RiskEngine.from_config(cfg.risk))
+        return accounts[key]
+
     # Execute each strategy
     for strat_item in cfg.strategies:
         name = strat_item.name
         # Skip disabled strategies
         if not strat_item.enabled:
-            print(f"Skipping disabled strategy '{name}'")
+            log.info("skipping disabled strategy", strategy=name)
             continue
         if name not in STRATEGY_CONFIG:
-            print(f"Unknown strategy '{name}'")
+            log.error("unknown strategy", strategy=name)
             continue
         meta = STRATEGY_CONFIG[name]
         StrategyClass = meta["strategy_class"]
@@ -48,22 +65,25 @@ def run_from_config(cfg: Config) -> None:
             else:
                 params = strat_item.config
         except Exception as e:
-            print(f"Invalid parameters for '{name}': {e}")
+            log.error("invalid parameters", strategy=name, error=str(e))
             continue
 
-        print(f"=== Running strategy '{name}' ({meta['display_name']}) | operation={strat_item.operation} shadow_mode={strat_item.shadow_mode} ===")
+        log.info("running strategy", strategy=name, display_name=meta['display_name'],
+                 operation=strat_item.operation, shadow_mode=strat_item.shadow_mode)
         # Dispatch based on operation
         if strat_item.operation == "backtest":
             # Backtest mode: run via Backtester, using the configured data provider
             from src.backtester.backtester import Backtester
-            print(f"Running backtest for '{name}'...")
             bt = Backtester(
                 StrategyClass,
                 params,
                 data_provider,
                 start_cash=sim.start_cash,
                 slippage=sim.slippage,
-                commission=sim.commission
+                commission=sim.commission,
+                checkpoints=True,
+                chunk_bars=sim.chunk_bars,
+                risk=cfg.risk.model_dump()
             )
             metrics = bt.run(
                 params.symbol,
@@ -71,27 +91,148 @@ def run_from_config(cfg: Config) -> None:
                 params.period.end,
                 params.timeframe
             )
-            print(f"{name} backtest metrics: {metrics}\n")
+            log.info("backtest metrics", strategy=name, **metrics)
+
+        elif strat_item.operation == "walk_forward":
+            # Walk-forward mode: load the history once, optimize per in-sample fold, stitch out-of-sample
+            from src.backtester.walk_forward import WalkForward
+            wf_cfg = strat_item.walk_forward
+            if wf_cfg is None:
+                log.error("missing 'walk_forward' settings", strategy=name)
+                continue
+            df = data_provider.get_historical_bars(
+                params.symbol,
+                params.period.start,
+                params.period.end,
+                params.timeframe
+            )
+            queue = None
+            if wf_cfg.queue:
+                from src.backtester.job_queue import BacktestQueue
+                queue = BacktestQueue(name=wf_cfg.queue)
+            wf = WalkForward(
+                StrategyClass,
+                params,
+                wf_cfg.grid,
+                wf_cfg.in_sample,
+                wf_cfg.out_of_sample,
+                anchored=wf_cfg.anchored,
+                objective=wf_cfg.objective,
+                workers=wf_cfg.workers,
+                start_cash=sim.start_cash,
+                slippage=sim.slippage,
+                commission=sim.commission,
+                queue=queue,
+                risk=cfg.risk.model_dump()
+            )
+            result = wf.run(df, params.timeframe)
+            filename = wf.save(result)
+            for fold in result['folds']:
+                log.info("walk-forward fold", strategy=name, fold=fold['fold'], out_of_sample=fold['out_of_sample'],
+                         params=fold['params'], oos_return=fold['out_of_sample_metrics']['total_return'])
+            log.info("saved stitched out-of-sample curve", strategy=name, path=filename)
+            log.info("walk-forward metrics", strategy=name, **result['metrics'])
+
+        elif strat_item.operation == "optimize":
+            # Optimize mode: successive-halving search that stops losing trials partway through the data
+            from src.backtester.optimizer import SuccessiveHalving
+            opt_cfg = strat_item.optimize
+            if opt_cfg is None:
+                log.error("missing 'optimize' settings", strategy=name)
+                continue
+            df = data_provider.get_historical_bars(
+                params.symbol,
+                params.period.start,
+                params.period.end,
+                params.timeframe
+            )
+            search = SuccessiveHalving(
+                StrategyClass,
+                params,
+                opt_cfg.space,
+                trials=opt_cfg.trials,
+                objective=opt_cfg.objective,
+                eta=opt_cfg.eta,
+                min_fraction=opt_cfg.min_fraction,
+                workers=opt_cfg.workers,
+                study_path=opt_cfg.study,
+                seed=opt_cfg.seed,
+                start_cash=sim.start_cash,
+                slippage=sim.slippage,
+                commission=sim.commission,
+                risk=cfg.risk.model_dump()
+            )
+            report = search.run(df, params.timeframe)
+            log.info("optimize finished", strategy=name, trials=report['trials'], pruned=report['pruned'],
+                     bars_replayed=report['bars_replayed'], bars_full=report['bars_full'],
+                     compute_saved=report['compute_saved'], seconds=round(report['elapsed'], 1))
+            if report['best']:
+                log.info("best params", strategy=name, params=report['best']['params'], metrics=report['best']['metrics'])
+
+        elif strat_item.operation == "features":
+            # Features mode: labeled model features over the period, memory-mapped for training
+            from src.backtester.features import build_feature_matrix, check_parity
+            ft_cfg = strat_item.features or FeaturesConfig()
+            df = data_provider.get_historical_bars(
+                params.symbol,
+                params.period.start,
+                params.period.end,
+                params.timeframe
+            )
+            out_dir = ft_cfg.out or f"features/{StrategyClass.__name__}-{params.symbol}-{params.timeframe}"
+            meta = build_feature_matrix(
+                StrategyClass,
+                params,
+                df,
+                out_dir,
+                horizon=ft_cfg.horizon,
+                threshold=ft_cfg.threshold,
+                partition_days=ft_cfg.partition_days,
+                workers=ft_cfg.workers
+            )
+            log.info("features written", strategy=name, rows=meta['rows'], columns=meta['columns'],
+                     labels=meta['label_counts'], path=out_dir)
+            if ft_cfg.parity_bars:
+                parity = check_parity(StrategyClass, params, df, out_dir, bars=ft_cfg.parity_bars)
+                report_parity = log.info if parity['ok'] else log.warning
+                report_parity("train/serve parity", strategy=name, ok=parity['ok'], rows=parity['rows'],
+                              mismatched=parity['mismatched_rows'], missing=parity['missing_rows'],
+                              max_abs_diff=parity['max_abs_diff'])
 
         elif strat_item.shadow_mode:
-            print(f"Running '{name}' in shadow mode (only signal notifications)")
-            broker = ShadowBroker(paper=strat_item.paper, **cfg.broker.config)    
+            from src.brokers.shadow_broker import ShadowBroker
+            broker = account_broker(("shadow", strat_item.paper),
+                                 lambda: ShadowBroker(paper=strat_item.paper, **cfg.broker.config))
             instance = StrategyClass(params, broker, data_provider)
             instance.run()
 
         else:
             # Live trading: instantiate broker & run using configured broker and data provider
             # Determine broker class from registry
-            print(f"Running '{name}' in live mode")
-
             broker_name = cfg.broker.name
             if broker_name not in BROKER_CONFIG:
                 raise ValueError(f"Unknown broker '{broker_name}'")
             broker_meta = BROKER_CONFIG[broker_name]
             broker_cls = broker_meta["broker_class"]
             # Broker handles its own credential setup; pass paper flag and any extra config
-            broker = broker_cls(paper=strat_item.paper, **cfg.broker.config)
+            broker = account_broker((broker_name, strat_item.paper),
+                                 lambda: broker_cls(paper=strat_item.paper, **cfg.broker.config))
 
             # Instantiate strategy with broker and data provider then run
             instance = StrategyClass(params, broker, data_provider)
-            instance.run() 
\ No newline at end of file
+            lease = None
+            if strat_item.failover:
+                # Hot standby: only the lease holder routes orders; the other instance mirrors its state
+                from src.failover import attach_failover
+                lease = attach_failover(instance, strat_item.failover.group, strat_item.failover.lease)
+            try:
+                instance.run()
+            finally:
+                if lease is not None:
+                    lease.stop()
+
+    # Flush queued orders and report rate-limit delays and risk decisions
+    for (broker_name, paper), gateway in gateways.items():
+        gateway.close()
+        log.info("order gateway stats", broker=broker_name, paper=paper, **gateway.stats())
+        log.info("risk engine stats", broker=broker_name, paper=paper, **accounts[(broker_name, paper)].risk.stats())
@@ -0,0 +1,300 @@
+# Hot-standby failover: a Redis leader lease plus strategy state replicated from primary to standby
+import hashlib
+import hmac
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+# Fraction of the lease an instance stops short of, so its last orders land before a standby can take over
+LEASE_MARGIN = 0.1
+
+# Extend the lease only if this instance still holds it
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """Leader election for one failover group via `failover:<group>:leader` (SET NX PX).
+
+    A background thread renews the lease every lease/4 seconds while leading and otherwise tries to
+    acquire it, so a standby takes over within about lease + lease/4 seconds of the primary dying.
+    Each acquisition increments `failover:<group>:epoch`; the epoch fences replicated state from a
+    former leader. leading() answers from memory: the lease counts as held until shortly before it
+    could have expired in Redis, measured from the last successful acquire or renew, so a stalled
+    instance stops routing before anyone else can take over.
+    """
+
+    def __init__(self, client: redis.Redis, group: str, lease: float = 2.0, instance: Optional[str] = None) -> None:
+        self.redis = client
+        self.group = group
+        self.lease = lease
+        self.instance = instance or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.key = f"failover:{group}:leader"
+        self.epoch_key = f"failover:{group}:epoch"
+        self.epoch = 0
+        self.is_leader = False
+        # time.monotonic() after which leadership is no longer assumed
+        self.valid_until = 0.0
+        self._renew = self.redis.register_script(_RENEW)
+        self._release = self.redis.register_script(_RELEASE)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._tick()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.group}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self.is_leader:
+            self._release(keys=[self.key], args=[self.instance])
+            self.is_leader = False
+
+    def leading(self) -> bool:
+        """Whether this instance may route orders now; no Redis round trip, safe on the event loop."""
+        return self.is_leader and time.monotonic() < self.valid_until
+
+    def _tick(self) -> None:
+        ms = int(self.lease * 1000)
+        # The key expires no earlier than lease after the request was sent
+        sent = time.monotonic()
+        try:
+            if self.is_leader:
+                if self._renew(keys=[self.key], args=[self.instance, ms]):
+                    self.valid_until = sent + self.lease * (1 - LEASE_MARGIN)
+                else:
+                    self.is_leader = False
+                    log.warning("lost lease", instance=self.instance, group=self.group)
+            elif self.redis.set(self.key, self.instance, nx=True, px=ms):
+                self.epoch = int(self.redis.incr(self.epoch_key))
+                self.valid_until = sent + self.lease * (1 - LEASE_MARGIN)
+                self.is_leader = True
+                log.info("became leader", instance=self.instance, group=self.group, epoch=self.epoch)
+        except redis.exceptions.RedisError as e:
+            # Without Redis nobody can confirm leadership; stop routing until it is back
+            if self.is_leader:
+                log.warning("redis unavailable, stepping down", instance=self.instance, error=str(e))
+            self.is_leader = False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease / 4):
+            self._tick()
+
+
+class StateReplicator:
+    """Keeps a standby strategy's state identical to the primary's.
+
+    The leader processes each live bar, then appends the changed strategy attributes to the stream
+    `failover:<group>:state`. It appends a full snapshot on taking over and every full_every bars;
+    the latest full snapshot is also kept under `failover:<group>:snapshot` for standbys that join
+    later; both expire state_ttl seconds after the last publish. A follower does not run the
+    strategy: it applies the stream entries in order and buffers the bars they cover. On taking
+    over (including retaking the lease under a new epoch) it applies whatever the old leader
+    managed to publish, then replays the buffered bars the old leader never covered, with orders
+    live.
+
+    Entries are pickled, so each carries an HMAC-SHA256 over its fields keyed with the group's
+    shared secret; entries that fail the check are logged and never unpickled.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        lease: LeaderLease,
+        secret: bytes,
+        full_every: int = 300,
+        buffer_bars: int = 64,
+        max_stream: int = 10_000,
+        state_ttl: int = 60
+    ) -> None:
+        self.redis = client
+        self.lease = lease
+        self.stream_key = f"failover:{lease.group}:state"
+        self.snapshot_key = f"failover:{lease.group}:snapshot"
+        self.full_every = full_every
+        self.max_stream = max_stream
+        self.state_ttl = state_ttl
+        self.secret = secret
+        self.leading = False
+        # Lease epoch this instance took over under
+        self.epoch = 0
+        self.last_id: Optional[bytes] = None
+        self.epoch_seen = 0
+        # Timestamp of the last bar reflected in the replicated state
+        self.covered: Any = None
+        self.buffer: deque = deque(maxlen=buffer_bars)
+        self._published: Dict[str, bytes] = {}
+        self._since_full = 0
+        self.entries_applied = 0
+        self.bytes_published = 0
+        self.entries_rejected = 0
+
+    def _sign(self, fields: Dict[str, Any]) -> bytes:
+        mac = hmac.new(self.secret, self.stream_key.encode(), hashlib.sha256)
+        for name in ('epoch', 'kind', 'bar', 'state'):
+            value = fields[name]
+            value = value if isinstance(value, bytes) else str(value).encode()
+            mac.update(len(value).to_bytes(8, 'big'))
+            mac.update(value)
+        return mac.digest()
+
+    async def on_bar(self, strategy, bar) -> None:
+        if self.lease.is_leader:
+            if not self.leading or self.epoch != self.lease.epoch:
+                await self._take_over(strategy)
+            await strategy.on_new_data(bar)
+            self._publish(strategy, bar.timestamp)
+            return
+        if self.leading:
+            log.warning("demoted, following", stream=self.stream_key)
+            self.leading = False
+            self.buffer.clear()
+        self._follow(strategy)
+        self.buffer.append(bar)
+
+    async def _take_over(self, strategy) -> None:
+        self._follow(strategy)
+        missed = list(self.buffer)
+        if self.covered is not None:
+            stamps = [b.timestamp for b in missed]
+            if self.covered in stamps:
+                missed = missed[len(stamps) - stamps[::-1].index(self.covered):]
+        log.info("taking over", group=self.lease.group, epoch=self.lease.epoch, replaying=len(missed))
+        self.leading = True
+        self.epoch = self.lease.epoch
+        self.buffer.clear()
+        self._published = {}
+        for bar in missed:
+            await strategy.on_new_data(bar)
+            self.covered = bar.timestamp
+        # A fresh leader always starts its stream segment with a full snapshot
+        self._publish(strategy, self.covered, full=True)
+
+    def _publish(self, strategy, timestamp: Any, full: bool = False) -> None:
+        state = strategy.snapshot()
+        pickled = {k: pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for k, v in state.items()}
+        self._since_full += 1
+        full = full or not self._published or self._since_full >= self.full_every
+        if full:
+            changed = state
+            self._since_full = 0
+        else:
+            changed = {k: state[k] for k, v in pickled.items() if self._published.get(k) != v}
+        payload = zlib.compress(pickle.dumps(changed, protocol=pickle.HIGHEST_PROTOCOL))
+        fields = {
+            'epoch': self.epoch,
+            'kind': 'full' if full else 'delta',
+            'bar': pickle.dumps(timestamp),
+            'state': payload,
+        }
+        fields['sig'] = self._sign(fields)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xadd(self.stream_key, fields, maxlen=self.max_stream, approximate=True)
+        # Replicated state outlives its leader by state_ttl only, so a cold restart warms up afresh
+        pipe.expire(self.stream_key, self.state_ttl)
+        pipe.expire(self.snapshot_key, self.state_ttl)
+        try:
+            entry_id = pipe.execute()[0]
+            if full:
+                snap = self.redis.pipeline()
+                snap.delete(self.snapshot_key)
+                snap.hset(self.snapshot_key, mapping={'id': entry_id, **fields})
+                snap.expire(self.snapshot_key, self.state_ttl)
+                snap.execute()
+        except redis.exceptions.RedisError as e:
+            # Keep trading; the next publish is a full snapshot, since what standbys got is unknown
+            log.warning("redis unavailable, state not published", stream=self.stream_key, error=str(e))
+            self._published = {}
+            return
+        self._published = pickled
+        self.last_id = entry_id
+        self.covered = timestamp
+        self.bytes_published += len(payload)
+
+    def _follow(self, strategy) -> None:
+        try:
+            self._read(strategy)
+        except redis.exceptions.RedisError as e:
+            # Keep buffering bars; the next bar resumes from the last entry applied
+            log.warning("redis unavailable, state not followed", stream=self.stream_key, error=str(e))
+
+    def _read(self, strategy) -> None:
+        if self.last_id is None:
+            # Start from the latest full snapshot, then every entry after it
+            snap = {k.decode(): v for k, v in self.redis.hgetall(self.snapshot_key).items()}
+            self.last_id = b'0-0'
+            if snap:
+                self.last_id = snap.pop('id')
+                self._apply(strategy, snap)
+        while True:
+            batch = self.redis.xread({self.stream_key: self.last_id}, count=1000)
+            if not batch:
+                return
+            entries: List = batch[0][1]
+            for entry_id, fields in entries:
+                self._apply(strategy, {k.decode() if isinstance(k, bytes) else k: v for k, v in fields.items()})
+                self.last_id = entry_id
+            if len(entries) < 1000:
+                return
+
+    def _apply(self, strategy, fields: Dict[str, Any]) -> None:
+        sig = fields.get('sig')
+        if sig is None or not hmac.compare_digest(sig, self._sign(fields)):
+            self.entries_rejected += 1
+            log.error("unsigned or tampered state entry ignored", stream=self.stream_key)
+            return
+        epoch = int(fields['epoch'])
+        if epoch < self.epoch_seen:
+            # Written by a leader that has since been replaced
+            return
+        self.epoch_seen = epoch
+        strategy.restore(pickle.loads(zlib.decompress(fields['state'])))
+        self.covered = pickle.loads(fields['bar'])
+        self.entries_applied += 1
+
+
+def attach_failover(
+    strategy,
+    group: str,
+    lease: float = 2.0,
+    client: Optional[redis.Redis] = None,
+    secret: Optional[str] = None
+) -> LeaderLease:
+    """Put a strategy (already holding its live broker) into a hot-standby group; returns the started lease.
+
+    Every instance in the group needs the same secret (default: the FAILOVER_SECRET env var).
+    """
+    from src.brokers.leader_broker import LeaderGatedBroker
+    secret = secret or os.getenv('FAILOVER_SECRET')
+    if not secret:
+        raise ValueError("FAILOVER_SECRET must be set to sign replicated strategy state")
+    client = client or redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    leader = LeaderLease(client, group, lease)
+    strategy.broker = LeaderGatedBroker(strategy.broker, leader)
+    strategy.replicator = StateReplicator(client, leader, secret.encode())
+    leader.start()
+    return leader
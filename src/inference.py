@@ -0,0 +1,196 @@
+# Micro-batched model inference: one predict_proba call per bar for every strategy sharing a model
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+# Models loaded in this process, by path
+_MODELS: Dict[str, Any] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def load_model(path: str) -> Any:
+    """Load a joblib-serialized classifier (e.g. an XGBClassifier) once per process."""
+    with _MODELS_LOCK:
+        model = _MODELS.get(path)
+        if model is None:
+            import joblib
+            model = _MODELS[path] = joblib.load(path)
+    return model
+
+
+def predict_proba(path: str, features: np.ndarray) -> np.ndarray:
+    """Class probabilities for a (rows, features) matrix; also the task run in an inference process."""
+    return np.asarray(load_model(path).predict_proba(features), dtype=np.float64)
+
+
+def _percentile_ms(values, q: float) -> float:
+    return float(np.percentile(np.fromiter(values, dtype=np.float64), q) * 1000) if values else float('nan')
+
+
+class InferenceServer:
+    """Gathers feature vectors from many strategies into one matrix and predicts them together.
+
+    Strategies register once, then await predict(features, deadline) on every bar. A batch is
+    flushed as soon as every registered strategy has submitted, when it reaches max_batch rows,
+    or max_wait seconds after its first request. The prediction runs on the server thread
+    (mode='thread'; XGBoost releases the GIL) or in a dedicated process (mode='process').
+    A request not answered within its deadline returns None so the caller can fall back to its
+    rules; it is dropped from the batch if that has not started yet.
+    """
+
+    def __init__(self, model_path: str, max_wait: float = 0.002, max_batch: int = 4096, mode: str = 'thread') -> None:
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown inference mode '{mode}'")
+        self.model_path = model_path
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.mode = mode
+        self.clients = 0
+        self._pending: List[Tuple[np.ndarray, Future, float]] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if mode == 'process':
+            self._pool = ProcessPoolExecutor(max_workers=1, initializer=load_model, initargs=(model_path,))
+        else:
+            # Fail on a bad path now rather than on the first bar
+            load_model(model_path)
+        # Latency samples in seconds: per batch prediction, and per request from submit to result
+        self.batch_latency: deque = deque(maxlen=10_000)
+        self.request_latency: deque = deque(maxlen=10_000)
+        self.batch_rows = 0
+        self.batches = 0
+        self.requests = 0
+        self.deadline_misses = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name='inference', daemon=True)
+        self._thread.start()
+
+    def register(self) -> None:
+        with self._cond:
+            self.clients += 1
+
+    def unregister(self) -> None:
+        with self._cond:
+            self.clients = max(0, self.clients - 1)
+            self._cond.notify()
+
+    def submit(self, features) -> Future:
+        """Queue one feature vector; the future resolves to its row of class probabilities."""
+        future: Future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError('InferenceServer is closed')
+            self._pending.append((np.asarray(features, dtype=np.float64).ravel(), future, time.perf_counter()))
+            self.requests += 1
+            self._cond.notify()
+        return future
+
+    async def predict(self, features, deadline: float) -> Optional[np.ndarray]:
+        """Class probabilities for one feature vector, or None if they did not arrive within deadline seconds."""
+        future = self.submit(features)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), deadline)
+        except asyncio.TimeoutError:
+            with self._cond:
+                self.deadline_misses += 1
+            return None
+        except Exception as e:
+            log.warning("prediction failed, falling back to rules", error=str(e))
+            return None
+
+    def _next_batch(self) -> Optional[List[Tuple[np.ndarray, Future, float]]]:
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            flush_at = self._pending[0][2] + self.max_wait
+            while len(self._pending) < min(max(1, self.clients), self.max_batch) and not self._stopped:
+                remaining = flush_at - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+        # Requests whose caller already gave up are cancelled; skip them
+        return [item for item in batch if item[1].set_running_or_notify_cancel()]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                matrix = np.vstack([features for features, _, _ in batch])
+                if self._pool is not None:
+                    probs = self._pool.submit(predict_proba, self.model_path, matrix).result()
+                else:
+                    probs = predict_proba(self.model_path, matrix)
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            with self._cond:
+                self.batches += 1
+                self.batch_rows += len(batch)
+                self.batch_latency.append(done - started)
+                self.request_latency.extend(done - submitted for _, _, submitted in batch)
+            for row, (_, future, _) in zip(probs, batch):
+                future.set_result(row)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch': self.batch_rows / self.batches if self.batches else 0.0,
+                'deadline_misses': self.deadline_misses,
+                'errors': self.errors,
+                'batch_ms_p50': _percentile_ms(self.batch_latency, 50),
+                'batch_ms_p99': _percentile_ms(self.batch_latency, 99),
+                'latency_ms_p50': _percentile_ms(self.request_latency, 50),
+                'latency_ms_p99': _percentile_ms(self.request_latency, 99),
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+# One server per model path, shared by every strategy in the process
+_SERVERS: Dict[str, InferenceServer] = {}
+_SERVERS_LOCK = threading.Lock()
+
+
+def shared_server(model_path: str) -> InferenceServer:
+    """The process-wide server for a model; INFERENCE_MODE (thread/process) and INFERENCE_MAX_WAIT_MS apply on creation."""
+    with _SERVERS_LOCK:
+        server = _SERVERS.get(model_path)
+        if server is None:
+            server = _SERVERS[model_path] = InferenceServer(
+                model_path,
+                max_wait=float(os.getenv('INFERENCE_MAX_WAIT_MS', '2')) / 1000,
+                mode=os.getenv('INFERENCE_MODE', 'thread')
+            )
+    return server
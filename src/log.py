@@ -0,0 +1,255 @@
+# Structured logging: per-module levels and sampling, formatted and written on a background thread
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+# structlog is imported on first use (it costs tens of ms at startup): by a logger's first enabled
+# call, or by the writer thread's first record
+
+LEVELS = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARNING': logging.WARNING,
+          'ERROR': logging.ERROR, 'CRITICAL': logging.CRITICAL}
+# Sampling thins out routine events only; warnings and errors are always kept
+SAMPLED_METHODS = frozenset(('debug', 'info'))
+_METHODS = ('debug', 'info', 'warning', 'error', 'exception', 'critical')
+_METHOD_LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING,
+                  'error': logging.ERROR, 'exception': logging.ERROR, 'critical': logging.CRITICAL}
+
+
+def _parse_level(value: Any) -> int:
+    if isinstance(value, int):
+        return value
+    try:
+        return LEVELS[str(value).strip().upper()]
+    except KeyError:
+        raise ValueError(f"Unknown log level '{value}'") from None
+
+
+def _parse_pairs(spec: Optional[str]) -> Dict[str, str]:
+    """'src.failover=DEBUG,src.data_providers=WARNING' -> {'src.failover': 'DEBUG', ...}"""
+    pairs = {}
+    for item in (spec or '').split(','):
+        if item.strip():
+            prefix, _, value = item.partition('=')
+            pairs[prefix.strip()] = value.strip()
+    return pairs
+
+
+def _for_module(name: str, settings: Mapping[str, Any], default: Any) -> Any:
+    """Setting of the longest dotted prefix of `name` present in `settings`."""
+    while True:
+        if name in settings:
+            return settings[name]
+        if '.' not in name:
+            return default
+        name = name.rsplit('.', 1)[0]
+
+
+def _sampler(keep_every: int):
+    """Processor keeping one in `keep_every` debug/info events of a logger."""
+    import structlog
+    counter = itertools.count()
+
+    def sample(logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        if method_name in SAMPLED_METHODS and next(counter) % keep_every:
+            raise structlog.DropEvent
+        return event_dict
+    return sample
+
+
+def _capture_exc_info(logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    # The traceback has to be taken on the calling thread; it is rendered on the writer thread
+    if event_dict.get('exc_info') is True:
+        event_dict['exc_info'] = sys.exc_info()
+    return event_dict
+
+
+def _add_timestamp(logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    # When the event was logged, not when the writer got to it
+    record = event_dict.get('_record')
+    created = record.created if record is not None else datetime.now().timestamp()
+    event_dict['timestamp'] = datetime.fromtimestamp(created).isoformat(sep=' ', timespec='milliseconds')
+    return event_dict
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; the listener thread does all the formatting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _DeferredFormatter(logging.Formatter):
+    """Builds the structlog renderer (console or json) when the writer thread formats its first record."""
+
+    def __init__(self, fmt: str, colors: bool) -> None:
+        super().__init__()
+        self.fmt = fmt
+        self.colors = colors
+        self._formatter: Optional[logging.Formatter] = None
+
+    def format(self, record: logging.LogRecord) -> str:
+        if self._formatter is None:
+            import structlog
+            if self.fmt == 'json':
+                renderer = [structlog.processors.format_exc_info, structlog.processors.JSONRenderer()]
+            else:
+                renderer = [structlog.dev.ConsoleRenderer(colors=self.colors)]
+            self._formatter = structlog.stdlib.ProcessorFormatter(processors=[
+                structlog.stdlib.add_log_level,
+                structlog.stdlib.add_logger_name,
+                _add_timestamp,
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                *renderer,
+            ])
+        return self._formatter.format(record)
+
+
+class Logger:
+    """A module's logger: debug/info/warning/error/exception/critical(event, **fields) and bind(**fields).
+
+    The level methods are bound to structlog on the first call at or above the module's level,
+    and again after configure(); once bound, a call below the level is a plain no-op with no
+    processing. Log events as a short name plus key-value fields rather than formatted strings,
+    so a disabled call does not build its message either.
+    """
+
+    __slots__ = ('name', 'level') + _METHODS + ('bind',)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._defer()
+
+    def _defer(self) -> None:
+        """Point every method at a stand-in that binds the logger on its first enabled call."""
+        self.level = _for_module(self.name, _state['levels'], _state['level'])
+        for method in _METHODS:
+            setattr(self, method, self._first_call(method))
+
+        def bind(**fields: Any) -> Any:
+            self._bind()
+            return self.bind(**fields)
+        self.bind = bind
+
+    def _first_call(self, method: str) -> Callable[..., Any]:
+        enabled = _METHOD_LEVELS[method] >= self.level
+
+        def call(*args: Any, **fields: Any) -> Any:
+            if not enabled:
+                return None
+            self._bind()
+            return getattr(self, method)(*args, **fields)
+        return call
+
+    def _bind(self) -> None:
+        import structlog
+        processors: List[Any] = []
+        every = _for_module(self.name, _state['sample'], 1)
+        if every > 1:
+            processors.append(_sampler(every))
+        processors += [_capture_exc_info, structlog.stdlib.ProcessorFormatter.wrap_for_formatter]
+        logger = structlog.wrap_logger(
+            logging.getLogger(self.name),
+            wrapper_class=structlog.make_filtering_bound_logger(self.level),
+            processors=processors,
+            cache_logger_on_first_use=True
+        ).bind()
+        for method in _METHODS:
+            setattr(self, method, getattr(logger, method))
+        self.bind = logger.bind
+
+    def is_enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+
+_state: Dict[str, Any] = {'configured': False, 'settings': {}, 'level': logging.INFO, 'levels': {}, 'sample': {},
+                          'handler': None, 'listener': None, 'overrides': []}
+_loggers: List[Logger] = []
+
+
+def configure(
+    level: Any = None,
+    levels: Optional[Mapping[str, Any]] = None,
+    sample: Optional[Mapping[str, float]] = None,
+    fmt: Optional[str] = None,
+    stream: Any = None
+) -> None:
+    """Set up logging for the process; anything not given is read from the environment.
+
+    LOG_LEVEL is the default level (INFO). LOG_LEVELS overrides it per module prefix, e.g.
+    "src.data_providers=WARNING,src.failover=DEBUG". LOG_SAMPLE keeps a fraction of the debug and
+    info events of a module prefix, e.g. "src.strategies=0.01" keeps one in a hundred. LOG_FORMAT
+    is console (default) or json. Records go through a queue to a listener thread, which renders
+    and writes them to `stream` (stderr); callers never wait on formatting or I/O. Loggers that
+    already exist pick up the new settings. Standard library loggers (e.g. alpaca-py's) are
+    written by the same listener at the default level.
+    """
+    level = _parse_level(level if level is not None else os.getenv('LOG_LEVEL', 'INFO'))
+    if levels is None:
+        levels = _parse_pairs(os.getenv('LOG_LEVELS'))
+    levels = {prefix: _parse_level(value) for prefix, value in levels.items()}
+    if sample is None:
+        sample = _parse_pairs(os.getenv('LOG_SAMPLE'))
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'console')).lower()
+    if fmt not in ('console', 'json'):
+        raise ValueError(f"Unknown log format '{fmt}'")
+    stream = stream or sys.stderr
+    settings = dict(level=level, levels=levels, sample=sample, fmt=fmt, stream=stream)
+    sample = {prefix: max(1, round(1 / float(rate))) for prefix, rate in sample.items()}
+
+    shutdown()
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(_DeferredFormatter(fmt, getattr(stream, 'isatty', lambda: False)()))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(records)
+    listener = logging.handlers.QueueListener(records, writer)
+    listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    # The standard library logger of an overridden prefix must let its records through too
+    for prefix in _state['overrides']:
+        logging.getLogger(prefix).setLevel(logging.NOTSET)
+    for prefix, prefix_level in levels.items():
+        logging.getLogger(prefix).setLevel(prefix_level)
+
+    _state.update(configured=True, settings=settings, level=level, levels=levels, sample=sample,
+                  handler=handler, listener=listener, overrides=list(levels))
+    for logger in _loggers:
+        logger._defer()
+
+
+def shutdown() -> None:
+    """Write out everything still queued and stop the listener thread."""
+    listener, handler = _state['listener'], _state['handler']
+    if listener is not None:
+        logging.getLogger().removeHandler(handler)
+        listener.stop()
+        _state.update(listener=None, handler=None)
+
+
+def _after_fork() -> None:
+    # A forked worker inherits the queue handler but not the listener thread: give it its own
+    if _state['listener'] is not None:
+        logging.getLogger().removeHandler(_state['handler'])
+        _state.update(listener=None, handler=None)
+        configure(**_state['settings'])
+
+
+def get_logger(name: str) -> Logger:
+    """Logger for a module (pass __name__); sets logging up from the environment on first use."""
+    if not _state['configured']:
+        configure()
+    logger = Logger(name)
+    _loggers.append(logger)
+    return logger
+
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_after_fork)
@@ -1,12 +1,13 @@
 # Load environment variables from .env in current directory or parents
 from dotenv import load_dotenv
 load_dotenv(override=True)
-print("Loaded environment")
+
+# Logging reads its LOG_* settings from the environment, so it comes after .env is loaded
+from src.log import get_logger
+log = get_logger(__name__)
+log.debug("loaded environment")
 
 import argparse
-from src.cli.interactive import interactive_start
-from src.cli.configured import run_configured
-from src.engine import run_from_config
 
 
 def main():
@@ -24,17 +25,20 @@ def main():
     )
     args = parser.parse_args()
 
-    # Load configuration via interactive or file-driven branch
+    # Load configuration via interactive or file-driven branch (imported per branch to keep startup fast)
     if args.configured:
+        from src.cli.configured import run_configured
         cfg = run_configured(args.config_file)
     else:
+        from src.cli.interactive import interactive_start
         cfg = interactive_start()
 
     if cfg is None:
-        print("No configuration provided. Exiting.")
+        log.warning("no configuration provided, exiting")
         return
 
     # Execute engine with the loaded config
+    from src.engine import run_from_config
     run_from_config(cfg)
 
 
@@ -0,0 +1,431 @@
+# Order lifecycle: reprice and kill timeouts for resting orders, and OCO stop/target exits, on a timer wheel
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.brokers.simulated_broker import SimulatedBroker
+from src.data_providers.bar import Bar
+from src.log import get_logger
+from src.timer_wheel import Timer, TimerWheel
+
+log = get_logger(__name__)
+
+# Strategy design defaults: unfilled limits turn marketable after 2 s, stale orders are killed at 60 s
+REPRICE_AFTER = 2.0
+EXPIRE_AFTER = 60.0
+# Wheel resolution on the live event loop and on a simulated (bar timestamp) clock
+LIVE_TICK = 0.01
+SIMULATED_TICK = 1.0
+# Seconds before a cancel whose outcome is unknown is tried again
+CANCEL_RETRY = 1.0
+# Order statuses after which nothing more fills (Alpaca OrderStatus values), apart from 'filled'
+CLOSED_STATUSES = ('canceled', 'expired', 'rejected', 'replaced', 'done_for_day')
+
+
+def _already_filled(error: Exception) -> bool:
+    """Whether a refused cancel says the order has filled (Alpaca: 'order is already in "filled" state')."""
+    message = str(error).lower()
+    return 'already' in message and '"filled"' in message
+
+
+def _status(order) -> str:
+    status = getattr(order, 'status', None)
+    return str(getattr(status, 'value', status)).lower()
+
+
+class ManagedOrder:
+    """An order placed through the manager; status is open (resting), filled, replaced, expired or cancelled."""
+
+    __slots__ = ('side', 'size', 'price', 'symbol', 'order_type', 'reprice_after', 'expire_after',
+                 'on_fill', 'on_close', 'order_id', 'status', 'fill_price', 'timers')
+
+    def __init__(self, side: str, size: float, price: float, symbol: str, order_type: str,
+                 reprice_after: Optional[float] = None, expire_after: Optional[float] = None,
+                 on_fill: Optional[Callable] = None, on_close: Optional[Callable] = None) -> None:
+        self.side = side
+        self.size = size
+        self.price = price
+        self.symbol = symbol
+        self.order_type = order_type
+        self.reprice_after = reprice_after
+        self.expire_after = expire_after
+        self.on_fill = on_fill
+        self.on_close = on_close
+        self.order_id: Any = None
+        self.status = 'new'
+        self.fill_price: Optional[float] = None
+        self.timers: List[Timer] = []
+
+    def __repr__(self) -> str:
+        return f"ManagedOrder({self.side} {self.size} {self.symbol} {self.order_type} @ {self.price}, {self.status})"
+
+
+class OcoExit:
+    """A stop and a target for one position, held by the manager; the first one touched exits at market."""
+
+    __slots__ = ('side', 'size', 'symbol', 'stop', 'target', 'on_fill', 'timer')
+
+    def __init__(self, side: str, size: float, symbol: str, stop: float, target: float, on_fill: Optional[Callable] = None) -> None:
+        self.side = side
+        self.size = size
+        self.symbol = symbol
+        self.stop = stop
+        self.target = target
+        self.on_fill = on_fill
+        self.timer: Optional[Timer] = None
+
+    def trigger(self, bar: Bar):
+        """(leg, price) if the bar's range reaches the stop or target, else None; the stop wins a tie."""
+        if self.side.upper() == 'SELL':
+            # Exiting a long: stop below, target above; a gap through either fills at the open
+            if bar.low <= self.stop:
+                return 'stop', min(self.stop, bar.open)
+            if bar.high >= self.target:
+                return 'target', max(self.target, bar.open)
+        else:
+            if bar.high >= self.stop:
+                return 'stop', max(self.stop, bar.open)
+            if bar.low <= self.target:
+                return 'target', min(self.target, bar.open)
+        return None
+
+
+class OrderLifecycleManager:
+    """Tracks a strategy's resting orders and exits, with every timeout on one hashed timer wheel.
+
+    submit() places an order through the strategy's current broker. A limit order that is still
+    resting `reprice_after` seconds later is cancelled and replaced at market. An order still
+    resting at `expire_after` is cancelled. Orders the broker reports as done at once count as
+    filled when placed: simulated fills, market orders, shadow signals, and orders netted away
+    by the gateway. The broker does not stream fills, so only a cancel refused because the order
+    already filled counts as a fill; after any other failure the order's status is queried, and
+    while it is still open or unknown the cancel is retried every CANCEL_RETRY seconds. Brokers
+    that do report fills can call fill(order_id, price).
+
+    arm_oco() holds a stop and a target for a position. They are checked against every bar's
+    range in on_bar(), and the first one touched sends a market exit and disarms the other, even
+    between the strategy's own decisions. An optional expiry flattens the position at market.
+
+    Live, the wheel runs with 10 ms ticks on the manager's own event loop, on a thread started
+    on first use, driven by a task that exists only while timers are pending. Calls from the
+    strategy's loop (which may last only one bar) are handed to that loop, so timeouts fire on
+    time between bars; on_fill and on_close callbacks run on that thread. In a backtest
+    (SimulatedBroker) the wheel runs on the bar timestamps: the Backtester calls on_bar(bar, now)
+    before the strategy sees each bar, and everything runs on the caller's loop. The simulated
+    broker has no order book and fills every order when placed, so reprices and expiries never
+    fire in backtests; only OCO exits and their expiry are exercised there.
+    """
+
+    def __init__(self, strategy: Any, tick: Optional[float] = None, slots: int = 4096) -> None:
+        self.strategy = strategy
+        # A backtest's risk-checked broker wraps the SimulatedBroker that replays the bars
+        account = getattr(strategy.broker, 'live_broker', strategy.broker)
+        self.simulated = isinstance(account, SimulatedBroker)
+        self.tick_size = tick or (SIMULATED_TICK if self.simulated else LIVE_TICK)
+        self.slots = slots
+        self.wheel: Optional[TimerWheel] = None
+        self.orders: Dict[Any, ManagedOrder] = {}
+        self.exits: List[OcoExit] = []
+        self.last_price: Dict[Optional[str], float] = {}
+        self.clock = 0.0  # simulated time, seconds
+        self._actions: List[tuple] = []
+        self._draining = False
+        self._ticker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.counts = {'filled': 0, 'repriced': 0, 'expired': 0, 'stops': 0, 'targets': 0, 'timeouts': 0}
+        if self.simulated:
+            account.lifecycle = self
+
+    def now(self) -> float:
+        return self.clock if self.simulated else self._live_loop().time()
+
+    def _live_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='order-lifecycle', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _run(self, coro: Awaitable) -> Any:
+        """Await coro on the manager's loop (live), or where it is (backtest, or already on that loop)."""
+        if self.simulated:
+            return await coro
+        loop = self._live_loop()
+        if threading.current_thread() is self._thread:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _call(self, fn: Callable, *args: Any) -> Any:
+        """Call fn on the manager's thread (live) and return its result."""
+        if self.simulated:
+            return fn(*args)
+        loop = self._live_loop()
+        if threading.current_thread() is self._thread:
+            return fn(*args)
+        done: Future = Future()
+
+        def call() -> None:
+            try:
+                done.set_result(fn(*args))
+            except Exception as e:
+                done.set_exception(e)
+        loop.call_soon_threadsafe(call)
+        return done.result()
+
+    def _wheel(self) -> TimerWheel:
+        if self.wheel is None:
+            self.wheel = TimerWheel(self.tick_size, self.slots, now=self.now())
+        return self.wheel
+
+    def _schedule(self, delay: float, action: Callable, item: Any) -> Timer:
+        timer = self._wheel().schedule(self.now(), delay, self._actions.append, (action, item))
+        if not self.simulated:
+            self._ensure_ticker()
+        return timer
+
+    def _ensure_ticker(self) -> None:
+        # Only called on the manager's loop
+        if self._ticker is None or self._ticker.done():
+            self._ticker = self._loop.create_task(self._run_ticker())
+
+    async def _run_ticker(self) -> None:
+        while self.wheel is not None and len(self.wheel):
+            await asyncio.sleep(self.tick_size)
+            await self._tick()
+
+    async def tick(self, now: Optional[float] = None) -> None:
+        """Advance the wheel to now (simulated time, or the loop clock) and run the timeouts it fired."""
+        await self._run(self._tick(now))
+
+    async def _tick(self, now: Optional[float] = None) -> None:
+        if now is not None:
+            self.clock = now
+        if self.wheel is not None:
+            self.wheel.advance(self.now())
+        if self._draining:
+            # The running drain picks up anything just fired
+            return
+        self._draining = True
+        try:
+            while self._actions:
+                action, item = self._actions.pop(0)
+                await action(item)
+        finally:
+            self._draining = False
+
+    async def on_bar(self, bar: Bar, now: Optional[float] = None) -> None:
+        """Run timeouts due by the bar, then exit any armed OCO whose stop or target the bar's range reached."""
+        await self._run(self._on_bar(bar, now))
+
+    async def _on_bar(self, bar: Bar, now: Optional[float]) -> None:
+        await self._tick(now)
+        self.last_price[bar.symbol] = bar.close
+        for exit in list(self.exits):
+            if bar.symbol is not None and exit.symbol != bar.symbol:
+                continue
+            hit = exit.trigger(bar)
+            if hit is not None:
+                await self._exit(exit, *hit)
+
+    async def submit(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        symbol: str,
+        order_type: str = 'limit',
+        reprice_after: Optional[float] = REPRICE_AFTER,
+        expire_after: Optional[float] = EXPIRE_AFTER,
+        on_fill: Optional[Callable[[ManagedOrder, float], None]] = None,
+        on_close: Optional[Callable[[ManagedOrder], None]] = None
+    ) -> ManagedOrder:
+        """Place an order with lifecycle timeouts; on_fill(order, price) or on_close(order) reports how it ended."""
+        order = ManagedOrder(side, size, price, symbol, order_type, reprice_after, expire_after, on_fill, on_close)
+        await self._run(self._place(order))
+        return order
+
+    async def _place(self, order: ManagedOrder) -> None:
+        result = await self.strategy.broker.place_order(
+            side=order.side, size=order.size, price=order.price, symbol=order.symbol, order_type=order.order_type)
+        order_id = getattr(result, 'id', None)
+        if order_id is None or order.order_type == 'market':
+            self._filled(order, order.price)
+            return
+        order.order_id = order_id
+        order.status = 'open'
+        self.orders[order_id] = order
+        if order.reprice_after is not None and order.order_type == 'limit':
+            order.timers.append(self._schedule(order.reprice_after, self._reprice, order))
+        if order.expire_after is not None:
+            order.timers.append(self._schedule(order.expire_after, self._expire, order))
+
+    def fill(self, order_id: Any, price: Optional[float] = None) -> None:
+        """Report a fill of a resting order (e.g. from a broker's trade update stream)."""
+        self._call(self._fill, order_id, price)
+
+    def _fill(self, order_id: Any, price: Optional[float]) -> None:
+        order = self.orders.get(order_id)
+        if order is not None:
+            self._filled(order, order.price if price is None else price)
+
+    def _filled(self, order: ManagedOrder, price: float) -> None:
+        self._close(order, 'filled')
+        order.fill_price = price
+        self.counts['filled'] += 1
+        if order.on_fill is not None:
+            order.on_fill(order, price)
+
+    def _close(self, order: ManagedOrder, status: str) -> None:
+        order.status = status
+        for timer in order.timers:
+            timer.cancel()
+        order.timers.clear()
+        self.orders.pop(order.order_id, None)
+
+    async def _cancel(self, order: ManagedOrder) -> Optional[bool]:
+        """Cancel a resting order: True once it is cancelled, False if it had filled, None while that is unknown."""
+        broker = self.strategy.broker
+        try:
+            await broker.cancel_order(order.order_id)
+            return True
+        except NotImplementedError:
+            # A broker that cannot cancel says nothing about the order's state
+            raise
+        except Exception as e:
+            error = e
+        if _already_filled(error):
+            log.info("cancel refused, order filled", order_id=order.order_id, symbol=order.symbol, error=str(error))
+            self._filled(order, order.price)
+            return False
+        # A timeout, rate limit or network error says nothing about the order: ask the broker
+        try:
+            state = await broker.get_order(order.order_id)
+        except Exception as e:
+            log.warning("cancel failed, order status unavailable", order_id=order.order_id, symbol=order.symbol,
+                        error=str(error), status_error=str(e))
+            return None
+        status = _status(state)
+        if status == 'filled':
+            price = getattr(state, 'filled_avg_price', None)
+            self._filled(order, order.price if price is None else float(price))
+            return False
+        if status in CLOSED_STATUSES:
+            return True
+        log.warning("cancel failed, order still open", order_id=order.order_id, symbol=order.symbol,
+                    status=status, error=str(error))
+        return None
+
+    def _retry(self, action: Callable, order: ManagedOrder) -> None:
+        """Try a cancelling action again later; the order stays open meanwhile."""
+        order.timers.append(self._schedule(CANCEL_RETRY, action, order))
+
+    async def _reprice(self, order: ManagedOrder) -> None:
+        if order.status != 'open':
+            return
+        cancelled = await self._cancel(order)
+        if cancelled is None:
+            self._retry(self._reprice, order)
+        if not cancelled:
+            return
+        self._close(order, 'replaced')
+        self.counts['repriced'] += 1
+        # A market replacement counts as filled when placed, so it needs no timeouts
+        await self.submit(order.side, order.size, order.price, order.symbol, 'market',
+                          on_fill=order.on_fill, on_close=order.on_close)
+
+    async def _expire(self, order: ManagedOrder) -> None:
+        if order.status != 'open':
+            return
+        cancelled = await self._cancel(order)
+        if cancelled is None:
+            self._retry(self._expire, order)
+        if not cancelled:
+            return
+        self._close(order, 'expired')
+        self.counts['expired'] += 1
+        if order.on_close is not None:
+            order.on_close(order)
+
+    async def cancel(self, order: ManagedOrder) -> bool:
+        """Cancel a resting order now; False if it was no longer resting, had filled, or is still being cancelled."""
+        return await self._run(self._cancel_resting(order))
+
+    async def _cancel_resting(self, order: ManagedOrder) -> bool:
+        if order.status != 'open':
+            return False
+        cancelled = await self._cancel(order)
+        if cancelled is None:
+            # Keep trying in the background; on_close reports the outcome
+            self._retry(self._cancel_resting, order)
+        if not cancelled:
+            return False
+        self._close(order, 'cancelled')
+        if order.on_close is not None:
+            order.on_close(order)
+        return True
+
+    def arm_oco(
+        self,
+        side: str,
+        size: float,
+        symbol: str,
+        stop: float,
+        target: float,
+        expire_after: Optional[float] = None,
+        on_fill: Optional[Callable[[OcoExit, str, float], None]] = None
+    ) -> OcoExit:
+        """Hold a stop/target exit pair; on_fill(exit, 'stop'|'target'|'timeout', price) reports the exit."""
+        exit = OcoExit(side, size, symbol, stop, target, on_fill)
+        self._call(self._arm, exit, expire_after)
+        return exit
+
+    def _arm(self, exit: OcoExit, expire_after: Optional[float]) -> None:
+        self.exits.append(exit)
+        if expire_after is not None:
+            exit.timer = self._schedule(expire_after, self._timeout_exit, exit)
+
+    def disarm(self, exit: OcoExit) -> bool:
+        return self._call(self._disarm, exit)
+
+    def _disarm(self, exit: OcoExit) -> bool:
+        if exit not in self.exits:
+            return False
+        self.exits.remove(exit)
+        if exit.timer is not None:
+            exit.timer.cancel()
+        return True
+
+    async def _exit(self, exit: OcoExit, leg: str, price: float) -> None:
+        if not self._disarm(exit):
+            return
+        await self.strategy.broker.place_order(side=exit.side, size=exit.size, price=price, symbol=exit.symbol, order_type='market')
+        self.counts[{'stop': 'stops', 'target': 'targets', 'timeout': 'timeouts'}[leg]] += 1
+        if exit.on_fill is not None:
+            exit.on_fill(exit, leg, price)
+
+    async def _timeout_exit(self, exit: OcoExit) -> None:
+        price = self.last_price.get(exit.symbol, self.last_price.get(None, exit.stop))
+        await self._exit(exit, 'timeout', price)
+
+    def reset(self) -> None:
+        """Forget every tracked order, exit and timer (e.g. after warm-up); nothing is sent to the broker."""
+        self._call(self._reset)
+
+    def _reset(self) -> None:
+        for order in list(self.orders.values()):
+            self._close(order, 'cancelled')
+        for exit in list(self.exits):
+            self._disarm(exit)
+        self._actions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'resting': len(self.orders),
+            'armed_exits': len(self.exits),
+            'timers': len(self.wheel) if self.wheel is not None else 0,
+            **self.counts,
+        }
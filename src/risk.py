@@ -0,0 +1,224 @@
+# Pre-trade risk: one in-memory set of counters per account, checked before every order
+import copy
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# Sizes below this are treated as flat
+EPSILON = 1e-9
+
+
+def trading_day() -> date:
+    """Current US equities session date (America/New_York)."""
+    return datetime.now(ZoneInfo("America/New_York")).date()
+
+
+def session_day(ns: int) -> date:
+    """US equities session date of a UTC timestamp in nanoseconds (a backtest bar's time)."""
+    return datetime.fromtimestamp(ns / 1e9, ZoneInfo("America/New_York")).date()
+
+
+class RiskRejected(Exception):
+    """Raised by RiskEngine.approve with the limit an order would breach."""
+
+
+class _SymbolBook:
+    __slots__ = ('net', 'entry_value', 'mark', 'open_orders', 'reserved', 'opening')
+
+    def __init__(self) -> None:
+        self.net = 0.0  # signed size routed: long positive, short negative
+        self.entry_value = 0.0  # sum of signed size * fill price
+        self.mark = 0.0  # last price seen for the symbol
+        self.open_orders = 0  # approved, not yet filled or released
+        self.reserved = 0.0  # exposure of approved orders that add to the position
+        self.opening = 0  # approved orders that would open the position from flat
+
+
+class RiskEngine:
+    """Counters for positions, exposure, open orders and intraday PnL, shared by every strategy on an account.
+
+    `approve` decides an order in constant time and reserves it as an open order; `on_fill` (or
+    `release`, if the order never reached the market) settles it. Orders that only reduce a
+    position are always approved. Orders that open or add to one are rejected when intraday PnL
+    is down `daily_drawdown` of the day's starting equity, when they would open more than
+    `max_total_positions` symbols, when the symbol already has `max_open_orders_per_symbol`
+    orders in flight, or when gross exposure (including approved orders) would exceed
+    `max_gross_exposure` times starting equity. PnL is marked at the latest order or fill price
+    per symbol. Check and reservation happen under one lock, so limits hold across strategies
+    and threads.
+    """
+
+    def __init__(
+        self,
+        daily_drawdown: float = 0.03,
+        max_total_positions: int = 10,
+        max_open_orders_per_symbol: int = 1,
+        max_gross_exposure: Optional[float] = None,
+        start_equity: Optional[float] = None,
+        clock: Optional[Callable[[], Any]] = trading_day
+    ) -> None:
+        self.daily_drawdown = daily_drawdown
+        self.max_total_positions = max_total_positions
+        self.max_open_orders_per_symbol = max_open_orders_per_symbol
+        self.max_gross_exposure = max_gross_exposure
+        # Starting equity of the current day; PnL is measured against it
+        self.start_equity = start_equity
+        self.clock = clock
+        self.day = clock() if clock else None
+        self.books: Dict[str, _SymbolBook] = {}
+        # Whether the account's open positions have been loaded (see load_positions)
+        self.synced = False
+        self.open_positions = 0
+        # Approved orders opening a flat symbol count towards max_total_positions until settled
+        self.opening = 0
+        self.commission = 0.0
+        # Running totals over all symbols, kept up to date as positions and marks change
+        self.pnl_total = 0.0  # sum of net * mark - entry_value
+        self.gross_exposure = 0.0  # sum of |net| * mark
+        self.reserved_exposure = 0.0
+        self.day_start_pnl = 0.0
+        self.approved = 0
+        self.rejected: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Any,
+        start_equity: Optional[float] = None,
+        clock: Optional[Callable[[], Any]] = trading_day
+    ) -> 'RiskEngine':
+        return cls(
+            daily_drawdown=config.daily_drawdown,
+            max_total_positions=config.max_total_positions,
+            max_open_orders_per_symbol=config.max_open_orders_per_symbol,
+            max_gross_exposure=config.max_gross_exposure,
+            start_equity=start_equity,
+            clock=clock
+        )
+
+    def _book(self, symbol: str) -> _SymbolBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = _SymbolBook()
+        return book
+
+    def _update(self, book: _SymbolBook, net: float, entry_value: float, mark: float) -> None:
+        """Replace one symbol's position and mark, adjusting the running totals."""
+        self.pnl_total = self.pnl_total - (book.net * book.mark - book.entry_value) + (net * mark - entry_value)
+        self.gross_exposure = self.gross_exposure - abs(book.net) * book.mark + abs(net) * mark
+        was_open, is_open = abs(book.net) > EPSILON, abs(net) > EPSILON
+        self.open_positions += is_open - was_open
+        book.net, book.entry_value, book.mark = net, entry_value, mark
+
+    def _roll_day(self) -> None:
+        if self.clock is None:
+            return
+        today = self.clock()
+        if today != self.day:
+            # The new day's drawdown is measured from the equity it starts with
+            self.day = today
+            if self.start_equity is not None:
+                self.start_equity += self.intraday_pnl()
+            self.day_start_pnl = self.pnl_total - self.commission
+
+    def intraday_pnl(self) -> float:
+        return self.pnl_total - self.commission - self.day_start_pnl
+
+    def approve(self, symbol: str, signed_size: float, price: float) -> float:
+        """Approve and reserve an order (BUY positive) or raise RiskRejected; returns the reserved exposure."""
+        with self._lock:
+            self._roll_day()
+            book = self._book(symbol)
+            self._update(book, book.net, book.entry_value, price)
+            after = abs(book.net + signed_size)
+            if after <= abs(book.net) + EPSILON:
+                # Reducing or closing a position is always allowed
+                reason, reserve = None, 0.0
+            else:
+                reserve = (after - abs(book.net)) * price
+                reason = self._entry_breach(book, reserve)
+            if reason is not None:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+                raise RiskRejected(f"{symbol} {signed_size:+g} @ {price}: {reason}")
+            if abs(book.net) <= EPSILON and reserve:
+                book.opening += 1
+                self.opening += 1
+            book.open_orders += 1
+            book.reserved += reserve
+            self.reserved_exposure += reserve
+            self.approved += 1
+            return reserve
+
+    def _entry_breach(self, book: _SymbolBook, reserve: float) -> Optional[str]:
+        start = self.start_equity
+        if start and -self.intraday_pnl() / start >= self.daily_drawdown:
+            return 'daily_drawdown'
+        if abs(book.net) <= EPSILON and not book.opening and self.open_positions + self.opening >= self.max_total_positions:
+            return 'max_total_positions'
+        if book.open_orders >= self.max_open_orders_per_symbol:
+            return 'max_open_orders_per_symbol'
+        if self.max_gross_exposure is not None and start:
+            if self.gross_exposure + self.reserved_exposure + reserve > self.max_gross_exposure * start:
+                return 'max_gross_exposure'
+        return None
+
+    def _settle(self, book: _SymbolBook, reserved: float) -> None:
+        book.open_orders = max(0, book.open_orders - 1)
+        book.reserved -= reserved
+        self.reserved_exposure -= reserved
+        if book.opening:
+            book.opening -= 1
+            self.opening -= 1
+
+    def release(self, symbol: str, reserved: float) -> None:
+        """Drop an approved order that was not filled (rejected by the broker, failed, cancelled)."""
+        with self._lock:
+            self._settle(self._book(symbol), reserved)
+
+    def on_fill(self, symbol: str, signed_size: float, price: float, commission: float = 0.0, reserved: float = 0.0) -> None:
+        """Apply a fill of an approved order and release its reservation."""
+        with self._lock:
+            book = self._book(symbol)
+            self._settle(book, reserved)
+            self._update(book, book.net + signed_size, book.entry_value + signed_size * price, price)
+            self.commission += commission
+
+    def load_positions(self, positions: Iterable[Tuple[str, float, float]]) -> None:
+        """Seed the books once with the account's open positions as (symbol, signed size, entry price).
+
+        Positions are marked at their average entry price, so they start with no intraday PnL; a
+        position held from before a restart is then reduced by its exit rather than added to.
+        """
+        with self._lock:
+            if self.synced:
+                return
+            self.synced = True
+            for symbol, signed_size, price in positions:
+                book = self._book(symbol)
+                net, entry_value = book.net + signed_size, book.entry_value + signed_size * price
+                self._update(book, net, entry_value, entry_value / net if abs(net) > EPSILON else price)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the counters for backtest checkpoints (limits, clock and lock excluded); see restore."""
+        with self._lock:
+            runtime = ('daily_drawdown', 'max_total_positions', 'max_open_orders_per_symbol', 'max_gross_exposure',
+                       'clock', '_lock')
+            return copy.deepcopy({k: v for k, v in self.__dict__.items() if k not in runtime})
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self.__dict__.update(copy.deepcopy(state))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'open_positions': self.open_positions,
+                'open_orders': sum(book.open_orders for book in self.books.values()),
+                'gross_exposure': self.gross_exposure,
+                'intraday_pnl': self.intraday_pnl(),
+                'start_equity': self.start_equity,
+                'approved': self.approved,
+                'rejected': dict(self.rejected),
+            }
@@ -0,0 +1,385 @@
+# Local Alpaca v2 market-data stream simulator for load-testing the live pipeline
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import msgpack
+import numpy as np
+import websockets
+
+from src.log import get_logger
+
+log = get_logger(__name__)
+
+# Default listen address; point ALPACA_WS_URL at ws://<host>:<port>/v2/iex to use it
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+def _rfc3339(ns: int) -> str:
+    """Format a unix timestamp in nanoseconds as an RFC3339 string like Alpaca sends."""
+    secs, frac = divmod(ns, 1_000_000_000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(secs)) + f'.{frac:09d}Z'
+
+
+def _parse_rfc3339_ns(value: str) -> int:
+    """Parse an RFC3339 timestamp (with up to nanosecond precision) into unix nanoseconds."""
+    from datetime import datetime, timezone
+    base, _, rest = value.partition('.')
+    digits = ''.join(ch for ch in rest if ch.isdigit())
+    secs = datetime.fromisoformat(base).replace(tzinfo=timezone.utc).timestamp()
+    return int(secs) * 1_000_000_000 + int((digits + '000000000')[:9])
+
+
+class SyntheticTicks:
+    """Random-walk trade/quote generator producing Alpaca-shaped event dicts ('t' is stamped at send time)."""
+
+    def __init__(self, start_price: float = 100.0, volatility: float = 0.0002, quote_ratio: float = 0.5, seed: Optional[int] = None):
+        self.start_price = start_price
+        self.volatility = volatility
+        self.quote_ratio = quote_ratio
+        self.rng = np.random.default_rng(seed)
+
+    def events(self, symbols: List[str], n: int) -> List[Dict[str, Any]]:
+        """Generate n events spread across symbols.
+
+        The second half of the walk mirrors the first so that cycling through the pool
+        never produces a price gap at the wrap-around point.
+        """
+        rng = self.rng
+        half = max(1, n // 2)
+        sym_idx = rng.integers(0, len(symbols), half)
+        is_quote = rng.random(half) < self.quote_ratio
+        sizes = rng.integers(1, 500, (half, 2))
+        walk = np.cumprod(1.0 + rng.standard_normal((len(symbols), half)) * self.volatility, axis=1)
+        prices = self.start_price * walk
+        out = []
+        for i in range(half):
+            s = sym_idx[i]
+            price = float(prices[s, i])
+            if is_quote[i]:
+                half_spread = round(max(price * 0.00005, 0.005), 2)
+                out.append({
+                    'T': 'q', 'S': symbols[s],
+                    'bx': 'V', 'bp': round(price - half_spread, 2), 'bs': int(sizes[i, 0]),
+                    'ax': 'V', 'ap': round(price + half_spread, 2), 'as': int(sizes[i, 1]),
+                    'c': ['R'], 'z': 'C',
+                })
+            else:
+                out.append({
+                    'T': 't', 'S': symbols[s], 'i': i + 1, 'x': 'V',
+                    'p': round(price, 2), 's': int(sizes[i, 0]),
+                    'c': ['@'], 'z': 'C',
+                })
+        return out + out[::-1]
+
+
+class RecordedTicks:
+    """Trade/quote events from a JSONL recording of raw Alpaca stream messages.
+
+    Each line holds either a single event object or an array of events (one stream frame).
+    """
+
+    def __init__(self, path: str):
+        self.events: List[Dict[str, Any]] = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                msg = json.loads(line)
+                for evt in (msg if isinstance(msg, list) else [msg]):
+                    if evt.get('T') in ('t', 'q'):
+                        self.events.append(evt)
+        if not self.events:
+            raise ValueError(f"No trade or quote events found in recording {path}")
+
+
+class EventPool:
+    """Events pre-encoded once per connection so that building a frame is a single join.
+
+    Every event is serialized with its 't' field last and left open; the send-time stamp
+    is spliced in per frame. With keep_timestamps each event keeps its recorded stamp instead.
+    """
+
+    def __init__(self, events: List[Dict[str, Any]], use_msgpack: bool, keep_timestamps: bool = False):
+        self.use_msgpack = use_msgpack
+        self.size = len(events)
+        self.pos = 0
+        self.packer = msgpack.Packer()
+        self.encoded = []
+        self.fixed = keep_timestamps
+        for evt in events:
+            body = {k: v for k, v in evt.items() if k != 't'}
+            stamp = evt.get('t') if keep_timestamps else None
+            if use_msgpack:
+                body['t'] = None
+                packed = msgpack.packb(body)[:-1]
+                if keep_timestamps and stamp is not None:
+                    packed += msgpack.packb(msgpack.Timestamp.from_unix_nano(_parse_rfc3339_ns(stamp)))
+                self.encoded.append(packed)
+            else:
+                text = json.dumps(body, separators=(',', ':'))[:-1] + ',"t":"'
+                if keep_timestamps and stamp is not None:
+                    text += stamp + '"}'
+                self.encoded.append(text)
+        if keep_timestamps and any('t' not in evt for evt in events):
+            raise ValueError("keep_timestamps requires every recorded event to carry a 't' field")
+
+    def take(self, n: int) -> List[Any]:
+        """Return the next n encoded events, cycling through the pool."""
+        out = self.encoded[self.pos:self.pos + n]
+        while len(out) < n:
+            out.extend(self.encoded[:n - len(out)])
+        self.pos = (self.pos + n) % self.size
+        return out
+
+    def frame(self, n: int, ns: int):
+        """Build one stream frame of n events stamped with unix time ns."""
+        chunk = self.take(n)
+        if self.use_msgpack:
+            header = self.packer.pack_array_header(len(chunk))
+            if self.fixed:
+                return header + b''.join(chunk)
+            stamp = msgpack.packb(msgpack.Timestamp.from_unix_nano(ns))
+            return header + stamp.join(chunk) + stamp
+        if self.fixed:
+            return '[' + ','.join(chunk) + ']'
+        tail = _rfc3339(ns) + '"}'
+        return '[' + (tail + ',').join(chunk) + tail + ']'
+
+
+class FeedStats:
+    """Counters shared across connections for throughput reporting."""
+
+    def __init__(self):
+        self.messages = 0
+        self.frames = 0
+        self.backlog = 0
+        self.connections = 0
+
+
+class AlpacaFeedSimulator:
+    """WebSocket server speaking the Alpaca v2 stream protocol (connect, auth, subscribe, t/q arrays).
+
+    Clients sending `Content-Type: application/msgpack` (alpaca-py) receive msgpack frames;
+    all others (e.g. the Rust bar_aggregator) receive JSON text frames.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1000.0,
+        batch_size: int = 100,
+        recording: Optional[str] = None,
+        keep_timestamps: bool = False,
+        duration: Optional[float] = None,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        seed: Optional[int] = None,
+        quote_ratio: float = 0.5,
+        pool_size: int = 100_000,
+    ):
+        self.rate = rate
+        self.batch_size = max(1, batch_size)
+        self.recording = RecordedTicks(recording) if recording else None
+        self.keep_timestamps = keep_timestamps
+        self.duration = duration
+        # Only enforce credentials when explicitly configured
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.seed = seed
+        self.quote_ratio = quote_ratio
+        # Number of distinct synthetic events generated per connection and cycled through
+        self.pool_size = pool_size
+        self.stats = FeedStats()
+
+    async def _handle(self, ws, *args) -> None:
+        # Resolve request headers across websockets' new and legacy server APIs
+        request = getattr(ws, 'request', None)
+        headers = request.headers if request is not None else getattr(ws, 'request_headers', {})
+        use_msgpack = 'msgpack' in (headers.get('Content-Type') or '')
+        pack = msgpack.packb if use_msgpack else (lambda m: json.dumps(m))
+        loads = msgpack.unpackb if use_msgpack else json.loads
+
+        await ws.send(pack([{'T': 'success', 'msg': 'connected'}]))
+        self.stats.connections += 1
+        subs = {'trades': [], 'quotes': [], 'bars': []}
+        authenticated = False
+        producer = None
+        try:
+            async for raw in ws:
+                try:
+                    msg = loads(raw)
+                except Exception:
+                    await ws.send(pack([{'T': 'error', 'code': 400, 'msg': 'invalid syntax'}]))
+                    continue
+                action = msg.get('action') if isinstance(msg, dict) else None
+                if action == 'auth':
+                    if self.api_key and (msg.get('key') != self.api_key or msg.get('secret') != self.api_secret):
+                        await ws.send(pack([{'T': 'error', 'code': 402, 'msg': 'auth failed'}]))
+                        continue
+                    authenticated = True
+                    await ws.send(pack([{'T': 'success', 'msg': 'authenticated'}]))
+                elif not authenticated:
+                    await ws.send(pack([{'T': 'error', 'code': 401, 'msg': 'not authenticated'}]))
+                elif action in ('subscribe', 'unsubscribe'):
+                    for key in subs:
+                        for sym in msg.get(key, []) or []:
+                            if action == 'subscribe' and sym not in subs[key]:
+                                subs[key].append(sym)
+                            elif action == 'unsubscribe' and sym in subs[key]:
+                                subs[key].remove(sym)
+                    await ws.send(pack([{'T': 'subscription', **subs}]))
+                    # (Re)start the producer so its event pool reflects the new subscription set
+                    if producer is not None:
+                        producer.cancel()
+                        producer = None
+                    if subs['trades'] or subs['quotes']:
+                        producer = asyncio.create_task(self._produce(ws, dict(subs), use_msgpack))
+                else:
+                    await ws.send(pack([{'T': 'error', 'code': 400, 'msg': 'invalid syntax'}]))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if producer is not None:
+                producer.cancel()
+            self.stats.connections -= 1
+
+    def _build_pool(self, subs: Dict[str, List[str]], use_msgpack: bool) -> EventPool:
+        """Select (recorded) or generate (synthetic) events for the client's subscriptions and pre-encode them."""
+        symbols = sorted(set(subs['trades']) | set(subs['quotes']))
+        if self.recording:
+            events = self.recording.events
+        else:
+            events = SyntheticTicks(seed=self.seed, quote_ratio=self.quote_ratio).events(symbols, self.pool_size)
+        # Only keep events for channels the client actually subscribed to
+        events = [e for e in events
+                  if (e['T'] == 't' and e['S'] in subs['trades']) or (e['T'] == 'q' and e['S'] in subs['quotes'])]
+        return EventPool(events, use_msgpack, self.keep_timestamps) if events else None
+
+    async def _produce(self, ws, subs: Dict[str, List[str]], use_msgpack: bool) -> None:
+        """Send event batches to one client, paced to the configured message rate."""
+        pool = self._build_pool(subs, use_msgpack)
+        if pool is None:
+            log.warning("no events available for subscription", subscription=subs)
+            return
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent = 0
+        try:
+            while True:
+                elapsed = loop.time() - start
+                if self.duration is not None and elapsed >= self.duration:
+                    break
+                if self.rate > 0:
+                    due = int(elapsed * self.rate) - sent
+                    if due < self.batch_size:
+                        # Sleep until the next full batch is due
+                        await asyncio.sleep(max(0.0, (sent + self.batch_size) / self.rate - elapsed))
+                        continue
+                    n = min(due, self.batch_size)
+                    self.stats.backlog = max(0, due - n)
+                else:
+                    n = self.batch_size
+                await ws.send(pool.frame(n, time.time_ns()))
+                sent += n
+                self.stats.messages += n
+                self.stats.frames += 1
+                if self.rate <= 0 or self.stats.backlog:
+                    # Yield so the reader task and other connections make progress
+                    await asyncio.sleep(0)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _report(self, interval: float) -> None:
+        last_msgs, last_frames = 0, 0
+        while True:
+            await asyncio.sleep(interval)
+            msgs, frames = self.stats.messages, self.stats.frames
+            log.info("throughput", msg_per_s=round((msgs - last_msgs) / interval), frames_per_s=round((frames - last_frames) / interval),
+                     backlog=self.stats.backlog, connections=self.stats.connections, total=msgs)
+            last_msgs, last_frames = msgs, frames
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, stats_interval: float = 1.0) -> None:
+        """Serve until cancelled."""
+        async with websockets.serve(self._handle, host, port, max_size=None, compression=None):
+            url = f"ws://{host}:{port}/v2/iex"
+            log.info("listening", url=url, rate=self.rate, batch=self.batch_size)
+            log.info("point clients at the simulator", ALPACA_WS_URL=url)
+            await self._report(stats_interval)
+
+
+async def probe_bars(symbol: str, duration: float, redis_url: Optional[str] = None) -> None:
+    """Subscribe to aggregated bars in Redis and report bar rate and delivery lag."""
+    import redis.asyncio as aioredis
+    client = aioredis.Redis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(f"bars:{symbol}")
+    lags = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        message = await pubsub.get_message(timeout=1.0)
+        if message and message['type'] == 'message':
+            data = json.loads(message['data'])
+            lags.append(time.time() - _parse_rfc3339_ns(data['timestamp']) / 1e9)
+    await pubsub.close()
+    await client.close()
+    if not lags:
+        log.warning("no bars received", channel=f"bars:{symbol}", seconds=duration)
+        return
+    arr = np.array(lags) * 1000.0
+    log.info("bar lag", bars=len(arr), lag_ms_p50=round(float(np.percentile(arr, 50)), 2),
+             lag_ms_p99=round(float(np.percentile(arr, 99)), 2), lag_ms_max=round(float(arr.max()), 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Alpaca-compatible market data feed simulator")
+    sub = parser.add_subparsers(dest='command')
+    serve = sub.add_parser('serve', help="Run the WebSocket feed simulator")
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--rate', type=float, default=1000.0, help="Messages per second per connection (0 = unthrottled)")
+    serve.add_argument('--batch-size', type=int, default=100, help="Events per WebSocket frame")
+    serve.add_argument('--recording', help="JSONL file of recorded Alpaca stream messages to replay")
+    serve.add_argument('--keep-timestamps', action='store_true', help="Keep recorded 't' values instead of restamping at send time")
+    serve.add_argument('--duration', type=float, help="Stop sending after this many seconds per connection")
+    serve.add_argument('--pool-size', type=int, default=100_000, help="Distinct synthetic events cycled per connection")
+    serve.add_argument('--quote-ratio', type=float, default=0.5, help="Fraction of synthetic events that are quotes")
+    serve.add_argument('--seed', type=int)
+    serve.add_argument('--require-auth', action='store_true', help="Check credentials against APCA_API_KEY_ID/APCA_API_SECRET_KEY")
+    serve.add_argument('--stats-interval', type=float, default=1.0)
+    probe = sub.add_parser('probe', help="Measure bar rate and lag on a Redis bars channel")
+    probe.add_argument('--symbol', required=True)
+    probe.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.command == 'probe':
+        asyncio.run(probe_bars(args.symbol, args.duration))
+        return
+    if args.command != 'serve':
+        parser.print_help()
+        return
+    sim = AlpacaFeedSimulator(
+        rate=args.rate,
+        batch_size=args.batch_size,
+        recording=args.recording,
+        keep_timestamps=args.keep_timestamps,
+        duration=args.duration,
+        api_key=os.getenv('APCA_API_KEY_ID') if args.require_auth else None,
+        api_secret=os.getenv('APCA_API_SECRET_KEY') if args.require_auth else None,
+        seed=args.seed if args.seed is not None else random.randrange(2**32),
+        quote_ratio=args.quote_ratio,
+        pool_size=args.pool_size,
+    )
+    try:
+        asyncio.run(sim.serve(args.host, args.port, args.stats_interval))
+    except KeyboardInterrupt:
+        log.info("stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,12 @@
+import copy
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+
+from src.brokers.warmup_broker import WarmupBroker
+from src.data_providers.bar import Bar
+from src.log import get_logger
+
+log = get_logger(__name__)
 
 class BaseStrategy(ABC):
     """Abstract base class defining the interface for all trading strategies."""
@@ -10,6 +17,21 @@ class BaseStrategy(ABC):
     # Data provider (e.g., AlpacaDataProvider, HistoricalFetcher)
     data_provider: Any = None
 
+    # Hot-standby state replication (src.failover.StateReplicator), set when running in a failover group
+    replicator: Any = None
+
+    # Shared batched model server (src.inference.InferenceServer), set by strategies that use a model live
+    inference: Any = None
+
+    # Order lifecycle manager (src.order_lifecycle.OrderLifecycleManager), set by strategies with resting orders
+    orders: Any = None
+
+    # Optional 'module:attr' of a kernel that replays many parameter sets at once (see BatchBacktester)
+    batch_kernel: Optional[str] = None
+
+    # Optional 'module:attr' of a class computing the strategy's model features over a whole DataFrame
+    feature_kernel: Optional[str] = None
+
     def __init__(self, params: Any, broker: Any = None, data_provider: Any = None) -> None:
         """Initialize the strategy with its parameter model and optional broker."""
         self.params = params
@@ -26,7 +48,7 @@ class BaseStrategy(ABC):
         """Perform any cleanup required after the strategy has stopped"""
         raise NotImplementedError
 
-    def on_new_data(self, data: Dict[str, Any]) -> None:
+    def on_new_data(self, data: Bar) -> None:
         """
         Handle incoming market data
         Implement the broker logic here to perform trading operations
@@ -38,3 +60,68 @@ class BaseStrategy(ABC):
         Orchestrate the data provider to feed data to the on_new_data method.
         """
         raise NotImplementedError
+
+    async def on_live_bar(self, bar: Bar) -> None:
+        """Entry point for streamed bars: on_new_data, or the replicator's leader/standby handling."""
+        if self.orders is not None:
+            # Timeouts and OCO exits act before the strategy sees the bar, as in backtests
+            await self.orders.on_bar(bar)
+        if self.replicator is not None:
+            await self.replicator.on_bar(self, bar)
+        else:
+            await self.on_new_data(bar)
+
+    @classmethod
+    def batch_compatible(cls, params: Any) -> bool:
+        """Whether the batch_kernel reproduces this strategy for the given params."""
+        return True
+
+    def lookback_bars(self) -> int:
+        """Number of most recent bars the strategy needs before it can trade (0 disables warm-up)."""
+        return 0
+
+    def reset_trading_state(self) -> None:
+        """Forget positions taken during warm-up; indicator state is kept."""
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy of the strategy's mutable state (indicator buffers, position, cooldowns) for checkpoints
+        and hot-standby replication. The default covers every instance attribute except params,
+        broker, data provider, replicator, inference server and order lifecycle manager; override
+        both snapshot and restore if some state cannot be pickled.
+        """
+        runtime = ('params', 'broker', 'data_provider', 'replicator', 'inference', 'orders')
+        return copy.deepcopy({k: v for k, v in self.__dict__.items() if k not in runtime})
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Reinstate state produced by snapshot(); used instead of on_start when resuming a backtest."""
+        self.__dict__.update(copy.deepcopy(state))
+
+    async def warm_up(self) -> int:
+        """
+        Replay the last lookback_bars() bars through on_new_data with order placement suppressed,
+        so the first live bar is tradable. Returns the number of bars replayed.
+        """
+        bars = self.lookback_bars()
+        if bars <= 0 or self.data_provider is None:
+            return 0
+        name = type(self).__name__
+        symbol = self.params.symbol
+        timeframe = self.params.timeframe
+        try:
+            df = self.data_provider.get_recent_bars(symbol, timeframe, bars)
+        except Exception as e:
+            log.warning("warm-up skipped, could not load history", strategy=name, error=str(e))
+            return 0
+        live_broker = self.broker
+        self.broker = WarmupBroker(live_broker)
+        try:
+            times = df.index.tz_localize('UTC').to_pydatetime()
+            for ts, o, h, l, c, v in zip(times, df['open'], df['high'], df['low'], df['close'], df['volume']):
+                await self.on_new_data(Bar(o, h, l, c, v, symbol, ts, timeframe))
+        finally:
+            self.broker = live_broker
+        self.reset_trading_state()
+        log.info("warmed up", strategy=name, bars=len(df), requested=bars, timeframe=timeframe)
+        return len(df)
@@ -1,14 +1,20 @@
 from collections import deque
-from typing import Any, Dict
+from typing import Any
 
-from src.backtester.backtester import Backtester
+from src.data_providers.bar import Bar
+from src.log import get_logger
+from src.risk import RiskRejected
 from src.strategies.base_strategy import BaseStrategy
 
+log = get_logger(__name__)
+
 class EMACrossoverStrategy(BaseStrategy):
     """
     EMA Crossover Strategy encapsulating both backtest and live execution logic.
     """
 
+    batch_kernel = "src.strategies.ema_crossover.vectorized:EMACrossoverKernel"
+
     def __init__(self, params, broker: Any = None, data_provider: Any = None) -> None:
         super().__init__(params, broker, data_provider)
         self.short_window = params.short_window
@@ -26,6 +32,13 @@ class EMACrossoverStrategy(BaseStrategy):
         self.long_ema = None
         self.position = 0
 
+    def lookback_bars(self) -> int:
+        """EMAs are seeded once the long window is full."""
+        return self.long_window
+
+    def reset_trading_state(self) -> None:
+        self.position = 0
+
     def _get_order_type(self, price: float) -> str:
         """
         Dynamically choose order type based on EMA spread.
@@ -40,10 +53,10 @@ class EMACrossoverStrategy(BaseStrategy):
             return "market"
         return "limit"
 
-    async def on_new_data(self, bar: Dict[str, Any]) -> None:
+    async def on_new_data(self, bar: Bar) -> None:
         """Handle incoming market data"""
-        print(f"[EMACrossoverStrategy] Processing bar: {bar}")
-        price = bar.get("close")
+        log.debug("bar", bar=bar)
+        price = bar.close
         if price is None:
             return
         self.prices.append(price)
@@ -70,13 +83,17 @@ class EMACrossoverStrategy(BaseStrategy):
             order_type = self._get_order_type(price)
             # Round price to penny for limit orders
             price_to_submit = round(price, 2) if order_type == "limit" else price
-            await self.broker.place_order(
-                side="BUY",
-                size=size,
-                price=price_to_submit,
-                symbol=self.params.symbol,
-                order_type=order_type
-            )
+            try:
+                await self.broker.place_order(
+                    side="BUY",
+                    size=size,
+                    price=price_to_submit,
+                    symbol=self.params.symbol,
+                    order_type=order_type
+                )
+            except RiskRejected:
+                # Keep the current position; the next bar retries while the crossover holds
+                return
             self.position = 1
 
         elif self.short_ema < self.long_ema and self.position >= 0:
@@ -85,13 +102,17 @@ class EMACrossoverStrategy(BaseStrategy):
             order_type = self._get_order_type(price)
             # Round price to penny for limit orders
             price_to_submit = round(price, 2) if order_type == "limit" else price
-            await self.broker.place_order(
-                side="SELL",
-                size=size,
-                price=price_to_submit,
-                symbol=self.params.symbol,
-                order_type=order_type
-            )
+            try:
+                await self.broker.place_order(
+                    side="SELL",
+                    size=size,
+                    price=price_to_submit,
+                    symbol=self.params.symbol,
+                    order_type=order_type
+                )
+            except RiskRejected:
+                # Keep the current position; the next bar retries while the crossover holds
+                return
             self.position = -1
 
     async def on_stop(self) -> None:
@@ -104,14 +125,15 @@ class EMACrossoverStrategy(BaseStrategy):
         Execute the strategy live using the pre-assigned broker and data provider.
         """
         import asyncio
-        print(f"[EMACrossoverStrategy] Starting EMA Crossover live run with params: {self.params}")
-        # initialize state
+        log.info("starting live run", params=self.params)
+        # initialize state, then prime indicators from recent history
         asyncio.run(self.on_start())
+        asyncio.run(self.warm_up())
 
         # handler to wrap incoming bars into on_new_data
         async def _handle_bar(bar):
-            # bar comes in as a dict from Redis provider
-            await self.on_new_data(bar)
+            # bar comes in as a Bar from the data provider
+            await self.on_live_bar(bar)
 
         # subscribe to real-time bar stream
         self.data_provider.subscribe_bars(_handle_bar, self.params.symbol, self.params.timeframe)
@@ -120,7 +142,7 @@ class EMACrossoverStrategy(BaseStrategy):
         try:
             self.data_provider.run()
         except KeyboardInterrupt:
-            print("[EMACrossoverStrategy] Stopping live data stream")
+            log.info("stopping live data stream")
         finally:
             # cleanup
             asyncio.run(self.on_stop())
@@ -134,11 +156,13 @@ class EMACrossoverStrategy(BaseStrategy):
         if not self.data_provider:
             raise ValueError("Data provider not set")
 
-        # Initialize and run backtester
+        # Initialize and run backtester (imported here so live runs never load it)
+        from src.backtester.backtester import Backtester
         bt = Backtester(
             self.__class__,
             self.params,
-            self.data_provider
+            self.data_provider,
+            checkpoints=True
         )
         return bt.run(
             self.params.symbol,
@@ -0,0 +1,47 @@
+# Batch kernel: EMACrossoverStrategy.on_new_data for many parameter sets at once
+from typing import Any, List
+
+import numpy as np
+
+from src.backtester.vectorized import VectorizedSimulatedBroker
+
+
+class EMACrossoverKernel:
+    """Advances every parameter set by one bar with the same arithmetic as EMACrossoverStrategy."""
+
+    def __init__(self, params_list: List[Any], broker: VectorizedSimulatedBroker) -> None:
+        self.broker = broker
+        short = np.array([p.short_window for p in params_list], dtype=np.float64)
+        self.long_window = np.array([p.long_window for p in params_list], dtype=np.int64)
+        self.size = np.array([p.size for p in params_list], dtype=np.float64)
+        self.alpha_s = 2 / (short + 1)
+        self.alpha_l = 2 / (self.long_window.astype(np.float64) + 1)
+        n = len(params_list)
+        self.short_ema = np.zeros(n)
+        self.long_ema = np.zeros(n)
+        self.position = np.zeros(n, dtype=np.int8)
+
+    def on_bar(self, i: int, open_: float, high: float, low: float, price: float, volume: float) -> None:
+        count = i + 1
+        # EMAs are seeded with the price on the bar that fills the long window
+        seed = self.long_window == count
+        self.short_ema[seed] = price
+        self.long_ema[seed] = price
+        update = self.long_window < count
+        if update.any():
+            self.short_ema[update] = self.alpha_s[update] * price + (1 - self.alpha_s[update]) * self.short_ema[update]
+            self.long_ema[update] = self.alpha_l[update] * price + (1 - self.alpha_l[update]) * self.long_ema[update]
+        ready = seed | update
+        if not ready.any():
+            return
+
+        # Limit orders (EMAs within 0.1% of price) are submitted at the penny-rounded price
+        limit = np.abs(self.short_ema - self.long_ema) <= 0.001 * price
+        submit = np.where(limit, round(price, 2), price)
+        buy = np.flatnonzero(ready & (self.short_ema > self.long_ema) & (self.position <= 0))
+        sell = np.flatnonzero(ready & (self.short_ema < self.long_ema) & (self.position >= 0))
+        # Orders the risk limits reject leave the position as it was, to be retried next bar
+        buy = self.broker.place_orders(buy, 'BUY', self.size[buy], submit[buy])
+        sell = self.broker.place_orders(sell, 'SELL', self.size[sell], submit[sell])
+        self.position[buy] = 1
+        self.position[sell] = -1
@@ -0,0 +1,113 @@
+# Feature kernel: HighEdgeStrategy's MODEL_FEATURES over a whole bar DataFrame at once
+import math
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.data_providers.bar import Bar
+from src.strategies.high_edge.strategy import MODEL_FEATURES, HighEdgeStrategy
+
+# Relative weight of the EMA seed below which a partition's EMAs match a replay from the first bar
+EMA_TOLERANCE = 1e-12
+
+
+def _rolling(values: np.ndarray, window: int) -> np.ndarray:
+    """(n - window + 1, window) view of every full window."""
+    return sliding_window_view(values, window)
+
+
+class HighEdgeFeatures:
+    """Computes the values HighEdgeStrategy passes to its model, for every bar of a DataFrame.
+
+    Matches the strategy's incremental computation on every bar, in or out of a position, since
+    the strategy's windows and EMAs take in every bar. Rows before `first_row` are NaN. The EMAs
+    are seeded at the first eligible bar, so a slice that starts mid-history needs `overlap` bars
+    before its first wanted row to agree with a replay from the beginning.
+    """
+
+    columns = MODEL_FEATURES
+
+    def __init__(self, params: Any) -> None:
+        self.params = params
+        self.alpha_s = 2 / (params.short_window + 1)
+        self.alpha_l = 2 / (params.long_window + 1)
+        # The strategy needs full EMA and z-score windows before it computes anything
+        self.first_row = max(params.long_window, params.zscore_window) - 1
+        slowest = 1 - min(self.alpha_s, self.alpha_l)
+        self.overlap = self.first_row + params.atr_window + math.ceil(math.log(EMA_TOLERANCE) / math.log(slowest))
+
+    def compute(self, df: pd.DataFrame) -> np.ndarray:
+        n = len(df)
+        out = np.full((n, len(self.columns)), np.nan)
+        start = self.first_row
+        if n <= start:
+            return out
+        close = df['close'].to_numpy(dtype=np.float64)
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        w = self.params.zscore_window
+        price = close[start:]
+
+        # EMAs seeded with the first eligible close
+        seed = pd.Series(price)
+        short_ema = seed.ewm(alpha=self.alpha_s, adjust=False).mean().to_numpy()
+        long_ema = seed.ewm(alpha=self.alpha_l, adjust=False).mean().to_numpy()
+
+        # VWAP and population standard deviation over the last zscore_window bars
+        total_vol = _rolling(volume, w).sum(axis=1)[start - w + 1:]
+        pv = _rolling(close * volume, w).sum(axis=1)[start - w + 1:]
+        windows = _rolling(close, w)[start - w + 1:]
+        vwap = np.where(total_vol != 0, pv / np.where(total_vol != 0, total_vol, 1.0), price)
+        stdev = windows.std(axis=1)
+        # A constant window has exactly zero deviation in the strategy
+        stdev[windows.max(axis=1) == windows.min(axis=1)] = 0.0
+        zscore = np.zeros_like(price)
+        moving = stdev > 0
+        zscore[moving] = (price[moving] - vwap[moving]) / stdev[moving]
+
+        # ATR over up to atr_window high-low ranges
+        atr = pd.Series(high - low).rolling(self.params.atr_window, min_periods=1).mean().to_numpy()[start:]
+
+        mean_volume = total_vol / w
+        ratio = np.zeros_like(price)
+        active = mean_volume != 0
+        ratio[active] = volume[start:][active] / mean_volume[active]
+
+        out[start:, 0] = (short_ema - long_ema) / price
+        out[start:, 1] = zscore
+        out[start:, 2] = atr / price
+        out[start:, 3] = ratio
+        return out
+
+    def live(self, df: pd.DataFrame) -> np.ndarray:
+        """Reference values from HighEdgeStrategy.on_new_data, one bar at a time, trading on its rules."""
+        import asyncio
+        from src.brokers.simulated_broker import SimulatedBroker
+        out = np.full((len(df), len(self.columns)), np.nan)
+        params = self.params.model_copy(update={'model_path': 'parity', 'managed_orders': False})
+        strategy = _RecordingStrategy(params, SimulatedBroker())
+
+        async def replay():
+            for i, (o, h, l, c, v) in enumerate(zip(df['open'], df['high'], df['low'], df['close'], df['volume'])):
+                strategy.row = out[i]
+                await strategy.on_new_data(Bar(o, h, l, c, v))
+
+        asyncio.run(replay())
+        return out
+
+
+class _RecordingStrategy(HighEdgeStrategy):
+    """Records the model features of every bar and trades on the rule signal, exits included."""
+
+    row: np.ndarray
+
+    def _model_features(self, *args):
+        features = super()._model_features(*args)
+        self.row[:] = features
+        return features
+
+    async def _predict(self, features) -> None:
+        return None
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 from src.config.config import Period
 
@@ -20,7 +22,14 @@ class HighEdgeParams(BaseModel):
     # Position size and entry cooldown (number of bars)
     size: float = Field(1.0, gt=0)
     cooldown: int = Field(5, ge=0)
-    # Risk controls: daily drawdown cap and concurrent position limits
-    daily_drawdown: float = Field(0.03, ge=0)  # max fraction drawdown from start equity
-    max_total_positions: int = Field(10, ge=1)  # max open positions total
-    max_positions_per_symbol: int = Field(3, ge=1)  # max open positions per symbol 
\ No newline at end of file
+    # Optional joblib classifier over MODEL_FEATURES; its P_up/P_down replace the rule signal
+    model_path: Optional[str] = Field(None)
+    probability_threshold: float = Field(0.6, gt=0, le=1)
+    # Live bars wait at most this long for the batched prediction before falling back to the rules
+    inference_deadline_ms: float = Field(20.0, gt=0)
+    # Enter with limit orders through the order lifecycle manager (repriced to market after
+    # reprice_after seconds, killed after order_ttl) and exit with an OCO stop/target pair checked
+    # against every bar's range instead of the close; replays individually (no batch kernel)
+    managed_orders: bool = Field(False)
+    reprice_after: float = Field(2.0, gt=0)
+    order_ttl: float = Field(60.0, gt=0)
@@ -2,12 +2,24 @@ from collections import deque
 from typing import Any, Dict
 import statistics
 
+import numpy as np
+
+from src.data_providers.bar import Bar
+from src.log import get_logger
+from src.risk import RiskRejected
 from src.strategies.high_edge.params import HighEdgeParams
 from src.strategies.base_strategy import BaseStrategy
-from src.backtester.backtester import Backtester
+
+log = get_logger(__name__)
+
+# Feature vector passed to the optional model, in column order
+MODEL_FEATURES = ('ema_spread', 'vwap_zscore', 'atr_pct', 'volume_ratio')
 
 class HighEdgeStrategy(BaseStrategy):
     """High Edge Strategy Phase 1 with momentum deadband, z-score reversal, ATR stops, and cooldown."""
+    batch_kernel = "src.strategies.high_edge.vectorized:HighEdgeKernel"
+    feature_kernel = "src.strategies.high_edge.features:HighEdgeFeatures"
+
     def __init__(self, params: HighEdgeParams, broker: Any = None, data_provider: Any = None) -> None:
         super().__init__(params, broker, data_provider)
         # Parameters
@@ -31,12 +43,15 @@ class HighEdgeStrategy(BaseStrategy):
         self.long_ema = None
         self.position = 0
         self.entry_price = None
+        self.entry_size = None  # shares bought/sold on entry; the exit closes exactly these
         self.stop_price = None
         self.target_price = None
         self.bars_since_last = self.cooldown
         self.prev_signal = 0
-        # Starting equity for drawdown control
-        self.start_equity = None
+        if params.managed_orders:
+            # Limit entries with reprice/kill timeouts and OCO exits, on the broker's clock (live or simulated)
+            from src.order_lifecycle import OrderLifecycleManager
+            self.orders = OrderLifecycleManager(self)
 
     async def on_start(self) -> None:
         # Reset all buffers and state
@@ -48,19 +63,32 @@ class HighEdgeStrategy(BaseStrategy):
         self.long_ema = None
         self.position = 0
         self.entry_price = None
+        self.entry_size = None
+        self.stop_price = None
+        self.target_price = None
+        self.bars_since_last = self.cooldown
+        self.prev_signal = 0
+
+    def lookback_bars(self) -> int:
+        # Signals need full EMA, z-score and ATR windows
+        return max(self.long_window, self.zscore_window, self.atr_window)
+
+    def reset_trading_state(self) -> None:
+        self.position = 0
+        self.entry_price = None
+        self.entry_size = None
         self.stop_price = None
         self.target_price = None
         self.bars_since_last = self.cooldown
         self.prev_signal = 0
-        # Record starting equity
-        acct = await self.broker.get_account()
-        self.start_equity = float(getattr(acct, 'equity', acct.cash))
-
-    async def on_new_data(self, bar: Dict[str, Any]) -> None:
-        price = bar.get("close")
-        high = bar.get("high")
-        low = bar.get("low")
-        volume = bar.get("volume", 0)
+        if self.orders is not None:
+            self.orders.reset()
+
+    async def on_new_data(self, bar: Bar) -> None:
+        price = bar.close
+        high = bar.high
+        low = bar.low
+        volume = bar.volume
         if price is None or high is None or low is None:
             return
 
@@ -68,30 +96,9 @@ class HighEdgeStrategy(BaseStrategy):
         self.bars_since_last += 1
         self.trs.append(high - low)
 
-        # Exit logic: stop-loss or take-profit
-        if self.position != 0:
-            if self.position == 1:
-                if low <= self.stop_price or high >= self.target_price:
-                    await self.broker.place_order(
-                        side="SELL", size=self.size,
-                        price=price, symbol=self.params.symbol,
-                        order_type="market"
-                    )
-                    self.position = 0
-                    self.prev_signal = 0
-                    self.bars_since_last = 0
-                    return
-            else:
-                if high >= self.stop_price or low <= self.target_price:
-                    await self.broker.place_order(
-                        side="BUY", size=self.size,
-                        price=price, symbol=self.params.symbol,
-                        order_type="market"
-                    )
-                    self.position = 0
-                    self.prev_signal = 0
-                    self.bars_since_last = 0
-                    return
+        # Exit logic: stop-loss or take-profit (managed orders exit through their OCO pair instead).
+        # The exit bar still goes into the indicators below; it just cannot enter again
+        exited = self.position != 0 and not self._exit_managed() and await self._stop_or_target(price, high, low)
 
         # Rolling data updates
         self.prices.append(price)
@@ -137,34 +144,22 @@ class HighEdgeStrategy(BaseStrategy):
         # Final signal: prefer reversion over momentum
         signal = reversion if reversion != 0 else momentum
 
-        # Entry logic: only on crossing, cooldown, flat, and risk checks
+        features = self._model_features(diff, zscore, price, volume, total_vol) if self.params.model_path else None
+        if exited:
+            return
+
+        # Model signal when configured; the rules above remain the fallback
+        if features is not None:
+            probs = await self._predict(features)
+            if probs is not None:
+                # First class is down, last is up (binary or down/flat/up classifiers)
+                p_down, p_up = probs[0], probs[-1]
+                threshold = self.params.probability_threshold
+                signal = 1 if p_up >= threshold and p_up > p_down else -1 if p_down >= threshold else 0
+
+        # Entry logic: only on crossing, cooldown and flat; drawdown and position limits are
+        # enforced for every strategy at once by the account's RiskEngine (src/risk.py)
         if signal != 0 and signal != self.prev_signal and self.bars_since_last >= self.cooldown and self.position == 0:
-            # Risk control: daily drawdown cap
-            acct_cur = await self.broker.get_account()
-            equity_cur = float(getattr(acct_cur, 'equity', acct_cur.cash))
-            drawdown = (self.start_equity - equity_cur) / self.start_equity
-            if drawdown >= self.params.daily_drawdown:
-                return
-            # Risk control: concurrent position limits
-            pos_list = await self.broker.get_all_positions()
-            # total open positions
-            if len(pos_list) >= self.params.max_total_positions:
-                return
-            # per-symbol open positions
-            same_sym = sum(1 for p in pos_list if p.get('symbol') == self.params.symbol)
-            if same_sym >= self.params.max_positions_per_symbol:
-                return
-            # Risk control: no duplicate open orders for this symbol
-            open_orders = []
-            for side_check in ("buy", "sell"):
-                try:
-                    open_orders.extend(await self.broker.get_orders(status="open", side=side_check))
-                except Exception:
-                    pass
-            for o in open_orders:
-                # Alpaca orders and simulated orders may differ in attribute names
-                if getattr(o, 'symbol', getattr(o, 'symbol', None)) == self.params.symbol:
-                    return
             # Compute ATR-based stop and target
             atr = sum(self.trs) / len(self.trs) if self.trs else 0.0
             stop_dist = self.stop_atr_mult * atr
@@ -183,27 +178,105 @@ class HighEdgeStrategy(BaseStrategy):
             acct = await self.broker.get_account()
             equity = float(getattr(acct, 'equity', acct.cash))
             order_size = (equity * self.size) / price
-            await self.broker.place_order(
-                side=side,
-                size=order_size,
-                price=price,
-                symbol=self.params.symbol,
-                order_type="market"
-            )
+            try:
+                if self.orders is not None:
+                    await self.orders.submit(
+                        side, order_size, round(price, 2), self.params.symbol, 'limit',
+                        reprice_after=self.params.reprice_after,
+                        expire_after=self.params.order_ttl,
+                        on_fill=self._entry_filled,
+                        on_close=self._entry_closed
+                    )
+                else:
+                    await self.broker.place_order(
+                        side=side,
+                        size=order_size,
+                        price=price,
+                        symbol=self.params.symbol,
+                        order_type="market"
+                    )
+                    self.entry_size = order_size
+            except RiskRejected:
+                return
             self.position = signal
             self.prev_signal = signal
             self.bars_since_last = 0
 
+    async def _stop_or_target(self, price: float, high: float, low: float) -> bool:
+        """Exit at market if the bar reached the position's stop or target; True if it did."""
+        if self.position == 1:
+            hit, side = low <= self.stop_price or high >= self.target_price, "SELL"
+        else:
+            hit, side = high >= self.stop_price or low <= self.target_price, "BUY"
+        if not hit:
+            return False
+        await self.broker.place_order(
+            side=side, size=self.entry_size,
+            price=price, symbol=self.params.symbol,
+            order_type="market"
+        )
+        self.position = 0
+        self.prev_signal = 0
+        self.bars_since_last = 0
+        return True
+
+    def _model_features(self, diff: float, zscore: float, price: float, volume: float, total_vol: float):
+        """MODEL_FEATURES for the current bar, from the indicators it has just updated."""
+        atr = sum(self.trs) / len(self.trs) if self.trs else 0.0
+        mean_volume = total_vol / len(self.volumes)
+        return [diff / price, zscore, atr / price, volume / mean_volume if mean_volume else 0.0]
+
+    def _exit_managed(self) -> bool:
+        """Whether the lifecycle manager holds this position's exit, or the entry it will arm one for.
+
+        A position restored from a snapshot (a standby taking over) has neither, since pending orders
+        and exits are not replicated, so it is exited on the bar's stop and target like unmanaged ones.
+        """
+        return self.orders is not None and bool(self.orders.exits or self.orders.orders)
+
+    def _entry_filled(self, order, price: float) -> None:
+        """Managed entry filled: protect it with the stop and target as one OCO pair."""
+        self.entry_size = order.size
+        self.orders.arm_oco('SELL' if order.side == 'BUY' else 'BUY', order.size, order.symbol,
+                            self.stop_price, self.target_price, on_fill=self._exit_filled)
+
+    def _entry_closed(self, order) -> None:
+        """Managed entry killed unfilled: flat again."""
+        self.position = 0
+
+    def _exit_filled(self, exit, leg: str, price: float) -> None:
+        self.position = 0
+        self.prev_signal = 0
+        self.bars_since_last = 0
+
+    async def _predict(self, features):
+        """Class probabilities from the shared inference server live, or the model directly in backtests."""
+        if self.inference is not None:
+            return await self.inference.predict(features, self.params.inference_deadline_ms / 1000)
+        from src.inference import predict_proba
+        return predict_proba(self.params.model_path, np.asarray([features], dtype=np.float64))[0]
+
+    @classmethod
+    def batch_compatible(cls, params: HighEdgeParams) -> bool:
+        # The batch kernel implements the rule signal and close-based exits only
+        return not params.model_path and not params.managed_orders
+
     async def on_stop(self) -> None:
         # No special cleanup
         pass
 
     def run(self) -> None:
         import asyncio
+        if self.params.model_path:
+            # Every HighEdge instance on this model shares one batched prediction per bar
+            from src.inference import shared_server
+            self.inference = shared_server(self.params.model_path)
+            self.inference.register()
         asyncio.run(self.on_start())
+        asyncio.run(self.warm_up())
 
         async def handler(bar):
-            await self.on_new_data(bar)
+            await self.on_live_bar(bar)
 
         self.data_provider.subscribe_bars(handler, self.params.symbol, self.params.timeframe)
         try:
@@ -212,11 +285,15 @@ class HighEdgeStrategy(BaseStrategy):
             pass
         finally:
             asyncio.run(self.on_stop())
+            if self.inference is not None:
+                self.inference.unregister()
+                log.info("inference stats", **self.inference.stats())
 
     def backtest(self) -> Dict[str, Any]:
         if not self.data_provider:
             raise ValueError("Data provider not set")
-        bt = Backtester(self.__class__, self.params, self.data_provider)
+        from src.backtester.backtester import Backtester
+        bt = Backtester(self.__class__, self.params, self.data_provider, checkpoints=True)
         return bt.run(
             self.params.symbol,
             self.params.period.start,
@@ -0,0 +1,216 @@
+# Batch kernel: HighEdgeStrategy.on_new_data for many parameter sets at once
+import statistics
+from typing import Any, List
+
+import numpy as np
+
+from src.backtester.vectorized import VectorizedSimulatedBroker
+
+# Bars between exact recomputations of the rolling window sums (bounds floating point drift)
+REFRESH_BARS = 1024
+# Relative margin around the z-score threshold inside which the z-score is recomputed exactly
+Z_MARGIN = 1e-6
+
+
+class HighEdgeKernel:
+    """Advances every parameter set by one bar with the same decisions as HighEdgeStrategy.
+
+    Rolling VWAP and variance come from running window sums; whenever a z-score lands within
+    Z_MARGIN of its threshold (or the variance is too small to trust) it is recomputed from the
+    window contents exactly as the strategy does, so every entry and exit matches an individual
+    replay. Each parameter set keeps its own windows, as zscore_window differs between sets.
+    """
+
+    def __init__(self, params_list: List[Any], broker: VectorizedSimulatedBroker) -> None:
+        self.broker = broker
+        n = len(params_list)
+
+        def col(name, dtype=np.float64):
+            return np.array([getattr(p, name) for p in params_list], dtype=dtype)
+
+        short = col('short_window')
+        long = col('long_window', np.int64)
+        self.alpha_s = 2 / (short + 1)
+        self.alpha_l = 2 / (long.astype(np.float64) + 1)
+        self.ema_threshold = col('ema_threshold')
+        self.zwin = col('zscore_window', np.int64)
+        self.zscore_threshold = col('zscore_threshold')
+        self.atr_window = col('atr_window', np.int64)
+        self.stop_atr_mult = col('stop_atr_mult')
+        self.target_mult = col('target_mult')
+        self.size = col('size')
+        self.cooldown = col('cooldown', np.int64)
+        self.need = np.maximum(long, self.zwin)
+
+        self.short_ema = np.zeros(n)
+        self.long_ema = np.zeros(n)
+        self.position = np.zeros(n, dtype=np.int8)
+        self.prev_signal = np.zeros(n, dtype=np.int8)
+        self.bars_since_last = self.cooldown.copy()
+        self.stop_price = np.zeros(n)
+        self.entry_size = np.zeros(n)
+        self.target_price = np.zeros(n)
+        self.trs: List[float] = []
+
+        # Per-set ring buffers over the last zscore_window appended bars
+        self.width = int(self.zwin.max())
+        self.rows = np.arange(n)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.ring_price = np.zeros((n, self.width))
+        self.ring_volume = np.zeros((n, self.width))
+        self.ring_pv = np.zeros((n, self.width))
+        self.ref = None  # prices are centred on the first close to keep the variance well conditioned
+        self.sum_x = np.zeros(n)
+        self.sum_xx = np.zeros(n)
+        self.sum_v = np.zeros(n)
+        self.sum_pv = np.zeros(n)
+        self.nonzero_volume = np.zeros(n, dtype=np.int64)
+        self.equal_run = np.zeros(n, dtype=np.int64)  # trailing appended prices equal to the last one
+        self.last_price = np.full(n, np.nan)
+
+    def on_bar(self, i: int, open_: float, high: float, low: float, price: float, volume: float) -> None:
+        if self.ref is None:
+            self.ref = price
+        self.bars_since_last += 1
+        self.trs.append(high - low)
+
+        # Exits: stop-loss or take-profit, closing the size entered at the close
+        exited = np.zeros(len(self.rows), dtype=bool)
+        long_exit = np.flatnonzero((self.position == 1) & ((low <= self.stop_price) | (high >= self.target_price)))
+        short_exit = np.flatnonzero((self.position == -1) & ((high >= self.stop_price) | (low <= self.target_price)))
+        self.broker.place_orders(long_exit, 'SELL', self.entry_size[long_exit], price)
+        self.broker.place_orders(short_exit, 'BUY', self.entry_size[short_exit], price)
+        for idx in (long_exit, short_exit):
+            exited[idx] = True
+            self.position[idx] = 0
+            self.prev_signal[idx] = 0
+            self.bars_since_last[idx] = 0
+
+        # Rolling window and EMA updates take in every bar, exit bars included
+        rows = self.rows
+        self._append(rows, price, volume)
+        if i % REFRESH_BARS == REFRESH_BARS - 1:
+            self._refresh()
+
+        ready = rows[self.count[rows] >= self.need[rows]]
+        if ready.size == 0:
+            return
+        seed = ready[self.count[ready] == self.need[ready]]
+        self.short_ema[seed] = price
+        self.long_ema[seed] = price
+        update = ready[self.count[ready] > self.need[ready]]
+        self.short_ema[update] = self.alpha_s[update] * price + (1 - self.alpha_s[update]) * self.short_ema[update]
+        self.long_ema[update] = self.alpha_l[update] * price + (1 - self.alpha_l[update]) * self.long_ema[update]
+
+        # Signals only matter where an entry is possible: flat, out of cooldown and not just exited
+        gate = ready[(self.position[ready] == 0) & (self.bars_since_last[ready] >= self.cooldown[ready]) & ~exited[ready]]
+        if gate.size == 0:
+            return
+        diff = self.short_ema[gate] - self.long_ema[gate]
+        thr = self.ema_threshold[gate]
+        momentum = np.where(diff > thr * price, 1, np.where(diff < -thr * price, -1, 0))
+        zscore = self._zscores(gate, price)
+        zthr = self.zscore_threshold[gate]
+        reversion = np.where(zscore < -zthr, 1, np.where(zscore > zthr, -1, 0))
+        signal = np.where(reversion != 0, reversion, momentum)
+
+        enter = (signal != 0) & (signal != self.prev_signal[gate])
+        gate, signal = gate[enter], signal[enter]
+        if gate.size == 0:
+            return
+        broker = self.broker
+
+        # ATR over the last atr_window bar ranges, summed in the same order as the strategy
+        atr = np.empty(gate.size)
+        for w in np.unique(self.atr_window[gate]):
+            window = self.trs[-int(w):]
+            atr[self.atr_window[gate] == w] = sum(window) / len(window)
+        stop_dist = self.stop_atr_mult[gate] * atr
+        target_dist = self.target_mult[gate] * stop_dist
+        long_entry = signal == 1
+        self.stop_price[gate] = np.where(long_entry, price - stop_dist, price + stop_dist)
+        self.target_price[gate] = np.where(long_entry, price + target_dist, price - target_dist)
+        order_size = (broker.cash[gate] * self.size[gate]) / price
+        filled = np.concatenate((broker.place_orders(gate[long_entry], 'BUY', order_size[long_entry], price),
+                                 broker.place_orders(gate[~long_entry], 'SELL', order_size[~long_entry], price)))
+        if filled.size < gate.size:
+            # Entries the risk limits rejected stay flat, as the strategy does on RiskRejected
+            keep = np.isin(gate, filled)
+            gate, signal, order_size = gate[keep], signal[keep], order_size[keep]
+        self.entry_size[gate] = order_size
+        self.position[gate] = signal
+        self.prev_signal[gate] = signal
+        self.bars_since_last[gate] = 0
+
+    def _append(self, rows: np.ndarray, price: float, volume: float) -> None:
+        count = self.count[rows]
+        zwin = self.zwin[rows]
+        evict = count >= zwin
+        if evict.any():
+            er = rows[evict]
+            slots = (count[evict] - zwin[evict]) % self.width
+            old_p = self.ring_price[er, slots]
+            old_v = self.ring_volume[er, slots]
+            x = old_p - self.ref
+            self.sum_x[er] -= x
+            self.sum_xx[er] -= x * x
+            self.sum_v[er] -= old_v
+            self.sum_pv[er] -= self.ring_pv[er, slots]
+            self.nonzero_volume[er] -= old_v != 0
+        slots = count % self.width
+        pv = price * volume
+        self.ring_price[rows, slots] = price
+        self.ring_volume[rows, slots] = volume
+        self.ring_pv[rows, slots] = pv
+        x = price - self.ref
+        self.sum_x[rows] += x
+        self.sum_xx[rows] += x * x
+        self.sum_v[rows] += volume
+        self.sum_pv[rows] += pv
+        self.nonzero_volume[rows] += volume != 0
+        same = self.last_price[rows] == price
+        self.equal_run[rows] = np.where(same, self.equal_run[rows] + 1, 1)
+        self.last_price[rows] = price
+        self.count[rows] = count + 1
+
+    def _window_mask(self) -> np.ndarray:
+        age = (self.count[:, None] - 1 - np.arange(self.width)[None, :]) % self.width
+        return age < np.minimum(self.zwin, self.count)[:, None]
+
+    def _refresh(self) -> None:
+        """Recompute the running sums from the ring buffers."""
+        mask = self._window_mask()
+        x = np.where(mask, self.ring_price - self.ref, 0.0)
+        self.sum_x = x.sum(axis=1)
+        self.sum_xx = (x * x).sum(axis=1)
+        self.sum_v = np.where(mask, self.ring_volume, 0.0).sum(axis=1)
+        self.sum_pv = np.where(mask, self.ring_pv, 0.0).sum(axis=1)
+
+    def _zscores(self, rows: np.ndarray, price: float) -> np.ndarray:
+        n = self.zwin[rows].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = np.where(self.nonzero_volume[rows] > 0, self.sum_pv[rows] / self.sum_v[rows], price)
+            mean = self.sum_x[rows] / n
+            second = self.sum_xx[rows] / n
+            var = second - mean * mean
+            stdev = np.sqrt(np.maximum(var, 0.0))
+            zscore = (price - vwap) / stdev
+            # Error grows with cancellation in the variance and with the size of the price relative to stdev
+            tol = Z_MARGIN * (1 + np.abs(zscore)) * (1 + second / var) + 1e-9 * abs(price) / stdev
+            near = ~(np.abs(np.abs(zscore) - self.zscore_threshold[rows]) > tol) | ~(var > 0)
+        # A window of identical prices (or a single price) has zero deviation and a zero z-score
+        flat = self.equal_run[rows] >= self.zwin[rows]
+        zscore = np.where(flat, 0.0, zscore)
+        for j in np.flatnonzero(near & ~flat):
+            zscore[j] = self._exact_zscore(int(rows[j]), price)
+        return zscore
+
+    def _exact_zscore(self, r: int, price: float) -> float:
+        """The strategy's own computation over this set's window contents."""
+        w = int(self.zwin[r])
+        slots = np.arange(int(self.count[r]) - w, int(self.count[r])) % self.width
+        prices = self.ring_price[r, slots].tolist()
+        total_vol = sum(self.ring_volume[r, slots].tolist())
+        vwap = sum(self.ring_pv[r, slots].tolist()) / total_vol if total_vol else price
+        stdev = statistics.pstdev(prices) if len(prices) > 1 else 0.0
+        return (price - vwap) / stdev if stdev > 0 else 0.0
@@ -0,0 +1,99 @@
+# Hashed timer wheel: O(1) schedule and cancel for large numbers of pending timeouts
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Timer:
+    """Handle for one scheduled callback; cancel() before it fires to drop it."""
+
+    __slots__ = ('deadline', 'tick', 'seq', 'callback', 'args', 'wheel')
+
+    def __init__(self, deadline: float, tick: int, seq: int, callback: Callable[..., Any], args: tuple, wheel: 'TimerWheel') -> None:
+        self.deadline = deadline
+        self.tick = tick
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.wheel: Optional[TimerWheel] = wheel
+
+    @property
+    def active(self) -> bool:
+        return self.wheel is not None
+
+    def cancel(self) -> bool:
+        """Remove the timer; returns False if it already fired or was cancelled."""
+        if self.wheel is None:
+            return False
+        self.wheel._remove(self)
+        return True
+
+
+class TimerWheel:
+    """Timers hashed into `slots` buckets of `tick` seconds each, driven by an external clock.
+
+    Scheduling and cancelling touch one bucket. advance(now) visits only the buckets of the ticks
+    that elapsed (each bucket once if more than a full revolution passed), firing every timer due
+    by `now` in deadline order. Timers further out than one revolution stay in their bucket until
+    their tick comes round. Time is whatever the caller passes: event loop time live, bar
+    timestamps in a simulation.
+    """
+
+    def __init__(self, tick: float = 0.01, slots: int = 4096, now: float = 0.0) -> None:
+        if tick <= 0 or slots < 1:
+            raise ValueError('TimerWheel needs a positive tick and at least one slot')
+        self.tick = tick
+        self.slots = slots
+        self.origin = now
+        self.current = 0  # last tick processed
+        self._buckets: List[Dict[Timer, None]] = [{} for _ in range(slots)]
+        self._seq = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _tick_of(self, when: float) -> int:
+        return math.ceil((when - self.origin) / self.tick - 1e-9)
+
+    def schedule_at(self, deadline: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """Run callback(*args) from the first advance() at or after `deadline`."""
+        # Never into the tick already processed, so a timer due now fires on the next advance
+        tick = max(self._tick_of(deadline), self.current + 1)
+        self._seq += 1
+        timer = Timer(deadline, tick, self._seq, callback, args, self)
+        self._buckets[tick % self.slots][timer] = None
+        self._count += 1
+        return timer
+
+    def schedule(self, now: float, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        return self.schedule_at(now + delay, callback, *args)
+
+    def _remove(self, timer: Timer) -> None:
+        del self._buckets[timer.tick % self.slots][timer]
+        timer.wheel = None
+        self._count -= 1
+
+    def advance(self, now: float) -> int:
+        """Fire every timer due by `now`; returns the number fired."""
+        target = math.floor((now - self.origin) / self.tick + 1e-9)
+        if target <= self.current or not self._count:
+            self.current = max(self.current, target)
+            return 0
+        due: List[Timer] = []
+        first = self.current + 1
+        # A gap of a revolution or more visits every bucket once
+        for tick in range(first, min(target, self.current + self.slots) + 1):
+            bucket = self._buckets[tick % self.slots]
+            if bucket:
+                due.extend(t for t in bucket if t.tick <= target)
+        self.current = target
+        due.sort(key=lambda t: (t.deadline, t.seq))
+        fired = 0
+        for timer in due:
+            # An earlier callback may have cancelled it
+            if timer.wheel is None:
+                continue
+            self._remove(timer)
+            timer.callback(*timer.args)
+            fired += 1
+        return fired
@@ -0,0 +1,67 @@
+# Offline feature kernels must reproduce the values a strategy computes live, bar for bar
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.backtester.backtester import Backtester
+from src.backtester.features import check_parity
+from src.backtester.vectorized import BatchBacktester
+from src.strategies.high_edge.params import HighEdgeParams
+from src.strategies.high_edge.strategy import HighEdgeStrategy
+
+PERIOD = {'start': '2024-01-01', 'end': '2024-01-02'}
+
+
+def bars(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.05, n)), 2)
+    # A flat stretch and a run without volume exercise the zero-deviation and zero-volume branches
+    close[200:260] = close[200]
+    high = close + np.round(rng.uniform(0, 0.1, n), 2)
+    low = close - np.round(rng.uniform(0, 0.1, n), 2)
+    volume = rng.integers(0, 1000, n).astype(float)
+    volume[300:400] = 0
+    index = pd.date_range('2024-01-02 14:30', periods=n, freq='1min')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def params(**overrides) -> HighEdgeParams:
+    fields = dict(symbol='SPY', period=PERIOD, short_window=3, long_window=20, zscore_window=15,
+                  atr_window=5, cooldown=0, stop_atr_mult=0.5, target_mult=1.0)
+    return HighEdgeParams(**{**fields, **overrides})
+
+
+@pytest.mark.parametrize('overrides', [{}, {'zscore_window': 30, 'long_window': 10}, {'atr_window': 1, 'cooldown': 3}])
+def test_high_edge_features_match_the_trading_strategy(overrides):
+    df = bars(3000, seed=7)
+    p = params(**overrides)
+    # The reference trades on the rule signal; make sure it really enters and closes positions on these bars
+    position = np.asarray(Backtester(HighEdgeStrategy, p, None, cache=False).replay(df).position)
+    assert np.count_nonzero((position[:-1] != 0) & (position[1:] == 0)) > 10
+    report = check_parity(HighEdgeStrategy, p, df)
+    assert report['ok'], report
+    assert report['rows'] == len(df) - max(p.long_window, p.zscore_window) + 1
+
+
+def test_high_edge_batch_kernel_matches_individual_replays():
+    df = bars(3000, seed=11)
+    plist = [params(), params(cooldown=5, zscore_threshold=0.5), params(zscore_window=40, atr_window=1)]
+    for batch, p in zip(BatchBacktester(HighEdgeStrategy, plist).replay(df), plist):
+        single = Backtester(HighEdgeStrategy, p, None, cache=False).replay(df)
+        assert batch.trades == single.trades
+        assert np.array_equal(batch.equity, single.equity)
+        assert np.array_equal(batch.position, single.position)
+
+
+def test_high_edge_batch_kernel_applies_risk_limits_like_individual_replays():
+    df = bars(3000, seed=7)
+    # Five-minute bars span several sessions, so the drawdown limit rolls over and binds more than once
+    df.index = pd.date_range('2024-01-02 14:30', periods=len(df), freq='5min')
+    risk = {'daily_drawdown': 0.004, 'max_gross_exposure': 1.5}
+    plist = [params(), params(cooldown=3, atr_window=1)]
+    for batch, p in zip(BatchBacktester(HighEdgeStrategy, plist, risk=risk).replay(df), plist):
+        single = Backtester(HighEdgeStrategy, p, None, cache=False, risk=risk).replay(df)
+        unlimited = Backtester(HighEdgeStrategy, p, None, cache=False).replay(df)
+        assert single.metrics['trades'] < unlimited.metrics['trades']
+        assert batch.trades == single.trades
+        assert np.array_equal(batch.equity, single.equity)